@@ -59,4 +59,63 @@ contract Factory is Ownable {
     }
   }
 
+  function createBots(address implementation,
+    bytes32[] calldata salts,
+    address[] calldata owners,
+    address router,
+    address factory,
+    address weth) external onlyOwner returns (address[] memory bots) {
+    require(salts.length == owners.length, "Factory: LENGTH_MISMATCH");
+
+    bots = new address[](owners.length);
+    for (uint256 i = 0; i < owners.length; i++) {
+      bool created;
+      (bots[i], created) = _createBot(implementation, salts[i], owners[i], router, factory, weth);
+      if (created) {
+        emit BotCreated(owners[i], bots[i]);
+      }
+    }
+  }
+
+  // same layout as createBot, laid out from the free memory pointer instead of 0x00 as the scratch space is in use
+  function _createBot(address implementation,
+    bytes32 salt,
+    address owner,
+    address router,
+    address factory,
+    address weth) internal returns (address bot, bool created) {
+    assembly {
+      let ptr := mload(0x40)
+
+      mstore(add(ptr, 0xec), weth)
+      mstore(add(ptr, 0xcc), factory)
+      mstore(add(ptr, 0xac), router)
+      mstore(add(ptr, 0x8c), owner) // (owner, router, factory, weth) laid out at ptr+0x8c -> ptr+0x10c
+
+      mstore(add(ptr, 0x6c), 0x5af43d82803e903d91602b57fd5bf3) // ERC-1167 footer, laid out at ptr+0x7d -> ptr+0x8c
+      mstore(add(ptr, 0x5d), implementation) // implementation address, laid out at ptr+0x69 -> ptr+0x7d
+      mstore(add(ptr, 0x49), 0x3d60cd80600a3d3981f3363d3d373d3d3d363d73) // ERC-1167 constructor + header, laid out at ptr+0x55 -> ptr+0x69
+
+      // Copy create2 computation data to memory
+      mstore8(ptr, 0xff)
+      mstore(add(ptr, 0x35), keccak256(add(ptr, 0x55), 0xb7))
+      mstore(add(ptr, 0x01), shl(96, address()))
+      mstore(add(ptr, 0x15), salt)
+
+      bot := and(keccak256(ptr, 0x55), 0xffffffffffffffffffffffffffffffffffffffff)
+
+      // Deploy unless the account exists already
+      if iszero(extcodesize(bot)) {
+        bot := create2(0, add(ptr, 0x55), 0xb7, salt)
+
+        // Revert if the deployment fails
+        if iszero(bot) {
+          revert(0, 0)
+        }
+
+        created := 1
+      }
+    }
+  }
+
 }
\ No newline at end of file
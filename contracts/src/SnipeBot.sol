@@ -13,6 +13,8 @@ import "./AbstractBot.sol";
 contract SnipeBot is AbstractBot {
   using SafeMath for uint256;
 
+  event SellFailed(address indexed erc20, bytes reason);
+
   fallback() external payable {}
 
   receive() external payable {}
@@ -33,13 +35,31 @@ contract SnipeBot is AbstractBot {
   }
 
   function sell(address erc20, address to, uint256 deadline) external returns (uint[] memory amounts) {
-    (address owner, address _router, , ) = config();
+    (address owner, , , ) = config();
     require(owner == msg.sender, "Unauthorized");
 
-    // short step : swap token for native
-    uint256 balance = IERC20(erc20).balanceOf(address(this));
-    IERC20(erc20).approve(_router, balance);
-    return _swapTokenForNative(erc20, balance, 0, payable(to), deadline);
+    return _sell(erc20, to, deadline);
+  }
+
+  function sellMany(address[] calldata erc20s, address to, uint256 deadline) external returns (uint256[] memory amountsOut) {
+    (address owner, , , ) = config();
+    require(owner == msg.sender, "Unauthorized");
+
+    // every token is sold in its own call frame, one which can't be sold doesn't revert the others
+    amountsOut = new uint256[](erc20s.length);
+    for (uint256 i = 0; i < erc20s.length; i++) {
+      try this.sellSelf(erc20s[i], to, deadline) returns (uint[] memory amounts) {
+        amountsOut[i] = amounts[1];
+      } catch (bytes memory reason) {
+        emit SellFailed(erc20s[i], reason);
+      }
+    }
+  }
+
+  function sellSelf(address erc20, address to, uint256 deadline) external returns (uint[] memory amounts) {
+    require(msg.sender == address(this), "Unauthorized");
+
+    return _sell(erc20, to, deadline);
   }
 
   function inspect_transfer(address erc20, uint256 amount) external returns (uint256 received) {
@@ -50,4 +70,13 @@ contract SnipeBot is AbstractBot {
     require(success, "Transfer failed");
     return IERC20(erc20).balanceOf(address(this));
   }
+
+  function _sell(address erc20, address to, uint256 deadline) internal returns (uint[] memory amounts) {
+    (, address _router, , ) = config();
+
+    // short step : swap token for native
+    uint256 balance = IERC20(erc20).balanceOf(address(this));
+    IERC20(erc20).approve(_router, balance);
+    return _swapTokenForNative(erc20, balance, 0, payable(to), deadline);
+  }
 }
\ No newline at end of file
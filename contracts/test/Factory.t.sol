@@ -53,4 +53,78 @@ contract FactoryTest is Test, HelperContract {
     assertEq(weth, WETH);
   }
 
+  function test_createBotsRevertedDueUnauthorized() public {
+    (bytes32[] memory salts, address[] memory owners) = _batch(2);
+
+    vm.expectRevert();
+    vm.prank(address(1));
+
+    factory.createBots(address(snipeBot), salts, owners, ROUTERV2, FACTORYV2, WETH);
+  }
+
+  function test_createBotsRevertedDueLengthMismatch() public {
+    (bytes32[] memory salts,) = _batch(2);
+    (, address[] memory owners) = _batch(3);
+
+    vm.expectRevert("Factory: LENGTH_MISMATCH");
+    factory.createBots(address(snipeBot), salts, owners, ROUTERV2, FACTORYV2, WETH);
+  }
+
+  function test_createBotsSuccess() public {
+    (bytes32[] memory salts, address[] memory owners) = _batch(3);
+
+    for (uint256 i = 0; i < owners.length; i++) {
+      vm.expectEmit(true, false, false, true);
+      emit BotCreated(owners[i], _predict(salts[i], owners[i]));
+    }
+
+    address[] memory bots = factory.createBots(address(snipeBot), salts, owners, ROUTERV2, FACTORYV2, WETH);
+    assertEq(bots.length, owners.length);
+
+    for (uint256 i = 0; i < bots.length; i++) {
+      assertEq(bots[i], _predict(salts[i], owners[i]));
+
+      (address owner, address router, address factoryV2, address weth)  = SnipeBot(payable(bots[i])).config();
+      assertEq(owner, owners[i]);
+      assertEq(router, ROUTERV2);
+      assertEq(factoryV2, FACTORYV2);
+      assertEq(weth, WETH);
+    }
+  }
+
+  function test_createBotsSkipDeployed() public {
+    (bytes32[] memory salts, address[] memory owners) = _batch(2);
+    address deployed = factory.createBot(address(snipeBot), salts[0], owners[0], ROUTERV2, FACTORYV2, WETH);
+
+    vm.recordLogs();
+    address[] memory bots = factory.createBots(address(snipeBot), salts, owners, ROUTERV2, FACTORYV2, WETH);
+
+    Vm.Log[] memory entries = vm.getLogs();
+    assertEq(entries.length, 1);
+    assertEq(entries[0].topics[1], bytes32(uint256(uint160(owners[1]))));
+
+    assertEq(bots[0], deployed);
+    assertEq(bots[1], _predict(salts[1], owners[1]));
+  }
+
+  function _batch(uint256 length) internal pure returns (bytes32[] memory salts, address[] memory owners) {
+    salts = new bytes32[](length);
+    owners = new address[](length);
+    for (uint256 i = 0; i < length; i++) {
+      owners[i] = address(uint160(0x1000 + i));
+      salts[i] = keccak256(abi.encode(owners[i], i));
+    }
+  }
+
+  // address of the clone computed offline, as done by the bot pool
+  function _predict(bytes32 salt, address owner) internal view returns (address) {
+    bytes memory initCode = abi.encodePacked(
+      hex"3d60cd80600a3d3981f3363d3d373d3d3d363d73",
+      address(snipeBot),
+      hex"5af43d82803e903d91602b57fd5bf3",
+      abi.encode(owner, ROUTERV2, FACTORYV2, WETH)
+    );
+    return computeCreate2Address(salt, keccak256(initCode), address(factory));
+  }
+
 }
\ No newline at end of file
@@ -30,6 +30,8 @@ contract SnipeBotTest is Test, HelperContract {
 
   event Transfer(address indexed from, address indexed to, uint256 amount);
 
+  event SellFailed(address indexed erc20, bytes reason);
+
   using SafeMath for uint256;
   using UQ112x112 for uint224;
 
@@ -86,6 +88,64 @@ contract SnipeBotTest is Test, HelperContract {
     assertGt(amountSell[1], INSPECT_VALUE*9/10);
   }
 
+  function test_SellManyRevertedDueUnauthorized() public {
+    address[] memory erc20s = new address[](1);
+    erc20s[0] = address(token);
+
+    vm.expectRevert();
+    vm.prank(address(1));
+    snipeBot.sellMany(erc20s, address(this), block.timestamp + DEADLINE_BLOCK_DELAY);
+  }
+
+  function test_SellSelfRevertedDueExternalCaller() public {
+    vm.expectRevert();
+    snipeBot.sellSelf(address(token), address(this), block.timestamp + DEADLINE_BLOCK_DELAY);
+  }
+
+  function test_SellManySuccess() public {
+    ERC20Token other = _launchToken();
+
+    uint[] memory amountBuy = snipeBot.buy{value: INSPECT_VALUE}(address(token), block.timestamp + DEADLINE_BLOCK_DELAY);
+    uint[] memory amountBuyOther = snipeBot.buy{value: INSPECT_VALUE}(address(other), block.timestamp + DEADLINE_BLOCK_DELAY);
+    assertGt(amountBuy[1], 0);
+    assertGt(amountBuyOther[1], 0);
+
+    address[] memory erc20s = new address[](2);
+    erc20s[0] = address(token);
+    erc20s[1] = address(other);
+
+    uint256 balanceBefore = address(this).balance;
+    uint256[] memory amountsOut = snipeBot.sellMany(erc20s, address(this), block.timestamp + DEADLINE_BLOCK_DELAY);
+
+    assertEq(amountsOut.length, 2);
+    assertGt(amountsOut[0], INSPECT_VALUE*9/10);
+    assertGt(amountsOut[1], INSPECT_VALUE*9/10);
+    assertEq(address(this).balance - balanceBefore, amountsOut[0] + amountsOut[1]);
+    assertEq(token.balanceOf(address(snipeBot)), 0);
+    assertEq(other.balanceOf(address(snipeBot)), 0);
+  }
+
+  function test_SellManyToleratesFailedToken() public {
+    // no pair for the unlaunched token, its swap reverts while the held token is still sold
+    ERC20Token unlaunched = new ERC20Token();
+    unlaunched.transfer(address(snipeBot), TOTAL_SUPPLY/4);
+
+    snipeBot.buy{value: INSPECT_VALUE}(address(token), block.timestamp + DEADLINE_BLOCK_DELAY);
+
+    address[] memory erc20s = new address[](2);
+    erc20s[0] = address(unlaunched);
+    erc20s[1] = address(token);
+
+    vm.expectEmit(true, false, false, false, address(snipeBot));
+    emit SellFailed(address(unlaunched), "");
+    uint256[] memory amountsOut = snipeBot.sellMany(erc20s, address(this), block.timestamp + DEADLINE_BLOCK_DELAY);
+
+    assertEq(amountsOut[0], 0);
+    assertGt(amountsOut[1], INSPECT_VALUE*9/10);
+    assertEq(unlaunched.balanceOf(address(snipeBot)), TOTAL_SUPPLY/4);
+    assertEq(token.balanceOf(address(snipeBot)), 0);
+  }
+
   function test_InspectTransferRevertedDueUnauthorized() public {
     vm.expectRevert();
     vm.prank(address(1));
@@ -98,4 +158,13 @@ contract SnipeBotTest is Test, HelperContract {
     assertEq(received, TOTAL_SUPPLY/4);
   }
 
+  function _launchToken() internal returns (ERC20Token launched) {
+    launched = new ERC20Token();
+    BootstrapBot launcher = new BootstrapBot(ROUTERV2, FACTORYV2, WETH);
+
+    launched.transfer(address(launcher), TOTAL_SUPPLY/2);
+    launcher.approveToken(ROUTERV2, address(launched), TOTAL_SUPPLY/2);
+    launcher.addLiquidity{value: INITIAL_AVAX_RESERVE}(address(launched), TOTAL_SUPPLY/2);
+  }
+
 }
\ No newline at end of file
@@ -2,7 +2,7 @@ import os
 from decimal import Decimal
 
 class Pair:
-    def __init__(self, token, token_index, address, reserve_token=0, reserve_eth=0, created_at=0, inspect_attempts=0, creator=None, contract_verified=False, number_tx_mm=0, last_inspected_block=0) -> None:
+    def __init__(self, token, token_index, address, reserve_token=0, reserve_eth=0, created_at=0, inspect_attempts=0, creator=None, contract_verified=False, number_tx_mm=0, last_inspected_block=0, buy_gas_used=None, sell_gas_used=None) -> None:
         self.token = token
         self.token_index = token_index
         self.address = address
@@ -14,6 +14,8 @@ class Pair:
         self.contract_verified = contract_verified
         self.number_tx_mm = number_tx_mm
         self.last_inspected_block = last_inspected_block
+        self.buy_gas_used = buy_gas_used # measured on a fork by the inspection, None if it wasn't
+        self.sell_gas_used = sell_gas_used
 
     def price(self):
         if self.reserve_token != 0 and self.reserve_eth != 0:
@@ -25,6 +27,7 @@ class Pair:
         Pair {self.address} Token {self.token} TokenIndex {self.token_index}
         Creator {self.creator} ReserveToken {self.reserve_token} ReserveEth {self.reserve_eth}
         ContractVerified {self.contract_verified} NumberTxMM {self.number_tx_mm} InspectAttempts {self.inspect_attempts} LastInspectedBlock {self.last_inspected_block}
+        BuyGasUsed {self.buy_gas_used} SellGasUsed {self.sell_gas_used}
         """
 
 class BlockData:
@@ -61,7 +64,7 @@ class Position:
     
 
 class ExecutionOrder:
-    def __init__(self, block_number, block_timestamp, pair: Pair, amount_in, amount_out_min, is_buy, signer=None, bot=None, is_paper=False, position: Position=None) -> None:
+    def __init__(self, block_number, block_timestamp, pair: Pair, amount_in, amount_out_min, is_buy, signer=None, bot=None, is_paper=False, position: Position=None, priority_fee=None) -> None:
         self.block_number = block_number
         self.block_timestamp = block_timestamp
         self.pair = pair
@@ -72,9 +75,10 @@ class ExecutionOrder:
         self.bot = bot
         self.is_paper = is_paper
         self.position = position
+        self.priority_fee = priority_fee # wei, overrides the predicted priority fee
 
     def __str__(self) -> str:
-        return f"ExecutionOrder Block #{self.block_number} Pair {self.pair.address} AmountIn {self.amount_in} AmountOutMin {self.amount_out_min} Signer {self.signer} Bot {self.bot} IsBuy {self.is_buy} IsPaper {self.is_paper}"
+        return f"ExecutionOrder Block #{self.block_number} Pair {self.pair.address} AmountIn {self.amount_in} AmountOutMin {self.amount_out_min} Signer {self.signer} Bot {self.bot} IsBuy {self.is_buy} IsPaper {self.is_paper} PriorityFee {self.priority_fee}"
     
 class ExecutionAck:
     def __init__(self, lead_block, block_number, tx_hash, tx_status, pair: Pair, amount_in, amount_out, is_buy, signer=None, bot=None, is_paper=False) -> None:
@@ -131,21 +135,24 @@ class Bot:
         """
     
 class W3Account:
-    def __init__(self, w3_account, private_key, bot:Bot = None) -> None:
+    def __init__(self, w3_account, private_key, bot:Bot = None, nonce_manager=None) -> None:
         self.w3_account = w3_account
         self.private_key = private_key
         self.bot = bot
+        self.nonce_manager = nonce_manager
 
 class SimulationResult:
-    def __init__(self, pair, amount_in, amount_out, slippage, amount_token=0) -> None:
+    def __init__(self, pair, amount_in, amount_out, slippage, amount_token=0, buy_gas_used=None, sell_gas_used=None) -> None:
         self.pair = pair
         self.amount_in = amount_in
         self.amount_out = amount_out
         self.slippage = slippage
         self.amount_token = amount_token
+        self.buy_gas_used = buy_gas_used
+        self.sell_gas_used = sell_gas_used
 
     def __str__(self) -> str:
-        return f"Simulation result {self.pair.address} slippage {self.slippage} amountIn {self.amount_in} amountOut {self.amount_out} amountToken {self.amount_token}"
+        return f"Simulation result {self.pair.address} slippage {self.slippage} amountIn {self.amount_in} amountOut {self.amount_out} amountToken {self.amount_token} buyGasUsed {self.buy_gas_used} sellGasUsed {self.sell_gas_used}"
     
 class FilterLogsType(IntEnum):
     PAIR_CREATED = 0
@@ -159,10 +166,52 @@ class FilterLogs:
     
     def __str__(self) -> str:
         return f"FilterLogs type {self.type} data {self.data}"
+
+class ReserveUpdate:
+    def __init__(self, pair: Pair, block_number, tx_hash) -> None:
+        self.pair = pair
+        self.block_number = block_number
+        self.tx_hash = tx_hash
+
+    def __str__(self) -> str:
+        return f"ReserveUpdate {self.pair.address} block #{self.block_number} tx {self.tx_hash} reserveToken {self.pair.reserve_token} reserveEth {self.pair.reserve_eth}"
      
+class MempoolAlert:
+    def __init__(self, pair: Pair, tx_hash, sender, method_id, max_priority_fee_per_gas=None, gas_price=None) -> None:
+        self.pair = pair
+        self.tx_hash = tx_hash
+        self.sender = sender
+        self.method_id = method_id
+        self.max_priority_fee_per_gas = max_priority_fee_per_gas
+        self.gas_price = gas_price
+
+    def __str__(self) -> str:
+        return f"MempoolAlert {self.pair.address} tx {self.tx_hash} from {self.sender} method {self.method_id} maxPriorityFee {self.max_priority_fee_per_gas} gasPrice {self.gas_price}"
+
 class TxStatus(IntEnum):
     FAILED = 0
     SUCCESS = 1
+    REJECTED = 2 # never sent, no account could take the order
+
+class ExecutionStatus(IntEnum):
+    SENT = 0
+    FAILED = 1
+    TIMEOUT = 2
+    REJECTED = 3
+
+class ExecutionResult:
+    def __init__(self, order_id, status: ExecutionStatus, pair: Pair, is_buy, signer=None, tx_hash=None, error=None, elapsed=0) -> None:
+        self.order_id = order_id
+        self.status = status
+        self.pair = pair
+        self.is_buy = is_buy
+        self.signer = signer
+        self.tx_hash = tx_hash
+        self.error = error
+        self.elapsed = elapsed # seconds from dispatch to broadcast or failure
+
+    def __str__(self) -> str:
+        return f"ExecutionResult #{self.order_id} {self.status.name} Pair {self.pair.address} IsBuy {self.is_buy} Signer {self.signer} TxHash {self.tx_hash} Error {self.error} Elapsed {round(self.elapsed, 4)}s"
 
 class MaliciousPair(IntEnum):
     UNMALICIOUS=0
@@ -172,10 +221,13 @@ class MaliciousPair(IntEnum):
     MALICIOUS_TX_IN=4
 
 class InspectionResult:
-    def __init__(self, pair: Pair, from_block, to_block, reserve_inrange=False, simulation_result=None, is_malicious=MaliciousPair.UNMALICIOUS, contract_verified=False, is_creator_call_contract=0, number_tx_mm=0) -> None:
+    def __init__(self, pair: Pair, from_block, to_block, reserve_inrange=False, simulation_result=None, is_malicious=MaliciousPair.UNMALICIOUS, contract_verified=False, is_creator_call_contract=0, number_tx_mm=0, is_initial=False, stage_timings=None, is_abandoned=False) -> None:
         self.pair = pair
         self.from_block = from_block
         self.to_block = to_block
+        self.is_initial = is_initial
+        self.stage_timings = stage_timings if stage_timings is not None else {}
+        self.is_abandoned = is_abandoned # overran its carry-over blocks, no verdict
 
         self.reserve_inrange = reserve_inrange
         self.simulation_result = simulation_result
@@ -184,21 +236,26 @@ class InspectionResult:
         self.is_creator_call_contract = is_creator_call_contract
         self.number_tx_mm = number_tx_mm
 
+    def is_rejected(self) -> bool:
+        return any([not passed for _,passed,_ in self.stage_timings.values()])
+
     def __str__(self) -> str:
         return f"""
-        Inspection result Pair {self.pair.address} fromBlock {self.from_block} toBlock {self.to_block}
+        Inspection result Pair {self.pair.address} fromBlock {self.from_block} toBlock {self.to_block} IsAbandoned {self.is_abandoned}
         ReserveInrange {self.reserve_inrange} IsMalicious {self.is_malicious} ContractVerified {self.contract_verified}
         CreatorCallContract {self.is_creator_call_contract} NumberTxMM {self.number_tx_mm}
         SimulationResult {self.simulation_result}
+        StageTimings {self.stage_timings}
         """
 
 class BotCreationOrder:
-    def __init__(self, owner, retry_times=0) -> None:
+    def __init__(self, owner, retry_times=0, is_spare=False) -> None:
         self.owner = owner
         self.retry_times = retry_times
+        self.is_spare = is_spare # only tops up the spare bots of the owner, no bot is handed over
 
     def __str__(self) -> str:
-        return f"BotCreationOrder owner {self.owner} retryTimes {self.retry_times}"
+        return f"BotCreationOrder owner {self.owner} retryTimes {self.retry_times} isSpare {self.is_spare}"
     
 class BotUpdateOrder:
     def __init__(self, bot:Bot, execution_ack: ExecutionAck) -> None:
@@ -1,2 +1,9 @@
+from executor.nonce_manager import *
+from executor.tx_builder import *
+from executor.receipt_tracker import *
+from executor.broadcaster import *
+from executor.replacement_scheduler import *
+from executor.signer_scheduler import *
+from executor.sell_ladder import *
 from executor.base_executor import *
 from executor.buysell_executor import *
\ No newline at end of file
@@ -2,8 +2,8 @@ import os
 import logging
 from decimal import Decimal
 
-from web3 import Web3
-from web3.middleware import geth_poa_middleware, construct_sign_and_send_raw_middleware
+from web3 import Web3, AsyncWeb3
+from web3.middleware import geth_poa_middleware, async_geth_poa_middleware, construct_sign_and_send_raw_middleware
 
 import django
 from django.utils.timezone import make_aware
@@ -16,6 +16,9 @@ sys.path.append('..')
 
 from library import Singleton
 from data import W3Account
+from helpers import FeePredictor
+from executor.nonce_manager import NonceManager
+from executor.tx_builder import TxBuilder
 
 ALLOWANCE_TOKEN_AMOUNT = 10**6
 MINIMUM_AVAX_BALANCE = 0.01
@@ -29,6 +32,10 @@ class BaseExecutor(metaclass=Singleton):
 
         self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
 
+        # order path, one pooled session shared by every concurrent order
+        self.aw3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(http_url))
+        self.aw3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+
         self.treasury = self.w3.eth.account.from_key(treasury_key)
         self.w3.middleware_onion.add(construct_sign_and_send_raw_middleware(self.treasury))
         self.w3.eth.default_account = self.treasury.address
@@ -40,6 +47,8 @@ class BaseExecutor(metaclass=Singleton):
         self.max_fee_per_gas = max_fee_per_gas
         self.max_priority_fee_per_gas = max_priority_fee_per_gas
         self.deadline_delay = deadline_delay
+        self.fee_predictor = FeePredictor(max_priority_fee_per_gas)
+        self.tx_builder = TxBuilder(self.w3, self.fee_predictor, max_fee_per_gas)
 
         self.order_receiver = order_receiver
         self.report_sender = report_sender
@@ -47,9 +56,13 @@ class BaseExecutor(metaclass=Singleton):
     def build_w3_account(self, private_key) -> W3Account:
         acct = self.w3.eth.account.from_key(private_key)
 
+        nonce_manager = NonceManager(self.w3, acct.address, self.aw3)
+        nonce_manager.sync()
+
         return W3Account(
             acct,
             private_key,
+            nonce_manager=nonce_manager,
         )
     
     def insert_executors_db(self):
@@ -72,8 +85,8 @@ class BaseExecutor(metaclass=Singleton):
             else:
                 logging.info(f"EXECUTOR Executor {address} existed #{executor.id}")
 
-    def get_block_timestamp(self):
-        block = self.w3.eth.get_block('latest')
+    async def get_block_timestamp(self):
+        block = await self.aw3.eth.get_block('latest')
         return block['timestamp']
 
 
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import logging
+import time
+import itertools
+
+import aiohttp
+
+import sys # for testing
+sys.path.append('..')
+
+BROADCAST_URLS=[url for url in os.environ.get('BROADCAST_URLS', '').split(',') if len(url) > 0] # in addition to HTTPS_URL
+BROADCAST_TIMEOUT_SECONDS=float(os.environ.get('BROADCAST_TIMEOUT_SECONDS', '3'))
+BROADCAST_STATS_INTERVAL_SECONDS=int(os.environ.get('BROADCAST_STATS_INTERVAL_SECONDS', '300'))
+
+# the tx reached the endpoint's mempool through another one first
+ACCEPTED_ERRORS=('already known', 'known transaction', 'already imported')
+
+class EndpointStats:
+    def __init__(self, url) -> None:
+        self.url = url
+        self.sent = 0
+        self.accepted = 0
+        self.first = 0 # accepted before any other endpoint
+        self.rejected = 0
+        self.total_latency = 0
+        self.included = 0
+        self.dropped = 0
+
+    def mean_latency(self):
+        return self.total_latency / self.accepted if self.accepted > 0 else None
+
+    def __str__(self) -> str:
+        latency = round(self.mean_latency()*1000, 1) if self.accepted > 0 else None
+        return f"Endpoint {self.url} sent {self.sent} accepted {self.accepted} first {self.first} rejected {self.rejected} meanLatency {latency}ms included {self.included} dropped {self.dropped}"
+
+class Broadcaster:
+    """
+    Sends a signed raw transaction to every configured endpoint concurrently and returns as soon as one of
+    them accepts it. Slower endpoints keep running in background for propagation and statistics.
+    """
+    def __init__(self, urls, timeout=BROADCAST_TIMEOUT_SECONDS) -> None:
+        self.urls = list(dict.fromkeys(urls))
+        self.timeout = timeout
+
+        self.stats = {url: EndpointStats(url) for url in self.urls}
+        self.acceptances = {} # tx hash -> endpoints which accepted it
+        self.session = None
+        self.counter = itertools.count(1)
+        self.tasks = set()
+
+    async def send(self, url, raw_tx):
+        stats = self.stats[url]
+        stats.sent += 1
+        start_time = time.perf_counter()
+        try:
+            payload = {"jsonrpc": "2.0", "id": next(self.counter), "method": "eth_sendRawTransaction", "params": [raw_tx]}
+            async with self.session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                result = await response.json(content_type=None)
+
+            error = result.get('error')
+            if error is not None and not any([message in str(error.get('message', '')).lower() for message in ACCEPTED_ERRORS]):
+                raise Exception(error)
+        except Exception as e:
+            stats.rejected += 1
+            logging.warning(f"EXECUTOR broadcast to {url} rejected {e}")
+            return (url, False)
+
+        stats.accepted += 1
+        stats.total_latency += time.perf_counter() - start_time
+        return (url, True)
+
+    async def broadcast(self, raw_tx, tx_hash) -> str:
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        raw_tx = raw_tx if isinstance(raw_tx, str) else '0x' + bytes(raw_tx).hex()
+        tx_hash = tx_hash.lower()
+        self.acceptances[tx_hash] = []
+
+        pending = set([asyncio.create_task(self.send(url, raw_tx)) for url in self.urls])
+        first = None
+        while len(pending) > 0 and first is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url, accepted = task.result()
+                if accepted:
+                    self.acceptances[tx_hash].append(url)
+                    if first is None:
+                        first = url
+                        self.stats[url].first += 1
+
+        for task in pending:
+            self.tasks.add(task)
+            task.add_done_callback(lambda task, tx_hash=tx_hash: self.on_late_reply(task, tx_hash))
+
+        if first is None:
+            self.acceptances.pop(tx_hash, None)
+            raise Exception(f"tx {tx_hash} rejected by all {len(self.urls)} endpoints")
+
+        logging.info(f"EXECUTOR broadcast tx {tx_hash} first accepted by {first}")
+        return first
+
+    def on_late_reply(self, task, tx_hash) -> None:
+        self.tasks.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        url, accepted = task.result()
+        if accepted and tx_hash in self.acceptances:
+            self.acceptances[tx_hash].append(url)
+
+    def record_inclusion(self, tx_hash, included) -> None:
+        for url in self.acceptances.pop(tx_hash.lower(), []):
+            if included:
+                self.stats[url].included += 1
+            else:
+                self.stats[url].dropped += 1
+
+    def log_stats(self) -> None:
+        for stats in sorted(self.stats.values(), key=lambda stats: stats.first, reverse=True):
+            logging.info(f"EXECUTOR {stats}")
+
+    async def run(self, interval=BROADCAST_STATS_INTERVAL_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            self.log_stats()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+if __name__=="__main__":
+    from aiohttp import web
+
+    logging.basicConfig(level=logging.INFO)
+
+    # local stand-ins: a fast endpoint, a slow one, one which already has the tx and a rejecting one
+    STAND_INS = [
+        (8601, 0.05, None),
+        (8602, 0.01, None),
+        (8603, 0.02, {"code": -32000, "message": "already known"}),
+        (8604, 0, {"code": -32000, "message": "nonce too low"}),
+    ]
+
+    def stand_in(delay, error):
+        async def handler(request):
+            body = await request.json()
+            await asyncio.sleep(delay)
+            if error is not None:
+                return web.json_response({"jsonrpc": "2.0", "id": body["id"], "error": error})
+            return web.json_response({"jsonrpc": "2.0", "id": body["id"], "result": "0x" + "ab"*32})
+        return handler
+
+    async def run_all():
+        runners = []
+        for port, delay, error in STAND_INS:
+            app = web.Application()
+            app.router.add_post('/', stand_in(delay, error))
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, '127.0.0.1', port).start()
+            runners.append(runner)
+
+        broadcaster = Broadcaster([f"http://127.0.0.1:{port}/" for port,_,_ in STAND_INS])
+        for idx in range(5):
+            tx_hash = '0x' + f"{idx:02x}"*32
+            first = await broadcaster.broadcast(b'\x02\x01', tx_hash)
+            await asyncio.sleep(0.1)
+            broadcaster.record_inclusion(tx_hash, idx % 2 == 0)
+        broadcaster.log_stats()
+
+        await broadcaster.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    asyncio.run(run_all())
@@ -4,24 +4,42 @@ import os
 import logging
 import time
 from decimal import Decimal
-import threading
 
-from concurrent.futures import ThreadPoolExecutor
 from web3 import Web3
 from web3.logs import STRICT, IGNORE, DISCARD, WARN
 
 import sys # for testing
 sys.path.append('..')
 
-from helpers import timer_decorator, load_abi, constants
+from helpers import async_timer_decorator, load_abi, constants
 from executor import BaseExecutor
-from data import ExecutionOrder, Pair, ExecutionAck, TxStatus, BotCreationOrder, Bot, BotUpdateOrder, Position
+from executor.receipt_tracker import ReceiptTracker, PendingTx
+from executor.broadcaster import Broadcaster, BROADCAST_URLS
+from executor.replacement_scheduler import ReplacementScheduler
+from executor.signer_scheduler import SignerScheduler, SIGNER_BALANCE_INTERVAL_SECONDS
+from executor.sell_ladder import SellLadderBook
+from data import ExecutionOrder, Pair, ExecutionAck, TxStatus, BotCreationOrder, Bot, BotUpdateOrder, Position, BlockData, \
+                    ExecutionResult, ExecutionStatus
 from factory import BotFactory
-from inspector import EthCallSimulator
+from inspector import PaperTradingEngine
 
-glb_lock = threading.Lock()
 BOT_MAX_NUMBER_USED=int(os.environ.get('BOT_MAX_NUMBER_USED'))
-EXECUTION_GAS_LIMIT=int(os.environ.get('EXECUTION_GAS_LIMIT'))
+EXECUTION_GAS_LIMIT=int(os.environ.get('EXECUTION_GAS_LIMIT')) # for tokens the inspection didn't measure
+EXECUTION_GAS_MARGIN=float(os.environ.get('EXECUTION_GAS_MARGIN', '1.3')) # on the gas measured by the inspection
+FEE_HISTORY_INTERVAL_SECONDS=int(os.environ.get('FEE_HISTORY_INTERVAL_SECONDS', '0'))
+ORDER_TIMEOUT_SECONDS=float(os.environ.get('ORDER_TIMEOUT_SECONDS', '10'))
+SELL_BATCH_WINDOW_SECONDS=float(os.environ.get('SELL_BATCH_WINDOW_SECONDS', '0.02')) # 0 to disable sellMany batching
+
+class ExecutionContext:
+    def __init__(self, idx, lead_block, is_buy, pair, amount_in, signer, bot, batch=None) -> None:
+        self.idx = idx
+        self.lead_block = lead_block
+        self.is_buy = is_buy
+        self.pair = pair
+        self.amount_in = amount_in
+        self.signer = signer
+        self.bot = bot
+        self.batch = batch # contexts of the positions sold together by a sellMany tx
 
 class BuySellExecutor(BaseExecutor):
     def __init__(self, http_url, treasury_key, executor_keys, order_receiver, report_sender, \
@@ -53,179 +71,383 @@ class BuySellExecutor(BaseExecutor):
                 router=router,
                 pair_factory=pair_factory,
                 weth=weth,
+                tx_builder=self.tx_builder,
             )
     
             for acct in self.accounts:
                 self.bot_order_broker.put(BotCreationOrder(owner=acct.w3_account.address))
 
-        # paper-trade
-        self.simulator = EthCallSimulator(
+        self.receipt_tracker = ReceiptTracker(http_url, self.handle_receipt, self.handle_dropped)
+        self.tracker_tasks = set()
+
+        # every order runs as its own task on the executor loop
+        self.order_timeout = ORDER_TIMEOUT_SECONDS
+        self.order_tasks = set()
+        self.results = dict([(status, 0) for status in ExecutionStatus])
+
+        # orders go to the least-loaded ready account, or wait for one
+        self.signer_scheduler = SignerScheduler(self.accounts)
+
+        # raw txs go to every endpoint at once
+        self.broadcaster = Broadcaster([http_url] + BROADCAST_URLS)
+
+        # sells still pending after a few blocks are rebroadcast with the same nonce and a higher fee
+        self.replacement_scheduler = ReplacementScheduler(self.receipt_tracker, self.fee_predictor, self.replace_sell)
+
+        # same-block sells of one bot are grouped into a single sellMany tx
+        self.sell_batches = {} # (signer, bot) -> [(order id, ExecutionOrder)]
+
+        # sells of the open positions are signed in advance, at a few fee levels
+        self.sell_ladders = SellLadderBook(self.accounts, self.tx_builder, self.fee_predictor, self.gas_limit, self.deadline_delay)
+
+        # paper-trade on a local fork following the head, holdings included
+        self.paper_engine = PaperTradingEngine(
             http_url=http_url,
             signer=Web3.to_checksum_address(os.environ.get('MANAGER_ADDRESS')),
-            bot=Web3.to_checksum_address(os.environ.get('INSPECTOR_BOT')),
         )
+        self.paper_task = None
             
-    @timer_decorator
-    def execute(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None):
-        def prepare_tx_bot(signer, bot, nonce):
-            tx = None            
-            if is_buy:
-                tx = bot.functions.buy(Web3.to_checksum_address(pair.token), deadline).build_transaction({
-                    "from": signer,
-                    "nonce": nonce,
-                    "gas": self.gas_limit,
-                    "value": Web3.to_wei(amount_in, 'ether'),
-                })
-            else:
-                tx = bot.functions.sell(Web3.to_checksum_address(pair.token), signer, deadline).build_transaction({
-                    "from": signer,
-                    "nonce": nonce,
-                    "gas": self.gas_limit,
-                })
-
-            return tx
-        
+    def gas_limit_of(self, pair, is_buy) -> int:
+        # measured on a fork by the inspection, with a margin for the state moving until the tx lands
+        gas_used = pair.buy_gas_used if is_buy else pair.sell_gas_used
+        if gas_used is None:
+            return self.gas_limit
+        return int(gas_used*EXECUTION_GAS_MARGIN)
+
+    @async_timer_decorator
+    async def execute(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None, priority_fee=None) -> ExecutionResult:
         signer = self.accounts[idx].w3_account.address
         priv_key = self.accounts[idx].private_key
-        if bot is None:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(self.accounts[idx].bot.address),abi=self.bot_abi)
-        else:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(bot),abi=self.bot_abi)
-
+        nonce_manager = self.accounts[idx].nonce_manager
+        if bot is None and self.accounts[idx].bot is not None:
+            bot = self.accounts[idx].bot.address
+        bot = Web3.to_checksum_address(bot) if bot is not None else None
+        ctx = ExecutionContext(idx, lead_block, is_buy, pair, amount_in, signer, bot)
+
+        nonce = None
+        pending = None
         try:
-            logging.warning(f"EXECUTOR Signer {signer} AmountIn {amount_in} AmountOutMin {amount_out_min} Deadline {deadline} IsBuy {is_buy}")
+            logging.warning(f"EXECUTOR Signer {signer} AmountIn {amount_in} AmountOutMin {amount_out_min} Deadline {deadline} IsBuy {is_buy} PriorityFee {priority_fee}")
+            if bot is None:
+                raise Exception(f"account #{idx} has no bot")
 
-            # get nonce onchain
-            nonce = self.w3.eth.get_transaction_count(signer)
+            # nonce is handed out locally, orders of the same account don't wait for each other
+            nonce = await nonce_manager.acquire()
 
-            tx = prepare_tx_bot(signer, bot, nonce)
-            
-            if tx is None:
-                raise Exception(f"create tx failed")
-            
-            # send raw tx
-            signed = self.w3.eth.account.sign_transaction(tx, priv_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
-            logging.debug(f"created tx hash {Web3.to_hex(tx_hash)}")
+            presigned = self.sell_ladders.take(pair.address, bot, nonce, priority_fee) if not is_buy else None
+            if presigned is not None:
+                signed, fees = presigned.signed, presigned.fees
+                logging.info(f"EXECUTOR pre-signed sell nonce {nonce} priorityFee {presigned.priority_fee}")
+            else:
+                if is_buy:
+                    tx = self.tx_builder.buy_tx(signer, bot, pair.token, deadline, Web3.to_wei(amount_in, 'ether'), nonce, self.gas_limit_of(pair, True), priority_fee)
+                else:
+                    tx = self.tx_builder.sell_tx(signer, bot, pair.token, signer, deadline, nonce, self.gas_limit_of(pair, False), priority_fee)
+
+                signed = self.tx_builder.sign(tx, priv_key)
+                fees = {"maxFeePerGas": tx['maxFeePerGas'], "maxPriorityFeePerGas": tx['maxPriorityFeePerGas']}
+            tx_hash = Web3.to_hex(signed.hash)
+
+            # tracked before the broadcast, a tx reaching any endpoint is resolved by its receipt even if the order times out meanwhile
+            pending = PendingTx(
+                tx_hash=tx_hash,
+                nonce=nonce,
+                sent_block=self.receipt_tracker.head,
+                context=ctx,
+                fees=fees,
+                replaceable=not is_buy,
+                sender=signer,
+            )
+            self.receipt_tracker.track(pending)
 
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            await self.broadcaster.broadcast(signed.rawTransaction, tx_hash)
+            logging.debug(f"created tx hash {tx_hash}")
 
-            logging.debug(f"tx receipt {tx_receipt}")
-            logging.debug(f"{amount_in} tx hash {Web3.to_hex(tx_hash)} in block #{tx_receipt['blockNumber']} with status {tx_receipt['status']}")
+            return ExecutionResult(None, ExecutionStatus.SENT, pair, is_buy, signer, tx_hash)
 
-            # send acknowledgement
-            amount_out = 0
-            if tx_receipt['status'] == TxStatus.SUCCESS:
-                pair_contract = self.w3.eth.contract(address=Web3.to_checksum_address(pair.address), abi=self.pair_abi)
-                swap_logs = pair_contract.events.Swap().process_receipt(tx_receipt, errors=DISCARD)
-                logging.debug(f"swap logs {swap_logs[0]}")
+        except asyncio.CancelledError:
+            # timed out before the tx was tracked, nothing can land with this nonce
+            if pending is None:
+                if nonce is not None:
+                    nonce_manager.reset(nonce)
+                self.acknowledge(ctx, None)
+            raise
 
-                swap_logs = swap_logs[0]
+        except Exception as e:
+            logging.warning(f"EXECUTOR order {pair} amountIn {amount_in} isBuy {is_buy} catch exception {e}")
+            if pending is not None:
+                self.receipt_tracker.untrack(pending.tx_hash)
+            if nonce is not None:
+                # not sent, the nonce is left unused
+                nonce_manager.reset(nonce)
 
-                amount_out = Web3.from_wei(swap_logs['args']['amount0Out'], 'ether') if pair.token_index==0 else Web3.from_wei(swap_logs['args']['amount1Out'], 'ether')
-                if not is_buy:
-                    amount_out = Web3.from_wei(swap_logs['args']['amount1Out'], 'ether') if pair.token_index==0 else Web3.from_wei(swap_logs['args']['amount0Out'], 'ether')
+            self.acknowledge(ctx, None)
+            return ExecutionResult(None, ExecutionStatus.FAILED, pair, is_buy, signer, error=str(e))
 
-            ack = ExecutionAck(
-                lead_block=lead_block,
-                block_number=tx_receipt['blockNumber'],
-                tx_hash=Web3.to_hex(tx_hash),
-                tx_status=tx_receipt['status'],
-                pair=pair,
-                amount_in=amount_in,
-                amount_out=amount_out,
-                is_buy=is_buy,
-                signer=signer,
-                bot=bot.address,
+    @async_timer_decorator
+    async def execute_sell_batch(self, idx, orders, deadline) -> ExecutionResult:
+        signer = self.accounts[idx].w3_account.address
+        nonce_manager = self.accounts[idx].nonce_manager
+        bot = Web3.to_checksum_address(orders[0].bot)
+        ctx = ExecutionContext(idx, orders[0].block_number, False, None, 0, signer, bot,
+                            batch=[ExecutionContext(idx, order.block_number, False, order.pair, order.amount_in, signer, bot) for order in orders])
+
+        nonce = None
+        pending = None
+        try:
+            logging.warning(f"EXECUTOR Signer {signer} Bot {bot} batched sell of {len(orders)} tokens Deadline {deadline}")
+
+            nonce = await nonce_manager.acquire()
+            for order in orders:
+                self.sell_ladders.discard(order.pair.address)
+
+            tx = self.tx_builder.sell_many_tx(signer, bot, [order.pair.token for order in orders], signer, deadline, nonce, sum([self.gas_limit_of(order.pair, False) for order in orders]))
+            signed = self.tx_builder.sign(tx, self.accounts[idx].private_key)
+            tx_hash = Web3.to_hex(signed.hash)
+
+            pending = PendingTx(
+                tx_hash=tx_hash,
+                nonce=nonce,
+                sent_block=self.receipt_tracker.head,
+                context=ctx,
+                fees={"maxFeePerGas": tx['maxFeePerGas'], "maxPriorityFeePerGas": tx['maxPriorityFeePerGas']},
+                replaceable=True,
+                sender=signer,
             )
+            self.receipt_tracker.track(pending)
 
-            logging.warning(f"EXECUTOR Acknowledgement {ack}")
-            self.report_sender.put(ack)
+            await self.broadcaster.broadcast(signed.rawTransaction, tx_hash)
+            return ExecutionResult(None, ExecutionStatus.SENT, None, False, signer, tx_hash)
+
+        except asyncio.CancelledError:
+            if pending is None:
+                if nonce is not None:
+                    nonce_manager.reset(nonce)
+                for position_ctx in ctx.batch:
+                    self.acknowledge(position_ctx, None)
+            raise
 
         except Exception as e:
-            logging.warning(f"EXECUTOR order {pair} amountIn {amount_in} isBuy {is_buy} catch exception {e}")
+            logging.warning(f"EXECUTOR batched sell of {len(orders)} tokens by bot {bot} catch exception {e}")
+            if pending is not None:
+                self.receipt_tracker.untrack(pending.tx_hash)
+            if nonce is not None:
+                nonce_manager.reset(nonce)
+
+            for position_ctx in ctx.batch:
+                self.acknowledge(position_ctx, None)
+            return ExecutionResult(None, ExecutionStatus.FAILED, None, False, signer, error=str(e))
+
+    async def replace_sell(self, pending: PendingTx, fees):
+        # a fresh deadline, the original one may be about to expire after the blocks spent pending
+        ctx = pending.context
+        deadline = int(time.time()) + self.deadline_delay
+        if ctx.batch is not None:
+            tx = self.tx_builder.sell_many_tx(ctx.signer, ctx.bot, [position_ctx.pair.token for position_ctx in ctx.batch], ctx.signer, deadline, pending.nonce, sum([self.gas_limit_of(position_ctx.pair, False) for position_ctx in ctx.batch]))
+        else:
+            tx = self.tx_builder.sell_tx(ctx.signer, ctx.bot, ctx.pair.token, ctx.signer, deadline, pending.nonce, self.gas_limit_of(ctx.pair, False))
+        tx.update(fees)
+
+        signed = self.tx_builder.sign(tx, self.accounts[ctx.idx].private_key)
+        tx_hash = Web3.to_hex(signed.hash)
+        await self.broadcaster.broadcast(signed.rawTransaction, tx_hash)
+        return tx_hash
+
+    async def on_block(self, block_number):
+        await self.receipt_tracker.on_block(block_number)
+        await self.replacement_scheduler.on_block(block_number)
+        logging.debug(f"EXECUTOR orders in-flight {len(self.order_tasks)} results {dict([(status.name, count) for status,count in self.results.items()])}")
+
+    def decode_amount_out(self, receipt, pair, is_buy):
+        # amounts out of the Swap log emitted by the pair
+        for log in receipt['logs']:
+            if log['address'].lower() != pair.address.lower() or len(log['topics']) == 0 or log['topics'][0].lower() != constants.SWAP_EVENT_TOPIC:
+                continue
+
+            data = log['data'][2:]
+            amount0_out = int(data[128:192], 16)
+            amount1_out = int(data[192:256], 16)
+            if is_buy:
+                return Web3.from_wei(amount0_out, 'ether') if pair.token_index==0 else Web3.from_wei(amount1_out, 'ether')
+            return Web3.from_wei(amount1_out, 'ether') if pair.token_index==0 else Web3.from_wei(amount0_out, 'ether')
+
+        return 0
+
+    def handle_receipt(self, pending: PendingTx, receipt) -> None:
+        ctx = pending.context
+        self.accounts[ctx.idx].nonce_manager.release(pending.nonce)
+
+        # with replacements, any broadcast of the nonce may be the one which landed
+        tx_hash = receipt['transactionHash']
+        for broadcast_hash in pending.tx_hashes:
+            self.broadcaster.record_inclusion(broadcast_hash, broadcast_hash == tx_hash)
+
+        logging.debug(f"{ctx.amount_in} tx hash {tx_hash} in block #{receipt['blockNumber']} with status {receipt['status']}")
+
+        if ctx.batch is not None:
+            # one ack per position, a token without Swap log failed inside sellMany
+            acks = []
+            for position_ctx in ctx.batch:
+                amount_out = self.decode_amount_out(receipt, position_ctx.pair, False) if receipt['status'] == TxStatus.SUCCESS else 0
+                acks.append(ExecutionAck(
+                    lead_block=position_ctx.lead_block,
+                    block_number=receipt['blockNumber'],
+                    tx_hash=tx_hash,
+                    tx_status=TxStatus.SUCCESS if amount_out > 0 else TxStatus.FAILED,
+                    pair=position_ctx.pair,
+                    amount_in=position_ctx.amount_in,
+                    amount_out=amount_out,
+                    is_buy=False,
+                    signer=position_ctx.signer,
+                    bot=position_ctx.bot,
+                ))
+                self.acknowledge(position_ctx, acks[-1], update_bot=False)
+
+            # the bot made a single sell, failed if any of its tokens failed
+            failed = [ack for ack in acks if ack.tx_status != TxStatus.SUCCESS]
+            self.update_bot(ctx, failed[0] if len(failed) > 0 else acks[-1])
+            return
+
+        amount_out = 0
+        if receipt['status'] == TxStatus.SUCCESS:
+            amount_out = self.decode_amount_out(receipt, ctx.pair, ctx.is_buy)
+            if ctx.is_buy:
+                self.sell_ladders.prepare(ctx.pair.address, ctx.idx, ctx.bot, ctx.pair.token, self.gas_limit_of(ctx.pair, False))
+
+        self.acknowledge(ctx, ExecutionAck(
+            lead_block=ctx.lead_block,
+            block_number=receipt['blockNumber'],
+            tx_hash=tx_hash,
+            tx_status=receipt['status'],
+            pair=ctx.pair,
+            amount_in=ctx.amount_in,
+            amount_out=amount_out,
+            is_buy=ctx.is_buy,
+            signer=ctx.signer,
+            bot=ctx.bot,
+        ))
+
+    def handle_dropped(self, pending: PendingTx) -> None:
+        ctx = pending.context
+        self.accounts[ctx.idx].nonce_manager.reset(pending.nonce)
+        for broadcast_hash in pending.tx_hashes:
+            self.broadcaster.record_inclusion(broadcast_hash, False)
+        for position_ctx in (ctx.batch if ctx.batch is not None else [ctx]):
+            self.acknowledge(position_ctx, None)
+
+    def acknowledge(self, ctx, ack, update_bot=True) -> None:
+        # called once per live order, whichever way it ends
+        self.signer_scheduler.release(ctx.idx)
+
+        if ack is None:
             ack = ExecutionAck(
-                lead_block=lead_block,
-                block_number=lead_block,
+                lead_block=ctx.lead_block,
+                block_number=ctx.lead_block,
                 tx_hash='0x',
                 tx_status=TxStatus.FAILED,
-                pair=pair,
-                amount_in=amount_in,
+                pair=ctx.pair,
+                amount_in=ctx.amount_in,
                 amount_out=0,
-                is_buy=is_buy,
-                signer=signer,
-                bot=bot.address,
+                is_buy=ctx.is_buy,
+                signer=ctx.signer,
+                bot=ctx.bot,
             )
-
             logging.warning(f"EXECUTOR failed execution ack {ack}")
-            self.report_sender.put(ack)
+        else:
+            logging.warning(f"EXECUTOR Acknowledgement {ack}")
 
-        # update bot status
-        if self.bot_db and self.accounts[idx].bot is not None:
-            self.bot_factory.order_broker.put(BotUpdateOrder(self.accounts[idx].bot,ack))
-            if ack.is_buy:
-                self.accounts[idx].bot.is_holding=True
-            else:
-                self.accounts[idx].bot.is_holding=False
-                self.accounts[idx].bot.number_used=self.accounts[idx].bot.number_used+1
-                if ack.tx_status != constants.TX_SUCCESS_STATUS:
-                    self.accounts[idx].bot.is_failed=True
-
-                # renew bot
-                if self.accounts[idx].bot.number_used>=BOT_MAX_NUMBER_USED or self.accounts[idx].bot.is_failed:
-                    logging.warning(f"EXECUTOR bot {self.accounts[idx].bot.address} of account {signer} reached max usage {BOT_MAX_NUMBER_USED} or failure, replace it with new created bot")
-                    self.accounts[idx].bot = None
-                    self.bot_factory.order_broker.put(BotCreationOrder(self.accounts[idx].w3_account.address))
+        self.report_sender.put(ack)
 
-    @timer_decorator
-    def execute_paper(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None):
-        signer = self.accounts[idx].w3_account.address
-        if bot is None:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(self.accounts[idx].bot.address),abi=self.bot_abi)
-        else:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(bot),abi=self.bot_abi)
+        if update_bot:
+            self.update_bot(ctx, ack)
+
+    def update_bot(self, ctx, ack) -> None:
+        idx = ctx.idx
+        bot = self.accounts[idx].bot
 
-        if is_buy:
-            result = self.simulator.buy(pair.token, amount_in, signer, bot.address)
-            logging.warning(f"EXECUTOR Paper:: Buy result {result}")
+        # the bot of the order may be retired already, e.g. by another position of the same sellMany
+        if not self.bot_db or bot is None or ctx.bot is None or bot.address.lower() != ctx.bot.lower():
+            return
+
+        self.bot_factory.order_broker.put(BotUpdateOrder(bot,ack))
+        if ack.is_buy:
+            bot.is_holding=True
         else:
-            result = self.simulator.sell(pair.token, amount_in, signer, bot.address)
-            logging.warning(f"EXECUTOR Paper:: Sell result {result}")
+            bot.is_holding=False
+            bot.number_used=bot.number_used+1
+            if ack.tx_status != constants.TX_SUCCESS_STATUS:
+                bot.is_failed=True
+
+            # renew bot
+            if bot.number_used>=BOT_MAX_NUMBER_USED or bot.is_failed:
+                owner = self.accounts[idx].w3_account.address
+                spare = self.bot_factory.pool.take(owner)
+                if spare is not None:
+                    # deployed ahead, the account keeps trading while the factory tops the pool up
+                    logging.warning(f"EXECUTOR bot {bot.address} of account {ctx.signer} reached max usage {BOT_MAX_NUMBER_USED} or failure, replace it with spare bot {spare.address}")
+                    self.accounts[idx].bot = spare
+                    self.signer_scheduler.dispatch()
+                    self.bot_factory.order_broker.put(BotCreationOrder(owner, is_spare=True))
+                else:
+                    logging.warning(f"EXECUTOR bot {bot.address} of account {ctx.signer} reached max usage {BOT_MAX_NUMBER_USED} or failure, replace it with new created bot")
+                    self.accounts[idx].bot = None
+                    self.bot_factory.order_broker.put(BotCreationOrder(owner))
+
+    def reject(self, order: ExecutionOrder) -> None:
+        # no account took the order, main is still acked to unlock it; there is no slot to release nor bot to update
+        ack = ExecutionAck(
+            lead_block=order.block_number,
+            block_number=order.block_number,
+            tx_hash='0x',
+            tx_status=TxStatus.REJECTED,
+            pair=order.pair,
+            amount_in=order.amount_in,
+            amount_out=0,
+            is_buy=order.is_buy,
+            signer=order.signer,
+            bot=order.bot,
+            is_paper=order.is_paper,
+        )
+        logging.warning(f"EXECUTOR rejected order ack {ack}")
+        self.report_sender.put(ack)
 
-        if result is not None:
-            ack = ExecutionAck(
-                lead_block=lead_block,
-                block_number=lead_block,
-                tx_hash='0x',
-                tx_status=TxStatus.SUCCESS,
-                pair=pair,
-                amount_in=amount_in,
-                amount_out=Web3.from_wei(result[0][1], 'ether'),
-                is_buy=is_buy,
-                signer=signer,
-                bot=bot.address,
-                is_paper=True,
-            )
+    @async_timer_decorator
+    async def execute_paper(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None) -> ExecutionResult:
+        signer = self.accounts[idx].w3_account.address
+        bot = Web3.to_checksum_address(bot if bot is not None else self.accounts[idx].bot.address)
 
+        # the fork is blocking, paper orders are the only ones going through a thread
+        try:
+            if is_buy:
+                result = await asyncio.to_thread(self.paper_engine.buy, pair.token, amount_in, signer, bot)
+                logging.warning(f"EXECUTOR Paper:: Buy result {result}")
+            else:
+                result = await asyncio.to_thread(self.paper_engine.sell, pair.token, amount_in, signer, bot)
+                logging.warning(f"EXECUTOR Paper:: Sell result {result}")
+        except Exception as e:
+            result = None
+            logging.error(f"EXECUTOR Paper:: order {pair.address} isBuy {is_buy} error {e}")
+
+        ack = ExecutionAck(
+            lead_block=lead_block,
+            block_number=lead_block,
+            tx_hash='0x',
+            tx_status=TxStatus.SUCCESS if result is not None else TxStatus.FAILED,
+            pair=pair,
+            amount_in=amount_in,
+            amount_out=Web3.from_wei(result[1], 'ether') if result is not None else 0,
+            is_buy=is_buy,
+            signer=signer,
+            bot=bot,
+            is_paper=True,
+        )
+        if result is not None:
             logging.info(f"EXECUTOR Acknowledgement {ack}")
-            self.report_sender.put(ack)
         else:
-            ack = ExecutionAck(
-                lead_block=lead_block,
-                block_number=lead_block,
-                tx_hash='0x',
-                tx_status=TxStatus.FAILED,
-                pair=pair,
-                amount_in=amount_in,
-                amount_out=0,
-                is_buy=is_buy,
-                signer=signer,
-                bot=bot.address,
-                is_paper=True,
-            )
-
             logging.info(f"EXECUTOR failed execution ack {ack}")
-            self.report_sender.put(ack)
+        self.report_sender.put(ack)
+
+        return ExecutionResult(None, ExecutionStatus.SENT if result is not None else ExecutionStatus.FAILED, pair, is_buy, signer)
 
     async def handle_bot_result(self):
         while True:
@@ -237,88 +459,156 @@ class BuySellExecutor(BaseExecutor):
                     if (acct.bot is None or acct.bot.number_used >= BOT_MAX_NUMBER_USED or acct.bot.is_failed) and acct.w3_account.address.lower()==result.owner.lower():
                         logging.warning(f"EXECUTOR created bot {result} for account #{idx} {acct.w3_account.address}")
                         acct.bot = result
+                        self.signer_scheduler.dispatch()
 
-    async def handle_execution_order(self):
-        global glb_lock
+    async def run_order(self, order_id, order: ExecutionOrder) -> ExecutionResult:
+        start_time = time.perf_counter()
+
+        idx = await self.signer_scheduler.acquire(order_id, order)
+        if idx is None:
+            result = ExecutionResult(order_id, ExecutionStatus.REJECTED, order.pair, order.is_buy, order.signer, error="no ready account", elapsed=time.perf_counter() - start_time)
+            self.results[result.status] += 1
+            self.reject(order)
+            logging.warning(f"EXECUTOR {result}")
+            return result
+
+        try:
+            deadline = order.block_timestamp + self.deadline_delay if order.block_timestamp > 0 else await self.get_block_timestamp() + self.deadline_delay
+        except Exception as e:
+            deadline = int(time.time()) + self.deadline_delay
+            logging.error(f"EXECUTOR get block timestamp error {e}, deadline from local clock")
+
+        if order.is_paper:
+            execution = self.execute_paper(idx, order.block_number, order.is_buy, order.pair, order.amount_in, order.amount_out_min, deadline, order.bot)
+        else:
+            execution = self.execute(idx, order.block_number, order.is_buy, order.pair, order.amount_in, order.amount_out_min, deadline, order.bot, order.priority_fee)
+
+        try:
+            # a paper order isn't timed out, its thread would commit to the fork after the order is given up
+            result = await asyncio.wait_for(execution, timeout=self.order_timeout if not order.is_paper else None)
+        except asyncio.TimeoutError:
+            result = ExecutionResult(None, ExecutionStatus.TIMEOUT, order.pair, order.is_buy, self.accounts[idx].w3_account.address, error=f"timeout {self.order_timeout}s")
+        except Exception as e:
+            result = ExecutionResult(None, ExecutionStatus.FAILED, order.pair, order.is_buy, self.accounts[idx].w3_account.address, error=str(e))
+        finally:
+            if order.is_paper:
+                # paper orders have nothing in-flight once simulated
+                self.signer_scheduler.release(idx)
+
+        result.order_id = order_id
+        result.elapsed = time.perf_counter() - start_time
+        self.results[result.status] += 1
+
+        if result.status == ExecutionStatus.SENT:
+            logging.info(f"EXECUTOR {result}")
+        else:
+            logging.warning(f"EXECUTOR {result}")
+        return result
+
+    def submit_order(self, order_id, order: ExecutionOrder) -> asyncio.Task:
+        # one task per order, kept referenced until done
+        task = asyncio.create_task(self.run_order(order_id, order))
+        self.order_tasks.add(task)
+        task.add_done_callback(self.order_tasks.discard)
+        return task
+
+    async def run_sell_batch(self, order_ids, orders) -> list:
+        start_time = time.perf_counter()
+
+        # the slot of every position is taken on the holding account, they are released ack by ack
+        accepted = []
+        results = []
+        idx = None
+        for order_id, order in zip(order_ids, orders):
+            order_idx = await self.signer_scheduler.acquire(order_id, order)
+            if order_idx is None:
+                results.append(ExecutionResult(order_id, ExecutionStatus.REJECTED, order.pair, False, order.signer, error="no ready account"))
+                self.reject(order)
+            else:
+                idx = order_idx
+                accepted.append((order_id, order))
+
+        if len(accepted) > 0:
+            order = accepted[0][1]
+            deadline = order.block_timestamp + self.deadline_delay if order.block_timestamp > 0 else int(time.time()) + self.deadline_delay
+            try:
+                batch_result = await asyncio.wait_for(self.execute_sell_batch(idx, [order for _,order in accepted], deadline), timeout=self.order_timeout)
+            except asyncio.TimeoutError:
+                batch_result = ExecutionResult(None, ExecutionStatus.TIMEOUT, None, False, order.signer, error=f"timeout {self.order_timeout}s")
+            except Exception as e:
+                batch_result = ExecutionResult(None, ExecutionStatus.FAILED, None, False, order.signer, error=str(e))
+
+            for order_id, order in accepted:
+                results.append(ExecutionResult(order_id, batch_result.status, order.pair, False, batch_result.signer, batch_result.tx_hash, batch_result.error))
+
+        for result in results:
+            result.elapsed = time.perf_counter() - start_time
+            self.results[result.status] += 1
+            if result.status == ExecutionStatus.SENT:
+                logging.info(f"EXECUTOR {result}")
+            else:
+                logging.warning(f"EXECUTOR {result}")
+        return results
+
+    def is_batchable(self, order: ExecutionOrder) -> bool:
+        # urgent sells with their own priority fee go alone
+        return SELL_BATCH_WINDOW_SECONDS > 0 and not order.is_buy and not order.is_paper and order.signer is not None \
+                and order.bot is not None and order.priority_fee is None
+
+    async def flush_sell_batch(self, key):
+        await asyncio.sleep(SELL_BATCH_WINDOW_SECONDS)
+        batch = self.sell_batches.pop(key, [])
+        if len(batch) == 1:
+            order_id, order = batch[0]
+            await self.run_order(order_id, order)
+        elif len(batch) > 1:
+            await self.run_sell_batch([order_id for order_id,_ in batch], [order for _,order in batch])
+
+    def batch_sell_order(self, order_id, order: ExecutionOrder) -> None:
+        key = (order.signer.lower(), order.bot.lower())
+        if key not in self.sell_batches:
+            self.sell_batches[key] = []
+            task = asyncio.create_task(self.flush_sell_batch(key))
+            self.order_tasks.add(task)
+            task.add_done_callback(self.order_tasks.discard)
+        self.sell_batches[key].append((order_id, order))
 
+    async def handle_execution_order(self):
         logging.warning(f"EXECUTOR listen for order...")
-        executor = ThreadPoolExecutor(max_workers=len(self.accounts))
         counter = 0
         while True:
             execution_data = await self.order_receiver.coro_get()
 
-            if execution_data is not None and isinstance(execution_data, ExecutionOrder):
-                with glb_lock:
-                    counter += 1
-
+            if execution_data is not None and isinstance(execution_data, BlockData):
+                self.fee_predictor.update(execution_data.block_number, execution_data.base_fee, execution_data.gas_used, execution_data.gas_limit)
+                self.sell_ladders.refresh()
+                if self.paper_task is None or self.paper_task.done():
+                    # a head still being carried over by the paper fork is skipped for the next one
+                    self.paper_task = asyncio.create_task(asyncio.to_thread(self.paper_engine.on_block, execution_data.block_number, execution_data.block_timestamp))
+                if len(self.receipt_tracker) > 0:
+                    task = asyncio.create_task(self.on_block(execution_data.block_number))
+                    self.tracker_tasks.add(task)
+                    task.add_done_callback(self.tracker_tasks.discard)
+                else:
+                    self.receipt_tracker.head = execution_data.block_number
+            elif execution_data is not None and isinstance(execution_data, ExecutionOrder):
+                counter += 1
                 logging.warning(f"EXECUTOR receive order #{counter} {execution_data}")
-                deadline = execution_data.block_timestamp + self.deadline_delay if execution_data.block_timestamp > 0 else self.get_block_timestamp() + self.deadline_delay
-                
-                if execution_data.signer is None:
-                    idx = (counter - 1) % len(self.accounts)
-
-                    if self.accounts[idx].bot is not None:
-                        if execution_data.is_paper:
-                            future = executor.submit(self.execute_paper,
-                                                idx,
-                                                execution_data.block_number,
-                                                execution_data.is_buy,
-                                                execution_data.pair,
-                                                execution_data.amount_in,
-                                                execution_data.amount_out_min, 
-                                                deadline,
-                                                )
-                        else:
-                            future = executor.submit(self.execute,
-                                                idx,
-                                                execution_data.block_number,
-                                                execution_data.is_buy,
-                                                execution_data.pair,
-                                                execution_data.amount_in,
-                                                execution_data.amount_out_min, 
-                                                deadline,
-                                                )
-                    else:
-                        logging.warning(f"EXECUTOR order dropped due to account #{idx} {self.accounts[idx].w3_account.address} has no bot")
+                if self.is_batchable(execution_data):
+                    self.batch_sell_order(counter, execution_data)
                 else:
-                    idx = None
-                    for idx, acct in enumerate(self.accounts):
-                        if acct.w3_account.address.lower() == execution_data.signer.lower():
-                            id = idx
-                            break
-                    if idx is not None:
-                        if execution_data.is_paper:
-                            future = executor.submit(self.execute_paper,
-                                idx,
-                                execution_data.block_number,
-                                execution_data.is_buy,
-                                execution_data.pair,
-                                execution_data.amount_in,
-                                execution_data.amount_out_min, 
-                                deadline,
-                                execution_data.bot,
-                            )
-                        else:
-                            future = executor.submit(self.execute,
-                                idx,
-                                execution_data.block_number,
-                                execution_data.is_buy,
-                                execution_data.pair,
-                                execution_data.amount_in,
-                                execution_data.amount_out_min, 
-                                deadline,
-                                execution_data.bot,
-                            )
-                    else:
-                        logging.error(f"EXECUTOR not found signer for order {execution_data}")
+                    self.submit_order(counter, execution_data)
             else:
                 logging.warning(f"EXECUTOR invalid order {execution_data}")
 
     async def run(self):
+        tasks = [self.handle_execution_order(), self.broadcaster.run(), self.signer_scheduler.run(self.aw3, SIGNER_BALANCE_INTERVAL_SECONDS)]
         if self.bot_db:
-            await asyncio.gather(self.handle_execution_order(), self.bot_factory.run(), self.handle_bot_result())
-        else:
-            await self.handle_execution_order()
+            tasks += [self.bot_factory.run(), self.handle_bot_result()]
+        if FEE_HISTORY_INTERVAL_SECONDS > 0:
+            tasks.append(self.fee_predictor.run(self.w3, FEE_HISTORY_INTERVAL_SECONDS))
+
+        await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
@@ -368,6 +658,9 @@ if __name__ == "__main__":
             token='0xf16b58d2bdb36a9be9ba9d4b847b909bf7297955',
             token_index=1,
         )
+        assert isinstance(executor.gas_limit_of(pair, True), int) and executor.gas_limit_of(pair, False) == EXECUTION_GAS_LIMIT
+        measured=Pair(address=pair.address, token=pair.token, token_index=1, buy_gas_used=150000, sell_gas_used=200000)
+        assert isinstance(executor.gas_limit_of(measured, False), int) and executor.gas_limit_of(measured, True) == int(150000*EXECUTION_GAS_MARGIN)
         # BUY
         # order_receiver.put(ExecutionOrder(
         #     block_number=0, 
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+class NonceManager:
+    """
+    Hands out the nonces of one account locally. Seeded once from the pending transaction count and
+    only resynced after a transaction failed to land while none other was in flight, so that several
+    transactions of the same account can be in flight at once.
+    """
+    def __init__(self, w3, address, aw3=None) -> None:
+        self.w3 = w3
+        self.aw3 = aw3 # resyncs from the executor loop go through the async provider
+        self.address = address
+
+        self.next_nonce = None
+        self.in_flight = set()
+        self.lock = asyncio.Lock()
+
+    def sync(self) -> int:
+        self.next_nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+        logging.info(f"EXECUTOR account {self.address} nonce synced to {self.next_nonce} in-flight {sorted(self.in_flight)}")
+        return self.next_nonce
+
+    async def async_sync(self) -> int:
+        self.next_nonce = await self.aw3.eth.get_transaction_count(self.address, 'pending')
+        logging.info(f"EXECUTOR account {self.address} nonce synced to {self.next_nonce} in-flight {sorted(self.in_flight)}")
+        return self.next_nonce
+
+    async def acquire(self) -> int:
+        # orders awaiting a resync queue up on the lock instead of each reading the same pending count
+        async with self.lock:
+            if self.next_nonce is None:
+                await self.async_sync()
+
+            nonce = self.next_nonce
+            while nonce in self.in_flight:
+                # a freed nonce was handed out again below those still in flight
+                nonce += 1
+            self.next_nonce = nonce + 1
+            self.in_flight.add(nonce)
+
+            return nonce
+
+    def peek(self):
+        # the nonce the next acquire hands out, None while a resync is pending
+        if self.next_nonce is None:
+            return None
+        nonce = self.next_nonce
+        while nonce in self.in_flight:
+            nonce += 1
+        return nonce
+
+    def release(self, nonce) -> None:
+        # the transaction is mined, its nonce is consumed whatever the status
+        self.in_flight.discard(nonce)
+
+    def reset(self, nonce) -> None:
+        # the transaction was rejected or dropped, its nonce goes out again so the ones above it can land
+        self.in_flight.discard(nonce)
+        if len(self.in_flight) == 0:
+            # nothing left to strand, the node tells which nonce comes next upon the next acquire
+            self.next_nonce = None
+        elif self.next_nonce is not None:
+            self.next_nonce = min(self.next_nonce, nonce)
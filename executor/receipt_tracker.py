@@ -0,0 +1,257 @@
+import os
+import logging
+import threading
+import itertools
+
+import aiohttp
+
+import sys # for testing
+sys.path.append('..')
+
+RECEIPT_TIMEOUT_BLOCKS=int(os.environ.get('RECEIPT_TIMEOUT_BLOCKS', '10'))
+
+class PendingTx:
+    def __init__(self, tx_hash, nonce, sent_block, context=None, fees=None, replaceable=False, sender=None) -> None:
+        self.tx_hash = tx_hash.lower() # latest broadcast
+        self.tx_hashes = [self.tx_hash] # every broadcast with this nonce, any of them may land
+        self.nonce = nonce
+        self.sender = sender # whose nonce is checked before the tx is declared dropped
+        self.sent_block = sent_block
+        self.last_sent_block = sent_block
+        self.checked_block = sent_block # last time the tx was found still waiting in the mempool
+        self.context = context # whatever the owner needs to acknowledge the tx
+
+        self.fees = fees # maxFeePerGas and maxPriorityFeePerGas of the latest broadcast
+        self.replaceable = replaceable
+        self.attempts = 0
+
+    def __str__(self) -> str:
+        return f"PendingTx {self.tx_hash} nonce {self.nonce} sentBlock #{self.sent_block} replacements {self.attempts}"
+
+class ReceiptTracker:
+    """
+    Holds every in-flight transaction and resolves them in bulk on each new head, from the receipts of
+    that block and of any head skipped since the last scan (eth_getBlockReceipts). A single JSON-RPC batch
+    of eth_getTransactionReceipt is only sent when a scan failed. No polling in between heads.
+    """
+    def __init__(self, http_url, on_receipt, on_dropped, timeout_blocks=RECEIPT_TIMEOUT_BLOCKS) -> None:
+        """
+        :param on_receipt: callable (PendingTx, receipt) with receipt fields decoded to int where numeric.
+        :param on_dropped: callable (PendingTx) for a tx without receipt after timeout_blocks whose nonce
+            was either taken by another tx or isn't in the mempool anymore.
+        """
+        self.http_url = http_url
+        self.on_receipt = on_receipt
+        self.on_dropped = on_dropped
+        self.timeout_blocks = timeout_blocks
+
+        self.head = 0
+        self.scanned_block = 0 # receipts of every block up to this one have been scanned
+        self.pending = {} # tx hash -> PendingTx
+        self.lock = threading.Lock()
+
+        self.block_receipts_supported = True
+        self.session = None
+        self.counter = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def track(self, pending: PendingTx) -> None:
+        # called from the executor loop right before broadcast
+        with self.lock:
+            self.pending[pending.tx_hash] = pending
+        logging.debug(f"EXECUTOR track {pending}")
+
+    def untrack(self, tx_hash):
+        with self.lock:
+            pending = self.pending.pop(tx_hash.lower(), None)
+            if pending is not None:
+                for replaced_hash in pending.tx_hashes:
+                    self.pending.pop(replaced_hash, None)
+            return pending
+
+    def replace(self, pending: PendingTx, tx_hash, fees, block_number) -> bool:
+        # same nonce broadcast again, the previous hashes stay tracked until one of them lands
+        tx_hash = tx_hash.lower()
+        with self.lock:
+            if self.pending.get(pending.tx_hash) is not pending:
+                return False
+
+            pending.tx_hash = tx_hash
+            pending.tx_hashes.append(tx_hash)
+            pending.fees = fees
+            pending.attempts += 1
+            pending.last_sent_block = block_number
+            self.pending[tx_hash] = pending
+
+        logging.info(f"EXECUTOR replaced by {pending}")
+        return True
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return list({id(pending): pending for pending in self.pending.values()}.values())
+
+    async def rpc(self, payload):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        async with self.session.post(self.http_url, json=payload) as response:
+            return await response.json(content_type=None)
+
+    async def get_block_receipts(self, block_number):
+        response = await self.rpc({"jsonrpc": "2.0", "id": next(self.counter), "method": "eth_getBlockReceipts", "params": [hex(block_number)]})
+        if response.get('error') is not None:
+            raise Exception(response['error'])
+        return response.get('result') or []
+
+    async def get_receipts(self, tx_hashes):
+        ids = {}
+        payload = []
+        for tx_hash in tx_hashes:
+            request_id = next(self.counter)
+            ids[request_id] = tx_hash
+            payload.append({"jsonrpc": "2.0", "id": request_id, "method": "eth_getTransactionReceipt", "params": [tx_hash]})
+
+        receipts = []
+        for response in await self.rpc(payload):
+            if response.get('result') is not None:
+                receipts.append(response['result'])
+            elif response.get('error') is not None:
+                logging.error(f"EXECUTOR get receipt {ids.get(response.get('id'))} error {response['error']}")
+        return receipts
+
+    async def get_nonces(self, senders):
+        # sender -> (latest nonce, pending nonce)
+        ids = {}
+        payload = []
+        for sender in senders:
+            for tag in ('latest', 'pending'):
+                request_id = next(self.counter)
+                ids[request_id] = (sender, tag)
+                payload.append({"jsonrpc": "2.0", "id": request_id, "method": "eth_getTransactionCount", "params": [sender, tag]})
+
+        counts = {}
+        for response in await self.rpc(payload):
+            if response.get('result') is not None and response.get('id') in ids:
+                counts[ids[response['id']]] = int(response['result'], 16)
+            elif response.get('error') is not None:
+                logging.error(f"EXECUTOR get nonce {ids.get(response.get('id'))} error {response['error']}")
+
+        return {sender: (counts[(sender, 'latest')], counts[(sender, 'pending')]) for sender in senders
+                if (sender, 'latest') in counts and (sender, 'pending') in counts}
+
+    @staticmethod
+    def decode_receipt(receipt) -> dict:
+        return {
+            'transactionHash': receipt['transactionHash'].lower(),
+            'blockNumber': int(receipt['blockNumber'], 16),
+            'status': int(receipt['status'], 16),
+            'gasUsed': int(receipt['gasUsed'], 16),
+            'effectiveGasPrice': int(receipt.get('effectiveGasPrice', '0x0'), 16),
+            'logs': receipt.get('logs', []),
+        }
+
+    async def on_block(self, block_number) -> None:
+        self.head = max(self.head, block_number)
+        with self.lock:
+            pending = dict(self.pending)
+        if len(pending) == 0:
+            # nothing in flight can land in the blocks up to this head
+            self.scanned_block = max(self.scanned_block, block_number)
+            return
+
+        receipts = {}
+        scanned = False
+        if self.block_receipts_supported:
+            # heads skipped since the last scan are scanned too, no older than a tx may wait before the drop check
+            first_block = block_number
+            if 0 < self.scanned_block < block_number:
+                first_block = max(self.scanned_block + 1, block_number - self.timeout_blocks + 1)
+            try:
+                for number in range(first_block, block_number + 1):
+                    for receipt in await self.get_block_receipts(number):
+                        if receipt['transactionHash'].lower() in pending:
+                            receipts[receipt['transactionHash'].lower()] = receipt
+                scanned = True
+                self.scanned_block = max(self.scanned_block, block_number)
+            except Exception as e:
+                logging.error(f"EXECUTOR eth_getBlockReceipts #{block_number} error {e}, fall back to batched receipts")
+                error = e.args[0] if len(e.args) > 0 else None
+                if isinstance(error, dict) and error.get('code') == -32601:
+                    # method not found, the endpoint will never serve it
+                    self.block_receipts_supported = False
+
+        if not scanned:
+            missing = [tx_hash for tx_hash in pending.keys() if tx_hash not in receipts]
+            try:
+                for receipt in await self.get_receipts(missing):
+                    receipts[receipt['transactionHash'].lower()] = receipt
+            except Exception as e:
+                logging.error(f"EXECUTOR batched receipts of {len(missing)} txs error {e}")
+
+        self.resolve(receipts)
+
+        expired = list({id(tx): tx for tx_hash,tx in pending.items()
+                        if tx_hash not in receipts and block_number - max(tx.last_sent_block, tx.checked_block) >= self.timeout_blocks}.values())
+        if len(expired) > 0:
+            await self.check_expired(expired, block_number)
+
+    def resolve(self, receipts) -> None:
+        for tx_hash, receipt in receipts.items():
+            tx = self.untrack(tx_hash)
+            if tx is None:
+                continue
+            try:
+                self.on_receipt(tx, self.decode_receipt(receipt))
+            except Exception as e:
+                logging.error(f"EXECUTOR handle receipt of {tx} error {e}")
+
+    async def check_expired(self, expired, block_number) -> None:
+        # a tx without receipt is only dropped once its nonce is known to be free or taken by another tx
+        try:
+            nonces = await self.get_nonces({tx.sender for tx in expired if tx.sender is not None})
+        except Exception as e:
+            logging.error(f"EXECUTOR nonces of {len(expired)} expired txs error {e}, keep watching")
+            return
+
+        consumed = []
+        dropped = []
+        for tx in expired:
+            if tx.sender is None:
+                dropped.append(tx)
+            elif tx.sender not in nonces:
+                continue
+            elif nonces[tx.sender][0] > tx.nonce:
+                consumed.append(tx)
+            elif nonces[tx.sender][1] > tx.nonce:
+                logging.info(f"EXECUTOR {tx} still in the mempool after {self.timeout_blocks} blocks, keep watching")
+                tx.checked_block = block_number
+            else:
+                dropped.append(tx)
+
+        if len(consumed) > 0:
+            # the nonce landed in a block the tracker didn't see, possibly with one of our broadcasts
+            try:
+                receipts = {receipt['transactionHash'].lower(): receipt
+                            for receipt in await self.get_receipts([tx_hash for tx in consumed for tx_hash in tx.tx_hashes])}
+            except Exception as e:
+                logging.error(f"EXECUTOR receipts of {len(consumed)} expired txs error {e}, keep watching")
+                receipts = None
+
+            if receipts is not None:
+                self.resolve(receipts)
+                dropped += [tx for tx in consumed if not any([tx_hash in receipts for tx_hash in tx.tx_hashes])]
+
+        for tx in dropped:
+            if self.untrack(tx.tx_hash) is None:
+                continue
+            logging.warning(f"EXECUTOR {tx} dropped without receipt after {self.timeout_blocks} blocks")
+            try:
+                self.on_dropped(tx)
+            except Exception as e:
+                logging.error(f"EXECUTOR handle dropped {tx} error {e}")
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
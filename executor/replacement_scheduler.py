@@ -0,0 +1,109 @@
+import asyncio
+import os
+import logging
+import math
+
+import sys # for testing
+sys.path.append('..')
+
+REPLACEMENT_AFTER_BLOCKS=int(os.environ.get('REPLACEMENT_AFTER_BLOCKS', '2'))
+REPLACEMENT_FEE_MULTIPLIER=float(os.environ.get('REPLACEMENT_FEE_MULTIPLIER', '1.5'))
+REPLACEMENT_MAX_PRIORITY_FEE_GWEI=float(os.environ.get('REPLACEMENT_MAX_PRIORITY_FEE_GWEI', '50'))
+REPLACEMENT_MAX_ATTEMPTS=int(os.environ.get('REPLACEMENT_MAX_ATTEMPTS', '5'))
+
+# nodes refuse a replacement which doesn't raise both fee fields by at least 10%
+MIN_REPLACEMENT_BUMP=1.1
+
+class ReplacementScheduler:
+    """
+    Rebroadcasts the replaceable transactions of the receipt tracker still pending after a few blocks,
+    with the same nonce and the priority fee multiplied on each attempt up to a cap. The fee of attempt n
+    is the initial one times multiplier^n, so a stuck liquidation clears within a bounded number of blocks.
+    """
+    def __init__(self, receipt_tracker, fee_predictor, replace, after_blocks=REPLACEMENT_AFTER_BLOCKS, multiplier=REPLACEMENT_FEE_MULTIPLIER, \
+                max_priority_fee=int(REPLACEMENT_MAX_PRIORITY_FEE_GWEI*10**9), max_attempts=REPLACEMENT_MAX_ATTEMPTS) -> None:
+        """
+        :param replace: coroutine (PendingTx, fees) which rebuilds, signs and broadcasts the tx with the given
+                        fee fields and returns its hash.
+        """
+        self.receipt_tracker = receipt_tracker
+        self.fee_predictor = fee_predictor
+        self.replace = replace
+
+        self.after_blocks = after_blocks
+        self.multiplier = max(multiplier, MIN_REPLACEMENT_BUMP)
+        self.max_priority_fee = max_priority_fee
+        self.max_attempts = max_attempts
+
+    def next_fees(self, pending):
+        priority_fee = pending.fees['maxPriorityFeePerGas']
+        min_priority_fee = math.ceil(priority_fee*MIN_REPLACEMENT_BUMP)
+
+        next_priority_fee = min(math.ceil(priority_fee*self.multiplier), self.max_priority_fee)
+        if next_priority_fee < min_priority_fee:
+            # capped, a smaller bump would be rejected as underpriced
+            return None
+
+        # the predicted max fee may have dropped with the base fee since the previous attempt
+        max_fee = math.ceil(pending.fees['maxFeePerGas']*MIN_REPLACEMENT_BUMP)
+        if self.fee_predictor.is_ready():
+            max_fee = max(max_fee, self.fee_predictor.max_fee_per_gas(next_priority_fee))
+
+        return {
+            "maxFeePerGas": max(max_fee, next_priority_fee),
+            "maxPriorityFeePerGas": next_priority_fee,
+        }
+
+    def is_due(self, pending, block_number) -> bool:
+        return pending.replaceable and pending.fees is not None and pending.attempts < self.max_attempts \
+                and block_number - pending.last_sent_block >= self.after_blocks
+
+    async def escalate(self, pending, block_number) -> None:
+        fees = self.next_fees(pending)
+        if fees is None:
+            logging.debug(f"EXECUTOR {pending} priority fee capped at {self.max_priority_fee}")
+            return
+
+        try:
+            tx_hash = await self.replace(pending, fees)
+        except Exception as e:
+            # mostly the previous one landed meanwhile, the tracker resolves it; otherwise retried next block
+            logging.error(f"EXECUTOR replacement of {pending} error {e}")
+            return
+
+        if self.receipt_tracker.replace(pending, tx_hash, fees, block_number):
+            logging.warning(f"EXECUTOR stuck tx nonce {pending.nonce} rebroadcast #{pending.attempts} as {tx_hash} maxFeePerGas {fees['maxFeePerGas']} maxPriorityFeePerGas {fees['maxPriorityFeePerGas']}")
+
+    async def on_block(self, block_number) -> None:
+        due = [pending for pending in self.receipt_tracker.snapshot() if self.is_due(pending, block_number)]
+        if len(due) > 0:
+            await asyncio.gather(*[self.escalate(pending, block_number) for pending in due])
+
+if __name__=="__main__":
+    from helpers import FeePredictor
+    from executor.receipt_tracker import ReceiptTracker, PendingTx
+
+    logging.basicConfig(level=logging.INFO)
+
+    # fee curve of a sell stuck from block 100, with the base fee dropping meanwhile
+    fee_predictor = FeePredictor(10**9)
+    receipt_tracker = ReceiptTracker("http://127.0.0.1:8545", None, None)
+
+    async def replace(pending, fees):
+        return '0x' + f"{pending.attempts+1:02x}"*32
+
+    scheduler = ReplacementScheduler(receipt_tracker, fee_predictor, replace, after_blocks=2, multiplier=1.5, max_priority_fee=5*10**9, max_attempts=10)
+
+    async def run_all():
+        fee_predictor.update(100, 10**8, 15*10**6, 30*10**6)
+        pending = PendingTx('0x' + '00'*32, 7, 100, fees=fee_predictor.fee_fields(), replaceable=True)
+        receipt_tracker.track(pending)
+
+        for block_number in range(101, 115):
+            fee_predictor.update(block_number, 10**8 - block_number*10**5, 10*10**6, 30*10**6)
+            await scheduler.on_block(block_number)
+            logging.info(f"block #{block_number} {pending} fees {pending.fees}")
+
+        assert len(receipt_tracker.snapshot()) == 1 and pending.fees['maxPriorityFeePerGas'] <= 5*10**9
+
+    asyncio.run(run_all())
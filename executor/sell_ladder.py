@@ -0,0 +1,145 @@
+import os
+import logging
+import time
+
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+SELL_LADDER_MULTIPLIERS=[float(multiplier) for multiplier in os.environ.get('SELL_LADDER_MULTIPLIERS', '1,2,4').split(',')] # of the predicted priority fee
+
+class PresignedSell:
+    def __init__(self, nonce, priority_fee, fees, deadline, signed) -> None:
+        self.nonce = nonce
+        self.priority_fee = priority_fee
+        self.fees = fees
+        self.deadline = deadline
+        self.signed = signed
+        self.tx_hash = Web3.to_hex(signed.hash)
+
+class SellLadder:
+    def __init__(self, idx, bot, token, gas_limit=None) -> None:
+        self.idx = idx
+        self.bot = bot
+        self.token = token
+        self.gas_limit = gas_limit # of the token, the book default if None
+
+        self.nonce = None
+        self.block_number = 0
+        self.rungs = [] # PresignedSell by increasing priority fee
+
+class SellLadderBook:
+    """
+    Signed sells of every open position, one per priority fee level, kept ready for the next nonce of the
+    holding account. They are re-signed when that nonce or the predicted fees change, so that a liquidation
+    is only a broadcast.
+    """
+    def __init__(self, accounts, tx_builder, fee_predictor, gas_limit, deadline_delay, multipliers=SELL_LADDER_MULTIPLIERS) -> None:
+        self.accounts = accounts
+        self.tx_builder = tx_builder
+        self.fee_predictor = fee_predictor
+        self.gas_limit = gas_limit
+        self.deadline_delay = deadline_delay
+        self.multipliers = sorted(multipliers)
+
+        self.ladders = {} # pair address -> SellLadder
+
+    def __len__(self) -> int:
+        return len(self.ladders)
+
+    def prepare(self, pair_address, idx, bot, token, gas_limit=None) -> None:
+        self.ladders[pair_address.lower()] = SellLadder(idx, Web3.to_checksum_address(bot), Web3.to_checksum_address(token), gas_limit)
+        self.refresh()
+
+    def discard(self, pair_address):
+        return self.ladders.pop(pair_address.lower(), None)
+
+    def sign(self, ladder, nonce) -> None:
+        acct = self.accounts[ladder.idx]
+        signer = acct.w3_account.address
+        deadline = int(time.time()) + self.deadline_delay
+        base_priority_fee = self.fee_predictor.max_priority_fee_per_gas()
+        gas_limit = ladder.gas_limit if ladder.gas_limit is not None else self.gas_limit
+
+        rungs = []
+        for multiplier in self.multipliers:
+            priority_fee = int(base_priority_fee*multiplier)
+            tx = self.tx_builder.sell_tx(signer, ladder.bot, ladder.token, signer, deadline, nonce, gas_limit, priority_fee)
+            fees = {"maxFeePerGas": tx['maxFeePerGas'], "maxPriorityFeePerGas": tx['maxPriorityFeePerGas']}
+            rungs.append(PresignedSell(nonce, priority_fee, fees, deadline, self.tx_builder.sign(tx, acct.private_key)))
+
+        ladder.nonce = nonce
+        ladder.block_number = self.fee_predictor.block_number
+        ladder.rungs = rungs
+
+    def refresh(self) -> None:
+        # off the critical path: called on every head and right after a position is opened
+        for pair_address, ladder in self.ladders.items():
+            nonce = self.accounts[ladder.idx].nonce_manager.peek()
+            if nonce is None:
+                # resync pending, nothing can be signed in advance
+                ladder.rungs = []
+                continue
+            if nonce == ladder.nonce and self.fee_predictor.block_number == ladder.block_number:
+                continue
+
+            try:
+                self.sign(ladder, nonce)
+            except Exception as e:
+                ladder.rungs = []
+                logging.error(f"EXECUTOR pre-sign sell of {pair_address} error {e}")
+
+    def take(self, pair_address, bot, nonce, priority_fee=None):
+        """
+        Removes the ladder of the position and returns its cheapest rung paying at least the requested
+        priority fee, None if it was signed for another nonce, bot or below the requested fee.
+        """
+        ladder = self.discard(pair_address)
+        if ladder is None or ladder.nonce != nonce or ladder.bot.lower() != bot.lower():
+            return None
+
+        for rung in ladder.rungs:
+            if priority_fee is None or rung.priority_fee >= priority_fee:
+                return rung
+        return None
+
+if __name__=="__main__":
+    import timeit
+    from eth_account import Account
+    from helpers import FeePredictor
+    from data import W3Account
+    from executor.tx_builder import TxBuilder
+
+    logging.basicConfig(level=logging.INFO)
+
+    class StaticNonce:
+        next_nonce = 3
+
+    account = Account.create()
+    accounts = [W3Account(account, account.key.hex(), nonce_manager=StaticNonce())]
+    fee_predictor = FeePredictor(10**9)
+    fee_predictor.update(1, 10**8, 15*10**6, 30*10**6)
+    tx_builder = TxBuilder(None, fee_predictor, 10**9, chain_id=8453)
+
+    book = SellLadderBook(accounts, tx_builder, fee_predictor, 250000, 30)
+    pair, bot, token = '0x' + '33'*20, '0x' + '11'*20, '0x' + '22'*20
+
+    book.prepare(pair, 0, bot, token)
+    rung = book.take(pair, bot, 3, 15*10**8)
+    logging.info(f"rung priorityFee {rung.priority_fee} nonce {rung.nonce} tx {rung.tx_hash}")
+    assert rung.priority_fee == 2*10**9 and book.take(pair, bot, 3) is None
+
+    def presigned():
+        book.ladders[pair] = ladder
+        return book.take(pair, bot, 3).signed
+
+    def on_demand():
+        return tx_builder.sign(tx_builder.sell_tx(account.address, Web3.to_checksum_address(bot), Web3.to_checksum_address(token), account.address, int(time.time()) + 30, 3, 250000), account.key)
+
+    book.prepare(pair, 0, bot, token)
+    ladder = book.ladders[pair]
+    number = 2000
+    presigned_elapsed = timeit.timeit(presigned, number=number) / number
+    on_demand_elapsed = timeit.timeit(on_demand, number=number) / number
+    logging.info(f"sell on the critical path: pre-signed {presigned_elapsed*10**6:.1f}us build+sign {on_demand_elapsed*10**6:.1f}us")
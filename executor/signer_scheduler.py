@@ -0,0 +1,141 @@
+import asyncio
+import os
+import logging
+import itertools
+from collections import deque
+
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+SIGNER_QUEUE_TIMEOUT_SECONDS=float(os.environ.get('SIGNER_QUEUE_TIMEOUT_SECONDS', '6'))
+SIGNER_MIN_BALANCE=float(os.environ.get('SIGNER_MIN_BALANCE', '0.001')) # ether kept for gas on top of the buy amount
+SIGNER_BALANCE_INTERVAL_SECONDS=int(os.environ.get('SIGNER_BALANCE_INTERVAL_SECONDS', '30'))
+
+class QueuedOrder:
+    def __init__(self, order_id, order, future) -> None:
+        self.order_id = order_id
+        self.order = order
+        self.future = future
+
+class SignerScheduler:
+    """
+    Assigns every order to the least-loaded ready account: one with a bot (unless the order brings its own),
+    enough balance for a buy and the fewest transactions in-flight, an account waiting for a nonce resync
+    counting as one more. Orders which find no ready account wait in FIFO order, up to a deadline, until an
+    account is released, gets its new bot or is refunded.
+    """
+    def __init__(self, accounts, min_balance=SIGNER_MIN_BALANCE, queue_timeout=SIGNER_QUEUE_TIMEOUT_SECONDS) -> None:
+        self.accounts = accounts # W3Account list shared with the executor
+        self.min_balance = Web3.to_wei(min_balance, 'ether')
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = [0]*len(accounts)
+        self.balances = [None]*len(accounts) # wei, None until the first refresh
+        self.last_assigned = [0]*len(accounts)
+        self.counter = itertools.count(1)
+        self.queue = deque()
+
+    def find_signer(self, order):
+        for idx, acct in enumerate(self.accounts):
+            if acct.w3_account.address.lower() == order.signer.lower():
+                return idx
+        return None
+
+    def is_ready(self, idx, order) -> bool:
+        if self.accounts[idx].bot is None and order.bot is None:
+            return False
+
+        # a sell is never held back by the balance, the position would be stuck on the account
+        if order.is_buy and self.balances[idx] is not None and not order.is_paper:
+            if self.balances[idx] < self.min_balance + Web3.to_wei(order.amount_in, 'ether'):
+                return False
+
+        return True
+
+    def load(self, idx):
+        resyncing = 1 if self.accounts[idx].nonce_manager is not None and self.accounts[idx].nonce_manager.next_nonce is None else 0
+        # equal loads go to the account assigned the longest time ago
+        return (self.in_flight[idx] + resyncing, self.last_assigned[idx])
+
+    def select(self, order):
+        if order.signer is not None:
+            # positions are sold by the account holding them
+            candidates = [self.find_signer(order)]
+        else:
+            candidates = range(len(self.accounts))
+
+        ready = [idx for idx in candidates if self.is_ready(idx, order)]
+        if len(ready) == 0:
+            return None
+        return min(ready, key=self.load)
+
+    def assign(self, idx, order):
+        self.in_flight[idx] += 1
+        self.last_assigned[idx] = next(self.counter)
+        if self.balances[idx] is not None and order.is_buy and not order.is_paper:
+            # spent until the next refresh tells otherwise
+            self.balances[idx] -= Web3.to_wei(order.amount_in, 'ether')
+        return idx
+
+    async def acquire(self, order_id, order):
+        """
+        Returns the index of the account which executes the order, None if the signer of the order is
+        unknown or no account got ready before the queue deadline.
+        """
+        if order.signer is not None and self.find_signer(order) is None:
+            logging.error(f"EXECUTOR not found signer for order {order}")
+            return None
+
+        if len(self.queue) == 0:
+            idx = self.select(order)
+            if idx is not None:
+                return self.assign(idx, order)
+
+        queued = QueuedOrder(order_id, order, asyncio.get_running_loop().create_future())
+        self.queue.append(queued)
+        logging.warning(f"EXECUTOR order #{order_id} queued, no ready account, queue length {len(self.queue)}")
+        self.dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(queued.future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if queued.future.done():
+                return queued.future.result()
+            self.queue.remove(queued)
+            queued.future.cancel()
+            logging.warning(f"EXECUTOR order #{order_id} dropped, no ready account within {self.queue_timeout}s")
+            return None
+
+    def dispatch(self) -> None:
+        # FIFO, an order which can't be placed doesn't hold back one which can, e.g. a sell of another signer
+        for queued in list(self.queue):
+            if queued.future.done():
+                self.queue.remove(queued)
+                continue
+
+            idx = self.select(queued.order)
+            if idx is not None:
+                self.queue.remove(queued)
+                queued.future.set_result(self.assign(idx, queued.order))
+                logging.info(f"EXECUTOR queued order #{queued.order_id} assigned to account #{idx}")
+
+    def release(self, idx) -> None:
+        self.in_flight[idx] = max(self.in_flight[idx] - 1, 0)
+        self.dispatch()
+
+    async def refresh_balances(self, aw3) -> None:
+        balances = await asyncio.gather(*[aw3.eth.get_balance(acct.w3_account.address) for acct in self.accounts], return_exceptions=True)
+        for idx, balance in enumerate(balances):
+            if isinstance(balance, Exception):
+                logging.error(f"EXECUTOR balance of account #{idx} error {balance}")
+                continue
+            self.balances[idx] = balance
+        self.dispatch()
+
+    async def run(self, aw3, interval=SIGNER_BALANCE_INTERVAL_SECONDS) -> None:
+        while True:
+            await self.refresh_balances(aw3)
+            logging.debug(f"EXECUTOR signers in-flight {self.in_flight} balances {self.balances} queue {len(self.queue)}")
+            await asyncio.sleep(interval)
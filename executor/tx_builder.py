@@ -0,0 +1,226 @@
+import os
+import logging
+
+from eth_account.datastructures import SignedTransaction
+from eth_keys import keys
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+try:
+    # libsecp256k1 bindings, signing with the pure python backend is an order of magnitude slower
+    import coincurve
+except ImportError:
+    coincurve = None
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers import func_selector, encode_address, encode_uint
+
+CHAIN_ID=int(os.environ.get('CHAIN_ID', '0')) # 0 means queried once from the node
+
+BUY_SELECTOR=func_selector('buy(address,uint256)')
+SELL_SELECTOR=func_selector('sell(address,address,uint256)')
+SELL_MANY_SELECTOR=func_selector('sellMany(address[],address,uint256)')
+CREATE_BOT_SELECTOR=func_selector('createBot(address,bytes32,address,address,address,address)')
+CREATE_BOTS_SELECTOR=func_selector('createBots(address,bytes32[],address[],address,address,address)')
+
+DYNAMIC_FEE_TX_TYPE=2
+
+def rlp_length_prefix(length, offset) -> bytes:
+    if length < 56:
+        return bytes([offset + length])
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([offset + 55 + len(encoded)]) + encoded
+
+def rlp_encode(item) -> bytes:
+    # only the item kinds of a transaction: unsigned ints, byte strings and lists
+    if isinstance(item, list):
+        payload = b''.join([rlp_encode(element) for element in item])
+        return rlp_length_prefix(len(payload), 0xc0) + payload
+
+    if isinstance(item, int):
+        item = item.to_bytes((item.bit_length() + 7) // 8, 'big')
+
+    if len(item) == 1 and item[0] < 0x80:
+        return item
+    return rlp_length_prefix(len(item), 0x80) + item
+
+class TxBuilder:
+    """
+    Builds and signs bot and factory transactions without any network I/O: chain id is cached,
+    selectors are precomputed, calldata of the fixed-size arguments is laid out by hand and fee fields
+    come from the local fee predictor.
+    """
+    def __init__(self, w3, fee_predictor, max_fee_per_gas, chain_id=CHAIN_ID) -> None:
+        self.fee_predictor = fee_predictor
+        # fallback until the predictor has seen a block
+        self.max_fee_per_gas = max_fee_per_gas
+        self.chain_id = chain_id if chain_id > 0 else w3.eth.chain_id
+        logging.info(f"EXECUTOR tx builder chain id {self.chain_id}")
+
+        # parsing a raw key derives its public key, which costs as much as the signature itself
+        self.signing_keys = {}
+
+    def fee_fields(self, priority_fee=None) -> dict:
+        if self.fee_predictor.is_ready():
+            return self.fee_predictor.fee_fields(priority_fee)
+
+        priority_fee = self.fee_predictor.max_priority_fee_per_gas() if priority_fee is None else priority_fee
+        return {
+            "maxFeePerGas": max(self.max_fee_per_gas, priority_fee),
+            "maxPriorityFeePerGas": priority_fee,
+        }
+
+    def build(self, sender, to, data, nonce, gas, value=0, priority_fee=None) -> dict:
+        return {
+            "type": DYNAMIC_FEE_TX_TYPE,
+            "chainId": self.chain_id,
+            "from": sender,
+            "to": to,
+            "data": data,
+            "nonce": nonce,
+            "gas": gas,
+            "value": value,
+            **self.fee_fields(priority_fee),
+        }
+
+    def buy_tx(self, sender, bot, token, deadline, value, nonce, gas, priority_fee=None) -> dict:
+        data = '0x' + BUY_SELECTOR + encode_address(token) + encode_uint(deadline)
+        return self.build(sender, bot, data, nonce, gas, value, priority_fee)
+
+    def sell_tx(self, sender, bot, token, recipient, deadline, nonce, gas, priority_fee=None) -> dict:
+        data = '0x' + SELL_SELECTOR + encode_address(token) + encode_address(recipient) + encode_uint(deadline)
+        return self.build(sender, bot, data, nonce, gas, 0, priority_fee)
+
+    def sell_many_tx(self, sender, bot, tokens, recipient, deadline, nonce, gas, priority_fee=None) -> dict:
+        # head: offset of the tokens array right after the 3 head words, recipient, deadline; tail: the array
+        data = '0x' + SELL_MANY_SELECTOR + encode_uint(3*32) + encode_address(recipient) + encode_uint(deadline) \
+                + encode_uint(len(tokens)) + ''.join([encode_address(token) for token in tokens])
+        return self.build(sender, bot, data, nonce, gas, 0, priority_fee)
+
+    def create_bot_tx(self, sender, factory, implementation, salt, owner, router, pair_factory, weth, nonce, gas, priority_fee=None) -> dict:
+        salt = salt.hex() if isinstance(salt, bytes) else salt
+        data = '0x' + CREATE_BOT_SELECTOR + encode_address(implementation) + salt.removeprefix('0x').rjust(64, '0') \
+                + encode_address(owner) + encode_address(router) + encode_address(pair_factory) + encode_address(weth)
+        return self.build(sender, factory, data, nonce, gas, 0, priority_fee)
+
+    def create_bots_tx(self, sender, factory, implementation, salts, owners, router, pair_factory, weth, nonce, gas, priority_fee=None) -> dict:
+        # head: 6 words with the offsets of both arrays; tail: the salts then the owners
+        salts = [salt.hex() if isinstance(salt, bytes) else salt for salt in salts]
+        data = '0x' + CREATE_BOTS_SELECTOR + encode_address(implementation) + encode_uint(6*32) + encode_uint((7 + len(salts))*32) \
+                + encode_address(router) + encode_address(pair_factory) + encode_address(weth) \
+                + encode_uint(len(salts)) + ''.join([salt.removeprefix('0x').rjust(64, '0') for salt in salts]) \
+                + encode_uint(len(owners)) + ''.join([encode_address(owner) for owner in owners])
+        return self.build(sender, factory, data, nonce, gas, 0, priority_fee)
+
+    def sign(self, tx, private_key) -> SignedTransaction:
+        """
+        Signs a transaction produced by build as an EIP-1559 envelope, the RLP payload is assembled directly
+        instead of going through the generic typed transaction validation and sedes inference.
+        """
+        signing_key = self.signing_keys.get(private_key)
+        if signing_key is None:
+            key_bytes = bytes.fromhex(private_key.removeprefix('0x')) if isinstance(private_key, str) else bytes(private_key)
+            signing_key = coincurve.PrivateKey(key_bytes) if coincurve is not None else keys.PrivateKey(key_bytes)
+            self.signing_keys[private_key] = signing_key
+
+        fields = [
+            tx['chainId'],
+            tx['nonce'],
+            tx['maxPriorityFeePerGas'],
+            tx['maxFeePerGas'],
+            tx['gas'],
+            bytes.fromhex(tx['to'][2:]),
+            tx['value'],
+            bytes.fromhex(tx['data'][2:]),
+            [], # access list
+        ]
+        prefix = bytes([DYNAMIC_FEE_TX_TYPE])
+        msg_hash = keccak(prefix + rlp_encode(fields))
+
+        if coincurve is not None:
+            signature = signing_key.sign_recoverable(msg_hash, hasher=None)
+            r, s, v = int.from_bytes(signature[0:32], 'big'), int.from_bytes(signature[32:64], 'big'), signature[64]
+        else:
+            signature = signing_key.sign_msg_hash(msg_hash)
+            r, s, v = signature.r, signature.s, signature.v
+
+        raw = prefix + rlp_encode(fields + [v, r, s])
+
+        return SignedTransaction(
+            rawTransaction=HexBytes(raw),
+            hash=HexBytes(keccak(raw)),
+            r=r,
+            s=s,
+            v=v,
+        )
+
+if __name__=="__main__":
+    import time
+    import timeit
+    from web3 import Web3
+    from eth_account import Account
+    from helpers import load_abi, FeePredictor
+
+    logging.basicConfig(level=logging.INFO)
+
+    BOT_ABI = load_abi(f"{os.path.dirname(__file__)}/../contracts/abis/SnipeBot.abi.json")
+
+    account = Account.create()
+    bot = Web3.to_checksum_address('0x' + '11'*20)
+    token = Web3.to_checksum_address('0x2E5387d321b358e8161C8F2ec00436006A7D07E2')
+    deadline = int(time.time()) + 30
+
+    fee_predictor = FeePredictor(10**9)
+    fee_predictor.update(1, 10**7, 15*10**6, 30*10**6)
+    tx_builder = TxBuilder(None, fee_predictor, 10**9, chain_id=8453)
+
+    # the web3 path with every field filled in advance, i.e. without the RPCs it would otherwise make
+    w3 = Web3()
+    contract = w3.eth.contract(address=bot, abi=BOT_ABI)
+
+    def web3_path():
+        tx = contract.functions.buy(token, deadline).build_transaction({
+            "from": account.address,
+            "nonce": 1,
+            "gas": 250000,
+            "value": 10**16,
+            "chainId": 8453,
+            **fee_predictor.fee_fields(),
+        })
+        return w3.eth.account.sign_transaction(tx, account.key)
+
+    def builder_path():
+        return tx_builder.sign(tx_builder.buy_tx(account.address, bot, token, deadline, 10**16, 1, 250000), account.key)
+
+    assert web3_path().rawTransaction == builder_path().rawTransaction
+
+    tokens = [token, Web3.to_checksum_address('0x' + '22'*20)]
+    assert contract.functions.sellMany(tokens, account.address, deadline)._encode_transaction_data() == \
+            tx_builder.sell_many_tx(account.address, bot, tokens, account.address, deadline, 1, 500000)['data'].lower()
+
+    BOT_FACTORY_ABI = load_abi(f"{os.path.dirname(__file__)}/../contracts/abis/BotFactory.abi.json")
+    factory = w3.eth.contract(address=Web3.to_checksum_address('0x' + '33'*20), abi=BOT_FACTORY_ABI)
+    salts, owners = [Web3.keccak(text=str(idx)) for idx in range(3)], [Web3.to_checksum_address('0x' + f"{idx+1:02x}"*20) for idx in range(3)]
+    assert factory.functions.createBots(bot, salts, owners, token, token, token)._encode_transaction_data() == \
+            tx_builder.create_bots_tx(account.address, factory.address, bot, salts, owners, token, token, token, 1, 500000)['data'].lower()
+
+    def builder_build_only():
+        return tx_builder.buy_tx(account.address, bot, token, deadline, 10**16, 1, 250000)
+
+    def web3_build_only():
+        return contract.functions.buy(token, deadline).build_transaction({
+            "from": account.address,
+            "nonce": 1,
+            "gas": 250000,
+            "value": 10**16,
+            "chainId": 8453,
+            **fee_predictor.fee_fields(),
+        })
+
+    number = 2000
+    for name, web3_func, builder_func in [('build', web3_build_only, builder_build_only), ('build+sign', web3_path, builder_path)]:
+        web3_elapsed = timeit.timeit(web3_func, number=number) / number
+        builder_elapsed = timeit.timeit(builder_func, number=number) / number
+        logging.info(f"{name} web3 {web3_elapsed*10**6:.1f}us builder {builder_elapsed*10**6:.1f}us speedup {web3_elapsed/builder_elapsed:.1f}x")
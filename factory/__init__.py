@@ -1 +1,2 @@
+from factory.bot_pool import *
 from factory.bot_factory import *
\ No newline at end of file
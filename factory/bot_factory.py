@@ -5,16 +5,19 @@ import logging
 from decimal import Decimal
 from datetime import datetime
 import time
+import queue
 
-from web3 import Web3
-from web3.middleware import geth_poa_middleware, construct_sign_and_send_raw_middleware
+from web3 import Web3, AsyncWeb3
+from web3.middleware import geth_poa_middleware, async_geth_poa_middleware, construct_sign_and_send_raw_middleware
+from web3.logs import DISCARD
 
 import sys # for testing
 sys.path.append('..')
 
 from library import Singleton
 from data import W3Account, BotCreationOrder, Bot, BotUpdateOrder, ExecutionAck
-from helpers import timer_decorator, load_abi, constants
+from helpers import timer_decorator, async_timer_decorator, load_abi, constants
+from factory.bot_pool import BotPool, BOT_POOL_SIZE
 
 import django
 from django.utils.timezone import make_aware
@@ -25,12 +28,14 @@ import console.models
 
 GAS_LIMIT=int(os.environ.get('CREATE_BOT_GAS_LIMIT'))
 BOT_MAX_NUMBER_USED=int(os.environ.get('BOT_MAX_NUMBER_USED'))
+BOT_CREATION_BATCH_SIZE=int(os.environ.get('BOT_CREATION_BATCH_SIZE', '20')) # bots deployed per createBots tx
+BOT_CREATION_TIMEOUT_SECONDS=int(os.environ.get('BOT_CREATION_TIMEOUT_SECONDS', '120')) # receipt wait of a deployment
 RETRY_SLEEP_SECONDS=10
 
 class BotFactory(metaclass=Singleton):
     @timer_decorator
     def __init__(self, http_url, order_broker, result_broker, manager_key, bot_factory, bot_factory_abi, bot_implementation, router, 
-                 pair_factory, weth) -> None:
+                 pair_factory, weth, tx_builder=None) -> None:
         self.order_broker = order_broker
         self.result_broker = result_broker
         self.retry_queue = aioprocessing.AioQueue()
@@ -46,82 +51,281 @@ class BotFactory(metaclass=Singleton):
         self.w3.eth.default_account = self.manager.address
 
         self.bot_factory = self.w3.eth.contract(address=bot_factory,abi=bot_factory_abi)
+
+        # deployments run on the event loop shared with the executor, through the async provider
+        self.aw3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(http_url))
+        self.aw3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        self.async_bot_factory = self.aw3.eth.contract(address=bot_factory,abi=bot_factory_abi)
         self.bot_implementation = Web3.to_checksum_address(bot_implementation)
 
         self.router = Web3.to_checksum_address(router)
         self.pair_factory = Web3.to_checksum_address(pair_factory)
         self.weth = Web3.to_checksum_address(weth)
 
+        # offline builder shared by the executor, the web3 contract path is used without it
+        self.tx_builder = tx_builder
+
+        # spare bots at predicted addresses, taken over by the executor when a bot retires
+        self.pool = BotPool(self.bot_factory.address, self.bot_implementation, self.router, self.pair_factory, self.weth, BOT_POOL_SIZE)
+        self.recoveries = {} # owner -> task walking the slots of the owner
+
+        # every batch of creation orders is deployed by its own task, the manager nonce is handed out locally
+        self.tasks = set()
+        self.nonce = None
+        self.nonce_lock = asyncio.Lock()
+
+    def create_bots_tx(self, owners, salts, nonce) -> dict:
+        # offline path, createBot for a single bot so factories without createBots keep working
+        if len(owners) == 1:
+            return self.tx_builder.create_bot_tx(self.manager.address,
+                                                self.bot_factory.address,
+                                                self.bot_implementation,
+                                                salts[0],
+                                                owners[0],
+                                                self.router,
+                                                self.pair_factory,
+                                                self.weth,
+                                                nonce,
+                                                GAS_LIMIT,
+                                                )
+        return self.tx_builder.create_bots_tx(self.manager.address,
+                                            self.bot_factory.address,
+                                            self.bot_implementation,
+                                            salts,
+                                            owners,
+                                            self.router,
+                                            self.pair_factory,
+                                            self.weth,
+                                            nonce,
+                                            GAS_LIMIT*len(owners),
+                                            )
+
+    def create_bots_function(self, contract, owners, salts):
+        if len(owners) == 1:
+            return contract.functions.createBot(self.bot_implementation,
+                                                salts[0],
+                                                owners[0],
+                                                self.router,
+                                                self.pair_factory,
+                                                self.weth,
+                                                )
+        return contract.functions.createBots(self.bot_implementation,
+                                            salts,
+                                            owners,
+                                            self.router,
+                                            self.pair_factory,
+                                            self.weth,
+                                            )
+
+    def parse_bots(self, tx_receipt, owners) -> list:
+        if tx_receipt['status'] == constants.TX_SUCCESS_STATUS:
+            bot_created_logs = self.bot_factory.events.BotCreated().process_receipt(tx_receipt, errors=DISCARD)
+            logging.info(f"FACTORY successfully create {len(bot_created_logs)} bots for {len(owners)} owners in tx {Web3.to_hex(tx_receipt['transactionHash'])}")
+
+            return [Bot(
+                address=log['args']['bot'],
+                owner=log['args']['owner'],
+                deployed_at=int(time.time()),
+                number_used=0,
+                is_failed=False
+            ) for log in bot_created_logs]
+        else:
+            logging.error(f"FACTORY create bots with owners {owners} failed {tx_receipt}")
+            return []
+
     @timer_decorator
-    def create_bot(self, owner) -> None:
+    def create_bots(self, owners, salts) -> list:
+        """
+        Deploys the bots of the given owners in one transaction and waits for it, for the scripts running
+        without an event loop. Returns the bots created, read from the BotCreated events.
+        """
+        owners = [Web3.to_checksum_address(owner) for owner in owners]
         try:
             nonce = self.w3.eth.get_transaction_count(self.manager.address)
-            tx = self.bot_factory.functions.createBot(self.bot_implementation,
-                                                    Web3.keccak(text=str(time.time())),
-                                                    Web3.to_checksum_address(owner),
-                                                    self.router,
-                                                    self.pair_factory,
-                                                    self.weth,
-                                                    ).build_transaction({
-                                                        "from": self.manager.address,
-                                                        "nonce": nonce,
-                                                        "gas": GAS_LIMIT,
-                                                    })
-            tx_hash = self.w3.eth.send_transaction(tx)
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if tx_receipt['status'] == constants.TX_SUCCESS_STATUS:
-                bot_created_logs = self.bot_factory.events.BotCreated().process_receipt(tx_receipt)
-                logging.info(f"FACTORY successfully create bot with owner {owner} at {bot_created_logs[0]['args']['bot']}")
-
-                return Bot(
-                    address=bot_created_logs[0]['args']['bot'],
-                    owner=bot_created_logs[0]['args']['owner'],
-                    deployed_at=int(time.time()),
-                    number_used=0,
-                    is_failed=False
-                )
+            if self.tx_builder is not None:
+                tx = self.create_bots_tx(owners, salts, nonce)
+                tx_hash = self.w3.eth.send_raw_transaction(self.tx_builder.sign(tx, self.manager.key).rawTransaction)
             else:
-                logging.error(f"FACTORY create bot with owner {owner} failed {tx_receipt}")
+                tx = self.create_bots_function(self.bot_factory, owners, salts).build_transaction({
+                    "from": self.manager.address,
+                    "nonce": nonce,
+                    "gas": GAS_LIMIT*len(owners),
+                })
+                tx_hash = self.w3.eth.send_transaction(tx)
+            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
 
+            return self.parse_bots(tx_receipt, owners)
         except Exception as e:
-            logging.error(f"FACTORY create bot with owner {owner} error:: {e}")
+            logging.error(f"FACTORY create bots with owners {owners} error:: {e}")
+
+        return []
+
+    async def acquire_nonce(self) -> int:
+        async with self.nonce_lock:
+            if self.nonce is None:
+                self.nonce = await self.aw3.eth.get_transaction_count(self.manager.address, 'pending')
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
 
-    async def handle_create_bot(self, order: BotCreationOrder):
+    @async_timer_decorator
+    async def async_create_bots(self, owners, salts) -> list:
+        """
+        Same as create_bots without blocking the event loop, concurrent deployments get consecutive nonces.
+        """
+        owners = [Web3.to_checksum_address(owner) for owner in owners]
         try:
-            # query from DB
-            bot = await console.models.Bot.objects.filter(owner=order.owner.lower()).filter(number_used__lt=BOT_MAX_NUMBER_USED).filter(is_failed=False).afirst()
+            nonce = await self.acquire_nonce()
+            try:
+                if self.tx_builder is not None:
+                    signed = self.tx_builder.sign(self.create_bots_tx(owners, salts, nonce), self.manager.key)
+                else:
+                    tx = await self.create_bots_function(self.async_bot_factory, owners, salts).build_transaction({
+                        "from": self.manager.address,
+                        "nonce": nonce,
+                        "gas": GAS_LIMIT*len(owners),
+                    })
+                    signed = self.manager.sign_transaction(tx)
+                tx_hash = await self.aw3.eth.send_raw_transaction(signed.rawTransaction)
+                tx_receipt = await self.aw3.eth.wait_for_transaction_receipt(tx_hash, timeout=BOT_CREATION_TIMEOUT_SECONDS)
+            except Exception:
+                # the nonce may be unused or stuck, the node tells which one comes next
+                self.nonce = None
+                raise
+
+            return self.parse_bots(tx_receipt, owners)
+        except Exception as e:
+            logging.error(f"FACTORY create bots with owners {owners} error:: {e}")
+
+        return []
+
+    def create_bot(self, owner, salt=None) -> None:
+        bots = self.create_bots([owner], [salt if salt is not None else Web3.keccak(text=str(time.time()))])
+        return bots[0] if len(bots) > 0 else None
+
+    async def save_bot(self, bot: Bot):
+        obj = console.models.Bot(
+            address=bot.address.lower(),
+            owner=bot.owner.lower(),
+            deployed_at=make_aware(datetime.fromtimestamp(bot.deployed_at)),
+            number_used=0,
+            is_failed=False,
+        )
+        await obj.asave()
+        logging.info(f"FACTORY save bot to DB #{obj.id}")
+
+    async def recover_pool(self, owner):
+        # concurrent batches of the same owner wait for a single walk
+        task = self.recoveries.get(owner.lower())
+        if task is None:
+            task = asyncio.create_task(self.walk_slots(owner))
+            self.recoveries[owner.lower()] = task
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            self.recoveries.pop(owner.lower(), None)
+            raise
+
+    async def walk_slots(self, owner):
+        # walks the slots of the owner up to the first one never deployed, the unused bots on the way are spares again
+        index = 0
+        while True:
+            _, address = self.pool.predict(owner, index)
+            bot = await console.models.Bot.objects.filter(address=address.lower()).afirst()
             if bot is not None:
-                logging.info(f"FACTORY found available bot #{bot.id} from DB")
+                if bot.number_used == 0 and not bot.is_failed and not bot.is_holding:
+                    self.pool.add(Bot(bot.address, bot.owner, int(datetime.timestamp(bot.deployed_at)) if bot.deployed_at is not None else 0))
+            elif len(await self.aw3.eth.get_code(address)) > 0:
+                # deployed but never recorded
+                bot = Bot(address=address, owner=owner, deployed_at=int(time.time()))
+                await self.save_bot(bot)
+                self.pool.add(bot)
+            else:
+                break
+            index += 1
 
-                # send result via broker
-                self.result_broker.put(Bot(
-                    address=bot.address,
-                    owner=bot.owner,
-                    deployed_at=int(datetime.timestamp(bot.deployed_at)),
-                    number_used=bot.number_used,
-                    is_failed=bot.is_failed,
-                ))
+        self.pool.start_at(owner, index)
+
+    async def hand_over(self, owner) -> bool:
+        spare = self.pool.take(owner)
+        if spare is not None:
+            logging.info(f"FACTORY hand over spare bot {spare.address} to owner {owner}")
+            self.result_broker.put(spare)
+            return True
+
+        # query from DB
+        bot = await console.models.Bot.objects.filter(owner=owner.lower()).filter(number_used__lt=BOT_MAX_NUMBER_USED).filter(is_failed=False) \
+                .exclude(address__in=list(self.pool.claimed)).afirst()
+        if bot is not None and bot.address.lower() not in self.pool.claimed:
+            logging.info(f"FACTORY found available bot #{bot.id} from DB")
+            self.pool.claim(bot.address)
+
+            # send result via broker
+            self.result_broker.put(Bot(
+                address=bot.address,
+                owner=bot.owner,
+                deployed_at=int(datetime.timestamp(bot.deployed_at)),
+                number_used=bot.number_used,
+                is_failed=bot.is_failed,
+            ))
+            return True
+
+        return False
+
+    async def deploy(self, deployments):
+        bots = dict([(bot.address.lower(), bot) for bot in await self.async_create_bots([order.owner for order,_,_ in deployments], [salt for _,salt,_ in deployments])])
+
+        retries = []
+        for order, salt, address in deployments:
+            bot = bots.get(address.lower())
+            if order.is_spare:
+                self.pool.settle(order.owner)
+
+            if bot is None:
+                logging.error(f"FACTORY create bot for owner {order.owner} at {address} failed")
+                if not order.is_spare:
+                    retries.append(order)
+                continue
+
+            # save to DB
+            await self.save_bot(bot)
+
+            if order.is_spare:
+                self.pool.add(bot)
             else:
-                bot = self.create_bot(order.owner)
-                if bot is not None and isinstance(bot, Bot):
-                    # save to DB
-                    obj = console.models.Bot(
-                        address=bot.address.lower(),
-                        owner=bot.owner.lower(),
-                        deployed_at=make_aware(datetime.now()),
-                        number_used=0,
-                        is_failed=False,
-                    )
-                    await obj.asave()
-                    logging.info(f"FACTORY save bot to DB #{obj.id}")
-
-                    # send result via broker
-                    self.result_broker.put(bot)
-                else:
-                    logging.error(f"FACTORY create bot for owner {order.owner} failed, retry...")
-                    await asyncio.sleep(RETRY_SLEEP_SECONDS)
-                    self.order_broker.put(BotCreationOrder(owner=order.owner, retry_times=order.retry_times+1))
+                self.pool.claim(bot.address)
+
+                # send result via broker
+                self.result_broker.put(bot)
+
+        if len(retries) > 0:
+            # spares are topped up again on the next order of their owner
+            logging.error(f"FACTORY create bot for {len(retries)} owners failed, retry in {RETRY_SLEEP_SECONDS}s...")
+            loop = asyncio.get_running_loop()
+            for order in retries:
+                loop.call_later(RETRY_SLEEP_SECONDS, self.order_broker.put, BotCreationOrder(owner=order.owner, retry_times=order.retry_times+1))
+
+    async def handle_create_bots(self, orders):
+        """
+        Hands a spare or DB bot over to every owner which needs one and deploys the missing bots, along with
+        the spares to top the pools up, in as few transactions as possible at predicted addresses.
+        """
+        try:
+            deployments = [] # (order, salt, predicted address)
+            for order in orders:
+                await self.recover_pool(order.owner)
+                if not order.is_spare and not await self.hand_over(order.owner):
+                    _, salt, address = self.pool.next_slot(order.owner)
+                    deployments.append((order, salt, address))
+
+            for owner in dict.fromkeys([order.owner.lower() for order in orders]):
+                for _ in range(self.pool.deficit(owner)):
+                    _, salt, address = self.pool.next_slot(owner)
+                    self.pool.reserve(owner)
+                    deployments.append((BotCreationOrder(owner=owner, is_spare=True), salt, address))
+
+            # bots handed over come first, each batch in its own tx
+            await asyncio.gather(*[self.deploy(deployments[idx:idx+BOT_CREATION_BATCH_SIZE]) for idx in range(0, len(deployments), BOT_CREATION_BATCH_SIZE)])
         except Exception as e:
             logging.error(f"FACTORY handle create-bot error {e}")
 
@@ -146,16 +350,31 @@ class BotFactory(metaclass=Singleton):
 
     async def run(self):
         while True:
-            order = await self.order_broker.coro_get()
-
-            if order is not None and isinstance(order, BotCreationOrder):
-                logging.info(f"FACTORY receive bot-create order {order}")
-                await self.handle_create_bot(order)
-            elif order is not None and isinstance(order, BotUpdateOrder):
-                logging.info(f"FACTORY receive bot-update order {order.bot}")
-                await self.handle_update_bot(order)
-            else:
-                logging.error(f"FACTORY invalid order {order}")
+            orders = [await self.order_broker.coro_get()]
+
+            # orders queued meanwhile, e.g. one creation per account at startup, are taken along
+            while True:
+                try:
+                    orders.append(self.order_broker.get_nowait())
+                except queue.Empty:
+                    break
+
+            creation_orders = [order for order in orders if order is not None and isinstance(order, BotCreationOrder)]
+            if len(creation_orders) > 0:
+                logging.info(f"FACTORY receive {len(creation_orders)} bot-create orders, first {creation_orders[0]}")
+                # deployed in background, the loop goes on with the next orders
+                task = asyncio.create_task(self.handle_create_bots(creation_orders))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+            for order in orders:
+                if order is not None and isinstance(order, BotCreationOrder):
+                    continue
+                elif order is not None and isinstance(order, BotUpdateOrder):
+                    logging.info(f"FACTORY receive bot-update order {order.bot}")
+                    await self.handle_update_bot(order)
+                else:
+                    logging.error(f"FACTORY invalid order {order}")
 
 if __name__=="__main__":
     from dotenv import load_dotenv
@@ -0,0 +1,101 @@
+import os
+import logging
+from collections import deque
+
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers import calculate_bot_init_code, calculate_bot_salt, calculate_bot_address
+
+BOT_POOL_SIZE=int(os.environ.get('BOT_POOL_SIZE', '1')) # spare bots kept deployed per owner, 0 to disable
+
+class BotPool:
+    """
+    Spare bots deployed ahead of demand, up to a fixed number per owner, so that a retired bot is replaced
+    without waiting for a deployment. The n-th bot of an owner is salted with (owner, n), its address is
+    known offline from the clone init code and the pool picks up the spares deployed before a restart by
+    walking the indexes of the owner again.
+    """
+    def __init__(self, bot_factory, implementation, router, pair_factory, weth, size=BOT_POOL_SIZE) -> None:
+        self.bot_factory = Web3.to_checksum_address(bot_factory)
+        self.implementation = Web3.to_checksum_address(implementation)
+        self.router = Web3.to_checksum_address(router)
+        self.pair_factory = Web3.to_checksum_address(pair_factory)
+        self.weth = Web3.to_checksum_address(weth)
+        self.size = size
+
+        self.spares = {} # owner -> deque of Bot
+        self.next_index = {} # owner -> next salt index to examine
+        self.claimed = set() # addresses handed over to an account
+        self.pending = {} # owner -> spares being deployed
+
+    def predict(self, owner, index):
+        salt = calculate_bot_salt(owner, index)
+        init_code = calculate_bot_init_code(self.implementation, owner, self.router, self.pair_factory, self.weth)
+        return (salt, calculate_bot_address(self.bot_factory, salt, init_code))
+
+    def start_at(self, owner, index) -> None:
+        # first slot of the owner never deployed
+        self.next_index[owner.lower()] = index
+
+    def next_slot(self, owner):
+        owner = owner.lower()
+        index = self.next_index.get(owner, 0)
+        self.next_index[owner] = index + 1
+        salt, address = self.predict(owner, index)
+        return (index, salt, address)
+
+    def deficit(self, owner) -> int:
+        return max(self.size - len(self.spares.get(owner.lower(), [])) - self.pending.get(owner.lower(), 0), 0)
+
+    def reserve(self, owner) -> None:
+        # a spare deployment of the owner is in flight
+        self.pending[owner.lower()] = self.pending.get(owner.lower(), 0) + 1
+
+    def settle(self, owner) -> None:
+        self.pending[owner.lower()] = max(self.pending.get(owner.lower(), 0) - 1, 0)
+
+    def add(self, bot) -> bool:
+        address = bot.address.lower()
+        spares = self.spares.setdefault(bot.owner.lower(), deque())
+        if address in self.claimed or any([spare.address.lower() == address for spare in spares]):
+            return False
+        spares.append(bot)
+        logging.info(f"FACTORY spare bot {bot.address} of owner {bot.owner} pooled, {len(spares)} spares")
+        return True
+
+    def take(self, owner):
+        spares = self.spares.get(owner.lower())
+        if spares is None or len(spares) == 0:
+            return None
+        bot = spares.popleft()
+        self.claimed.add(bot.address.lower())
+        return bot
+
+    def claim(self, address) -> None:
+        # the bot was handed over by another path, e.g. found in DB
+        address = address.lower()
+        self.claimed.add(address)
+        for spares in self.spares.values():
+            for spare in list(spares):
+                if spare.address.lower() == address:
+                    spares.remove(spare)
+
+if __name__=="__main__":
+    from data import Bot
+
+    logging.basicConfig(level=logging.INFO)
+
+    owner = '0xecb137C67c93eA50b8C259F8A8D08c0df18222d9'
+    pool = BotPool('0x' + '11'*20, '0x' + '22'*20, '0x' + '33'*20, '0x' + '44'*20, '0x' + '55'*20, size=2)
+
+    while pool.deficit(owner) > 0:
+        index, salt, address = pool.next_slot(owner)
+        logging.info(f"bot #{index} of {owner} salt {Web3.to_hex(salt)} at {address}")
+        pool.add(Bot(address, owner))
+
+    assert pool.predict(owner, 0) == pool.predict(owner.lower(), 0)
+    bot = pool.take(owner)
+    assert bot.address == pool.predict(owner, 0)[1] and pool.deficit(owner) == 1 and not pool.add(bot)
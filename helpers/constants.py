@@ -13,3 +13,5 @@ TRANSFER_METHOD_ID="0xa9059cbb"
 RENOUNCE_OWNERSHIP_METHOD_ID="0x715018a6"
 TRANSFER_NATIVE_METHOD_ID="0x"
 
+SYNC_EVENT_TOPIC="0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+SWAP_EVENT_TOPIC="0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import logging
 import requests
@@ -7,6 +8,7 @@ import sys # for testing
 sys.path.append('..')
 
 from helpers import constants
+from helpers.utils import calculate_next_block_base_fee
 
 class GasHelper:
     def __init__(self, etherscan_api_url, api_keys) -> None:
@@ -27,6 +29,78 @@ class GasHelper:
                 return Decimal(res['result']['suggestBaseFee'])
         return None
 
+class FeePredictor:
+    """
+    EIP-1559 fee estimate for the next block, fed from newHeads and optionally refined with eth_feeHistory
+    priority-fee percentiles. Readers get the latest estimate synchronously without any network call.
+    """
+    def __init__(self, default_priority_fee, base_fee_multiplier=2, fee_history_blocks=10, fee_history_percentiles=[25, 50, 75], priority_percentile_index=1) -> None:
+        self.block_number = 0
+        self.base_fee = None
+        self.next_base_fee = None
+        self.priority_fee = int(default_priority_fee)
+        self.priority_fee_percentiles = []
+
+        self.base_fee_multiplier = base_fee_multiplier
+        self.fee_history_blocks = fee_history_blocks
+        self.fee_history_percentiles = fee_history_percentiles
+        self.priority_percentile_index = priority_percentile_index
+
+    def is_ready(self) -> bool:
+        return self.next_base_fee is not None
+
+    def update(self, block_number, base_fee, gas_used, gas_limit) -> None:
+        if block_number < self.block_number:
+            return
+
+        self.block_number = block_number
+        self.base_fee = int(base_fee)
+        self.next_base_fee = int(calculate_next_block_base_fee(int(base_fee), int(gas_used), int(gas_limit)))
+        logging.debug(f"FEE block #{block_number} baseFee {self.base_fee} nextBaseFee {self.next_base_fee} priorityFee {self.priority_fee}")
+
+    def update_fee_history(self, fee_history) -> None:
+        rewards = fee_history.get('reward', [])
+        if len(rewards) == 0:
+            return
+
+        # median over the sampled blocks of every requested percentile
+        self.priority_fee_percentiles = [sorted([reward[idx] for reward in rewards])[len(rewards)//2] for idx in range(len(self.fee_history_percentiles))]
+        self.priority_fee = max(int(self.priority_fee_percentiles[self.priority_percentile_index]), 1)
+        logging.debug(f"FEE priority fee percentiles {self.priority_fee_percentiles}")
+
+    def refresh_fee_history(self, w3) -> None:
+        try:
+            self.update_fee_history(w3.eth.fee_history(self.fee_history_blocks, 'latest', self.fee_history_percentiles))
+        except Exception as e:
+            logging.error(f"FEE fee history refresh error {e}")
+
+    async def run(self, w3, interval) -> None:
+        # optional periodic priority-fee refresh, the base fee only comes from new heads
+        while True:
+            await asyncio.to_thread(self.refresh_fee_history, w3)
+            await asyncio.sleep(interval)
+
+    def base_fee_gwei(self):
+        return Decimal(self.next_base_fee) / Decimal(10**9) if self.next_base_fee is not None else None
+
+    def max_priority_fee_per_gas(self) -> int:
+        return self.priority_fee
+
+    def max_fee_per_gas(self, priority_fee=None) -> int:
+        # headroom for several consecutive full blocks, the unused part is refunded
+        priority_fee = self.priority_fee if priority_fee is None else priority_fee
+        return self.next_base_fee*self.base_fee_multiplier + priority_fee
+
+    def fee_fields(self, priority_fee=None) -> dict:
+        if not self.is_ready():
+            # let the node fill the max fee around an overridden priority fee
+            return {"maxPriorityFeePerGas": priority_fee} if priority_fee is not None else {}
+        priority_fee = self.max_priority_fee_per_gas() if priority_fee is None else priority_fee
+        return {
+            "maxFeePerGas": self.max_fee_per_gas(priority_fee),
+            "maxPriorityFeePerGas": priority_fee,
+        }
+
 if __name__=='__main__':
     from dotenv import load_dotenv
     load_dotenv()
@@ -6,6 +6,7 @@ import random
 from decimal import Decimal
 import pytz
 from datetime import datetime
+from functools import lru_cache
 import eth_utils
 
 def load_contract_bin(contract_path: str) -> bytes:
@@ -25,6 +26,7 @@ def load_router_contract(contract_path, factory_address, wavax_address) -> bytes
 def load_abi(abi_path: str):
     return json.load(open(abi_path, 'r'))
 
+@lru_cache(maxsize=256)
 def func_selector(signature: str) -> str:
     return (Web3.keccak(text=signature)[0:4]).hex()[2:]
 
@@ -77,6 +79,49 @@ def calculate_next_block_base_fee(base_fee, gas_used, gas_limit):
 def sort_tokens(tokenA, tokenB):
     return (tokenA, tokenB) if Web3.to_int(hexstr=tokenA) < Web3.to_int(hexstr=tokenB) else (tokenB, tokenA)
 
+def calculate_pair_address(factory, tokenA, tokenB, init_code_hash):
+    # CREATE2 address of a UniswapV2 pair, salted with the sorted token addresses
+    token0, token1 = sort_tokens(tokenA, tokenB)
+    salt = Web3.keccak(hexstr=eth_utils.remove_0x_prefix(token0) + eth_utils.remove_0x_prefix(token1))
+    return Web3.to_checksum_address(Web3.keccak(
+        hexstr=(
+            'ff'
+            + eth_utils.remove_0x_prefix(factory)
+            + eth_utils.remove_0x_prefix(Web3.to_hex(salt))
+            + eth_utils.remove_0x_prefix(init_code_hash)
+        )
+    )[12:])
+
+def calculate_bot_init_code(implementation, owner, router, pair_factory, weth):
+    # ERC-1167 clone of the bot implementation with (owner, router, factory, weth) appended, as laid out by Factory.createBot
+    return (
+        '3d60cd80600a3d3981f3363d3d373d3d3d363d73'
+        + eth_utils.remove_0x_prefix(implementation).lower()
+        + '5af43d82803e903d91602b57fd5bf3'
+        + ''.join([eth_utils.remove_0x_prefix(address).lower().rjust(64, '0') for address in (owner, router, pair_factory, weth)])
+    )
+
+def calculate_bot_salt(owner, index):
+    # deterministic per owner, the n-th bot of an owner always lands at the same address
+    return Web3.keccak(
+        hexstr=(
+            eth_utils.remove_0x_prefix(owner).lower().rjust(64, '0')
+            +
+            eth_utils.remove_0x_prefix(hex(index)).rjust(64,'0')
+        )
+    )
+
+def calculate_bot_address(bot_factory, salt, init_code):
+    # CREATE2 address of a bot clone deployed by the bot factory
+    return Web3.to_checksum_address(Web3.keccak(
+        hexstr=(
+            'ff'
+            + eth_utils.remove_0x_prefix(bot_factory)
+            + eth_utils.remove_0x_prefix(Web3.to_hex(salt))
+            + eth_utils.remove_0x_prefix(Web3.to_hex(Web3.keccak(hexstr=init_code)))
+        )
+    )[12:])
+
 def convert_tz_aware(dt_obj):
     dt_obj.tzinfo = pytz.UTC
 
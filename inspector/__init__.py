@@ -1,3 +1,7 @@
 from inspector.revm_simulator import *
 from inspector.ethcall_simulator import *
-from inspector.pair_inspector import *
\ No newline at end of file
+from inspector.paper_trading_engine import *
+from inspector.inspection_stage import *
+from inspector.pair_inspector import *
+from inspector.inspection_scheduler import *
+from inspector.inspector_worker import *
\ No newline at end of file
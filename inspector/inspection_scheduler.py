@@ -0,0 +1,203 @@
+import asyncio
+import os
+import logging
+import time
+import itertools
+
+import sys # for testing
+sys.path.append('..')
+
+from data import Pair, InspectionResult
+from inspector.inspection_stage import StageStats, STAGE_LANE_LOCAL, STAGE_LANE_ETHERSCAN
+
+BLOCK_TIME_SECONDS=float(os.environ.get('BLOCK_TIME_SECONDS', '12'))
+INSPECTION_BUDGET_RATIO=float(os.environ.get('INSPECTION_BUDGET_RATIO', '0.5'))
+INSPECTION_MAX_CARRY_BLOCKS=int(os.environ.get('INSPECTION_MAX_CARRY_BLOCKS', '3'))
+INSPECTION_ABANDON_RETRIES=int(os.environ.get('INSPECTION_ABANDON_RETRIES', '1')) # initial inspections requeued after overrunning their carry-over blocks
+MIN_BUDGET_SECONDS=0.5
+
+# a pending launch can only be inspected on its creator and token, the pair doesn't exist yet
+SPECULATIVE_LANES=(STAGE_LANE_LOCAL, STAGE_LANE_ETHERSCAN)
+SPECULATIVE_TTL_BLOCKS=int(os.environ.get('SPECULATIVE_TTL_BLOCKS', '5'))
+
+class InspectionTask:
+    def __init__(self, task_id, pair: Pair, block_number, is_initial, submitted_block, deadline=0, lanes=None, prior=None) -> None:
+        self.task_id = task_id
+        self.pair = pair
+        self.block_number = block_number
+        self.is_initial = is_initial
+        self.submitted_block = submitted_block
+        self.deadline = deadline
+        self.lanes = lanes # restrict inspection to these stage lanes, None runs all of them
+        self.prior = prior # passed verdict of a speculative inspection
+        self.expires_at = None # no stage is started past it, set on submission
+        self.retries = 0 # times abandoned and requeued
+
+        # filled by the worker
+        self.result = None
+        self.is_deferred = False
+
+    def is_speculative(self):
+        return self.lanes is not None
+
+    def __str__(self) -> str:
+        return f"InspectionTask #{self.task_id} {self.pair.address} block #{self.block_number} isInitial {self.is_initial} isSpeculative {self.is_speculative()} submitted #{self.submitted_block} deadline {self.deadline}"
+
+class InspectionScheduler:
+    """
+    Feeds pair inspections to the inspector worker pool and streams every InspectionResult to an asyncio
+    queue as soon as a worker replies. All bookkeeping happens on the event loop.
+    """
+    def __init__(self, pool, block_time=BLOCK_TIME_SECONDS, budget_ratio=INSPECTION_BUDGET_RATIO, max_carry_blocks=INSPECTION_MAX_CARRY_BLOCKS) -> None:
+        self.pool = pool
+        self.block_time = block_time
+        self.budget = block_time*budget_ratio
+        self.max_carry_blocks = max_carry_blocks
+
+        self.counter = itertools.count(1)
+        self.pending = {} # task_id -> InspectionTask
+        self.deferred = [] # tasks handed back unstarted, resubmitted at the next block
+        self.in_flight = {False: set(), True: set()} # is speculative -> addresses of the pending and deferred tasks
+        self.result_queue = asyncio.Queue()
+
+        # aggregated over all workers from the per-result stage timings
+        self.stage_stats = {}
+
+        # speculative verdicts of pending launches, consumed when the pair is created
+        self.speculative = {} # address -> (block_number, InspectionResult)
+
+    def is_pending(self, address, speculative=False):
+        # a speculative inspection doesn't hold back the one of the created pair
+        return address in self.in_flight[speculative]
+
+    def deadline(self, block_timestamp):
+        # the budget is counted from the block time, processing lag is taken out of it
+        return max(block_timestamp + self.budget, time.time() + MIN_BUDGET_SECONDS)
+
+    def submit(self, pairs, block_number, block_timestamp, is_initial=False) -> list:
+        """
+        Returns the pairs skipped because their inspection is still in-flight.
+        """
+        skipped = []
+        for pair in pairs:
+            if self.is_pending(pair.address):
+                logging.debug(f"INSPECTOR pair {pair.address} inspection is in-flight, skip")
+                skipped.append(pair)
+                continue
+
+            prior = None
+            if is_initial and pair.address in self.speculative:
+                _, prior = self.speculative.pop(pair.address)
+                if prior.is_rejected():
+                    logging.warning(f"INSPECTOR pair {pair.address} rejected ahead of creation {prior}")
+                    prior.pair = pair
+                    self.result_queue.put_nowait(prior)
+                    continue
+                logging.info(f"INSPECTOR pair {pair.address} inspection reuses speculative verdict")
+
+            self.submit_task(InspectionTask(next(self.counter), pair, block_number, is_initial, block_number, self.deadline(block_timestamp), prior=prior))
+
+        return skipped
+
+    def submit_speculative(self, pair, block_number, block_timestamp) -> None:
+        if pair.address in self.speculative or self.is_pending(pair.address, speculative=True) or self.is_pending(pair.address):
+            return
+        self.submit_task(InspectionTask(next(self.counter), pair, block_number, True, block_number, self.deadline(block_timestamp), lanes=SPECULATIVE_LANES))
+
+    def submit_task(self, task: InspectionTask) -> None:
+        # the worker stops starting stages once the task would be abandoned by reschedule
+        task.expires_at = task.deadline + self.max_carry_blocks*self.block_time
+        self.pending[task.task_id] = task
+        self.in_flight[task.is_speculative()].add(task.pair.address)
+        self.pool.submit(task)
+
+    def deliver(self, reply: InspectionTask) -> None:
+        task = self.pending.pop(reply.task_id, None)
+        if task is None:
+            # abandoned by reschedule
+            return
+
+        if reply.is_deferred:
+            self.deferred.append(task)
+            logging.warning(f"INSPECTOR defer {task} to next block due to budget {self.budget}s overrun")
+            return
+
+        if reply.result.is_abandoned:
+            # the worker reached the expiry before reschedule did
+            self.abandon(task, task.block_number)
+            return
+
+        self.in_flight[task.is_speculative()].discard(task.pair.address)
+        self.record_stage_timings(reply.result)
+        if task.is_speculative():
+            logging.warning(f"INSPECTOR speculative inspect pair {task.pair.address} {reply.result}")
+            self.speculative[task.pair.address] = (task.submitted_block, reply.result)
+            return
+
+        logging.warning(f"INSPECTOR inspect pair {task.pair.address} {reply.result}")
+        self.result_queue.put_nowait(reply.result)
+
+    def abandon(self, task: InspectionTask, block_number) -> None:
+        if task.is_initial and not task.is_speculative() and task.retries < INSPECTION_ABANDON_RETRIES:
+            # inspected again from scratch at the next block, still in-flight meanwhile
+            retry = InspectionTask(next(self.counter), task.pair, block_number, True, block_number, prior=task.prior)
+            retry.retries = task.retries + 1
+            self.deferred.append(retry)
+            logging.warning(f"INSPECTOR abandon {task} after {self.max_carry_blocks} blocks, requeued")
+            return
+
+        self.in_flight[task.is_speculative()].discard(task.pair.address)
+        if not task.is_speculative():
+            # no verdict, the watchlist reschedules the pair
+            self.result_queue.put_nowait(InspectionResult(pair=task.pair, from_block=task.block_number, to_block=block_number, is_initial=task.is_initial, is_abandoned=True))
+        logging.warning(f"INSPECTOR abandon {task} after {self.max_carry_blocks} blocks")
+
+    def record_stage_timings(self, result: InspectionResult) -> None:
+        for name, (latency, passed, reason) in result.stage_timings.items():
+            if name not in self.stage_stats:
+                # observed samples only, the declared priors live in the workers
+                self.stage_stats[name] = StageStats(name, 0, 0, prior_weight=0)
+            self.stage_stats[name].record(latency, not passed, reason)
+
+    def log_stage_stats(self) -> None:
+        for stats in sorted(self.stage_stats.values(), key=lambda stats: stats.total_latency, reverse=True):
+            logging.info(f"INSPECTOR {stats}")
+
+    def reschedule(self, block_number, block_timestamp) -> None:
+        """
+        Called once per block, before new submissions: deferred tasks are resubmitted first with a fresh
+        budget, running ones are carried until they go stale.
+        """
+        now = time.time()
+        for task in list(self.pending.values()):
+            if now < task.deadline:
+                continue
+
+            if block_number - task.submitted_block >= self.max_carry_blocks:
+                # its verdict is stale by now, the worker stops at its next stage and the reply is ignored
+                self.pending.pop(task.task_id)
+                self.abandon(task, block_number)
+            else:
+                logging.warning(f"INSPECTOR carry running {task} over to block #{block_number}")
+
+        # launches which never made it on-chain
+        for address in [address for address,(submitted_block,_) in self.speculative.items() if block_number - submitted_block >= SPECULATIVE_TTL_BLOCKS]:
+            self.speculative.pop(address)
+            logging.debug(f"INSPECTOR expire speculative verdict of pair {address}")
+
+        deferred, self.deferred = self.deferred, []
+        for task in deferred:
+            task.block_number = block_number
+            task.deadline = self.deadline(block_timestamp)
+            self.submit_task(task)
+
+    async def run(self) -> None:
+        while True:
+            reply = await self.pool.coro_get()
+            if reply is not None and isinstance(reply, InspectionTask):
+                self.deliver(reply)
+            else:
+                logging.error(f"INSPECTOR invalid inspection reply {reply}")
+
+    async def coro_get(self) -> InspectionResult:
+        return await self.result_queue.get()
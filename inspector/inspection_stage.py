@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+
+import sys # for testing
+sys.path.append('..')
+
+STAGE_LANE_LOCAL='local'
+STAGE_LANE_ETHERSCAN='etherscan'
+STAGE_LANE_RPC='rpc'
+
+LATENCY_BUCKETS=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10) # in seconds, last bucket is overflow
+PRIOR_WEIGHT=5 # number of virtual samples backing the declared cost and rejection rate
+MIN_REJECTION_RATE=0.01
+
+REJECT_REASON_ERROR='error'
+
+class StageStats:
+    def __init__(self, name, cost, rejection, prior_weight=PRIOR_WEIGHT) -> None:
+        self.name = name
+        self.prior_cost = cost
+        self.prior_rejection = rejection
+        self.prior_weight = prior_weight
+
+        self.count = 0
+        self.rejected = 0
+        self.total_latency = 0
+        self.latency_histogram = [0]*(len(LATENCY_BUCKETS)+1)
+        self.rejection_histogram = {}
+
+        self.lock = threading.Lock()
+
+    def record(self, latency, rejected, reason=None) -> None:
+        bucket = len(LATENCY_BUCKETS)
+        for idx,bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                bucket = idx
+                break
+
+        with self.lock:
+            self.count += 1
+            self.total_latency += latency
+            self.latency_histogram[bucket] += 1
+            if rejected:
+                self.rejected += 1
+                reason = str(reason) if reason is not None else self.name
+                self.rejection_histogram[reason] = self.rejection_histogram.get(reason, 0) + 1
+
+    def mean_latency(self):
+        # blend observed latency with the declared cost so that a fresh stage is still ranked
+        if self.count + self.prior_weight == 0:
+            return self.prior_cost
+        return (self.total_latency + self.prior_cost*self.prior_weight) / (self.count + self.prior_weight)
+
+    def rejection_rate(self):
+        if self.count + self.prior_weight == 0:
+            return self.prior_rejection
+        return (self.rejected + self.prior_rejection*self.prior_weight) / (self.count + self.prior_weight)
+
+    def rank(self):
+        # expected seconds spent per rejected pair, cheap and selective stages go first
+        return self.mean_latency() / max(self.rejection_rate(), MIN_REJECTION_RATE)
+
+    def __str__(self) -> str:
+        buckets = ' '.join([f"<={bound}s:{self.latency_histogram[idx]}" for idx,bound in enumerate(LATENCY_BUCKETS)])
+        return f"""
+        Stage {self.name} count {self.count} rejected {self.rejected} rejectionRate {round(self.rejection_rate(),4)}
+        TotalLatency {round(self.total_latency,4)} MeanLatency {round(self.mean_latency(),4)} Rank {round(self.rank(),4)}
+        Latency {buckets} >{LATENCY_BUCKETS[-1]}s:{self.latency_histogram[-1]} Rejections {self.rejection_histogram}
+        """
+
+class InspectionStage:
+    def __init__(self, name, lane, func, cost, rejection, initial=True) -> None:
+        """
+        :param name: stage name, used as the stats key.
+        :param lane: stages of the same lane run sequentially, different lanes run concurrently.
+        :param func: callable (pair, result, block_number, from_block) returning (passed, reason).
+        :param cost: declared latency in seconds, used for ordering until enough samples are recorded.
+        :param rejection: declared rejection rate in [0,1].
+        :param initial: whether the stage runs at the initial inspection of a newly created pair.
+        """
+        self.name = name
+        self.lane = lane
+        self.func = func
+        self.initial = initial
+        self.stats = StageStats(name, cost, rejection)
+
+    def run(self, pair, result, block_number, from_block):
+        start_time = time.perf_counter()
+        try:
+            passed, reason = self.func(pair, result, block_number, from_block)
+        except Exception as e:
+            latency = time.perf_counter() - start_time
+            self.stats.record(latency, True, REJECT_REASON_ERROR)
+            result.stage_timings[self.name] = (latency, False, REJECT_REASON_ERROR)
+            raise e
+
+        latency = time.perf_counter() - start_time
+        self.stats.record(latency, not passed, reason)
+        result.stage_timings[self.name] = (latency, passed, reason if not passed else None)
+        logging.debug(f"INSPECTOR stage {self.name} pair {pair.address} passed {passed} in {latency:.4f} secs")
+
+        return passed
+
+    def __str__(self) -> str:
+        return f"InspectionStage {self.name} lane {self.lane} initial {self.initial} rank {round(self.stats.rank(),4)}"
@@ -0,0 +1,70 @@
+import os
+import logging
+import time
+from multiprocessing import Process
+
+import aioprocessing
+
+import sys # for testing
+sys.path.append('..')
+
+from data import InspectionResult
+
+INSPECTOR_WORKERS=int(os.environ.get('INSPECTOR_WORKERS', '0')) # 0 means one worker per core
+
+def inspector_worker_process(inspector_builder, work_queue, result_queue):
+    # set process group the same as main process
+    os.setpgid(0, os.getppid())
+
+    # the inspector lives as long as the worker, so its sessions, api-key rotation and stage ranking stay warm
+    inspector = inspector_builder()
+    logging.warning(f"INSPECTOR worker {os.getpid()} started...")
+
+    while True:
+        task = work_queue.get()
+        if task is None:
+            break
+
+        if time.time() > task.deadline:
+            # the block budget elapsed while the task was queued, hand it back to be carried over
+            task.is_deferred = True
+            result_queue.put(task)
+            continue
+
+        try:
+            task.result = inspector.inspect_pair(task.pair, task.block_number, task.is_initial, task.lanes, task.prior, task.expires_at)
+        except Exception as e:
+            logging.error(f"INSPECTOR worker {os.getpid()} inspect pair {task.pair.address} error {e}")
+            # an errored inspection is a failed verdict
+            task.result = InspectionResult(pair=task.pair, from_block=task.block_number, to_block=task.block_number, is_initial=task.is_initial)
+
+        result_queue.put(task)
+
+    logging.warning(f"INSPECTOR worker {os.getpid()} stopped")
+
+class InspectorWorkerPool:
+    def __init__(self, inspector_builder, number_workers=INSPECTOR_WORKERS) -> None:
+        self.inspector_builder = inspector_builder
+        self.number_workers = number_workers if number_workers > 0 else os.cpu_count()
+
+        self.work_queue = aioprocessing.AioQueue()
+        self.result_queue = aioprocessing.AioQueue()
+        self.processes = []
+
+    def start(self) -> None:
+        for _ in range(self.number_workers):
+            process = Process(target=inspector_worker_process, args=(self.inspector_builder, self.work_queue, self.result_queue,), daemon=True)
+            process.start()
+            self.processes.append(process)
+
+        logging.warning(f"INSPECTOR started {self.number_workers} inspector workers")
+
+    def submit(self, task) -> None:
+        self.work_queue.put(task)
+
+    async def coro_get(self):
+        return await self.result_queue.coro_get()
+
+    def stop(self) -> None:
+        for _ in self.processes:
+            self.work_queue.put(None)
@@ -5,6 +5,7 @@ import time
 import datetime
 from decimal import Decimal
 import requests
+import threading
 import concurrent.futures
 
 from web3 import Web3
@@ -23,6 +24,7 @@ from helpers.utils import load_contract_bin, encode_address, encode_uint, func_s
 from helpers import constants
 from data import Pair, MaliciousPair, InspectionResult, SimulationResult
 from inspector import RevmSimulator, EthCallSimulator
+from inspector.inspection_stage import InspectionStage, STAGE_LANE_LOCAL, STAGE_LANE_ETHERSCAN, STAGE_LANE_RPC
 
 # django
 import django
@@ -48,6 +50,8 @@ ROGUE_CREATOR_FROZEN_SECONDS=int(os.environ.get('ROGUE_CREATOR_FROZEN_SECONDS'))
 HOLD_MAX_DURATION_SECONDS=int(os.environ.get('HOLD_MAX_DURATION_SECONDS'))
 MAX_INSPECT_ATTEMPTS=int(os.environ.get('MAX_INSPECT_ATTEMPTS'))
 INSPECT_INTERVAL_SECONDS=int(os.environ.get('INSPECT_INTERVAL_SECONDS'))
+GAS_MEASUREMENT_ENABLED=int(os.environ.get('GAS_MEASUREMENT_ENABLED', '0')) # buy and sell gas of passed pairs replayed on a revm fork for the executor gas limits
+STAGE_MAX_WORKERS=5
 
 from enum import IntEnum
 
@@ -85,6 +89,18 @@ class PairInspector(metaclass=Singleton):
             signer=signer,
             bot=bot,
         )
+        self.gas_simulator = RevmSimulator(
+            http_url=http_url,
+            signer=signer,
+            router_address=router,
+            weth=weth,
+            bot=bot,
+            pair_abi=pair_abi,
+            bot_abi=bot_abi,
+        ) if GAS_MEASUREMENT_ENABLED else None
+
+        self.stages = self.build_stages()
+        self.stage_executor = concurrent.futures.ThreadPoolExecutor(max_workers=STAGE_MAX_WORKERS)
 
     @timer_decorator
     def is_contract_verified(self, pair: Pair) -> False:
@@ -147,12 +163,15 @@ class PairInspector(metaclass=Singleton):
         return 0
         
     @timer_decorator
-    def is_malicious(self, pair, block_number, is_initial=False) -> MaliciousPair:
+    def is_creator_blacklisted(self, pair) -> bool:
         blacklist = console.models.BlackList.objects.filter(address=pair.creator.lower()).filter(frozen_at__gte=make_aware(datetime.datetime.now()-datetime.timedelta(seconds=ROGUE_CREATOR_FROZEN_SECONDS))).filter(created_at__gte=make_aware(datetime.datetime.now() - datetime.timedelta(days=90))).first()
         if blacklist is not None:
             logging.warning(f"INSPECTOR pair {pair.address} is blacklisted due to rogue creator")
-            return MaliciousPair.CREATOR_BLACKLISTED
-        
+            return True
+        return False
+
+    @timer_decorator
+    def is_malicious(self, pair, block_number, is_initial=False) -> MaliciousPair:
         # check malicious tx
         try:
             r=requests.get(f"{self.etherscan_api_url}/api?module=contract&action=getcontractcreation&contractaddresses={pair.token}&apikey={self.select_api_key()}")
@@ -174,65 +193,146 @@ class PairInspector(metaclass=Singleton):
             return MaliciousPair.UNVERIFIED
 
         return MaliciousPair.UNMALICIOUS
-    
+
+    def build_stages(self):
+        def check_reserve(pair, result, block_number, from_block):
+            if pair.reserve_eth>=RESERVE_ETH_MIN_THRESHOLD and pair.reserve_eth<=RESERVE_ETH_MAX_THRESHOLD:
+                result.reserve_inrange=True
+            # out-of-range reserves only disqualify a newly created pair
+            return (result.reserve_inrange or not result.is_initial, 'reserve')
+
+        def check_blacklist(pair, result, block_number, from_block):
+            if self.is_creator_blacklisted(pair):
+                result.is_malicious=MaliciousPair.CREATOR_BLACKLISTED
+            return (result.is_malicious == MaliciousPair.UNMALICIOUS, result.is_malicious.name)
+
+        def check_malicious_tx(pair, result, block_number, from_block):
+            result.is_malicious=self.is_malicious(pair, block_number, result.is_initial)
+            return (result.is_malicious == MaliciousPair.UNMALICIOUS, result.is_malicious.name)
+
+        def check_source_code(pair, result, block_number, from_block):
+            # TODO: try to verify multiple times
+            result.contract_verified=self.is_contract_verified(pair)
+            return (True, None)
+
+        def check_creator_call(pair, result, block_number, from_block):
+            result.is_creator_call_contract=self.is_creator_call_contract(pair,from_block,block_number)
+            return (result.is_creator_call_contract == 0, 'creator_call')
+
+        def count_tx_mm(pair, result, block_number, from_block):
+            result.number_tx_mm=self.number_tx_mm(pair,from_block,block_number)
+            return (True, None)
+
+        def simulate(pair, result, block_number, from_block):
+            simulation_result = self.simulator.inspect_pair(pair, SIMULATION_AMOUNT)
+            if simulation_result is None:
+                return (False, 'simulation')
+
+            if simulation_result.slippage > SLIPPAGE_MIN_THRESHOLD and simulation_result.slippage < SLIPPAGE_MAX_THRESHOLD:
+                result.simulation_result=simulation_result
+                return (True, None)
+
+            logging.warning(f"INSPECTOR simulation result rejected due to abnormal slippage {simulation_result.slippage}")
+            return (False, 'slippage')
+
+        # declared costs (seconds) and rejection rates are priors, observed stats take over progressively
+        return [
+            InspectionStage('reserve', STAGE_LANE_LOCAL, check_reserve, cost=0.0001, rejection=0.5),
+            InspectionStage('blacklist', STAGE_LANE_LOCAL, check_blacklist, cost=0.005, rejection=0.05),
+            InspectionStage('malicious_tx', STAGE_LANE_ETHERSCAN, check_malicious_tx, cost=0.8, rejection=0.1),
+            InspectionStage('source_code', STAGE_LANE_ETHERSCAN, check_source_code, cost=0.3, rejection=0),
+            InspectionStage('creator_call', STAGE_LANE_ETHERSCAN, check_creator_call, cost=0.3, rejection=0.05, initial=False),
+            InspectionStage('number_tx_mm', STAGE_LANE_RPC, count_tx_mm, cost=0.2, rejection=0, initial=False),
+            InspectionStage('simulation', STAGE_LANE_RPC, simulate, cost=0.5, rejection=0.3),
+        ]
+
+    @timer_decorator
+    def measure_gas(self, pair, simulation_result) -> None:
+        # eth_call doesn't report the gas spent, the swaps are replayed on a fork once the pair passed every stage,
+        # outside of the stage stats; the executor falls back to its fixed gas limit if they aren't measured
+        measured = self.gas_simulator.inspect_pair(pair, SIMULATION_AMOUNT)
+        if measured is None:
+            logging.warning(f"INSPECTOR gas of {pair.token} not measured")
+            return
+
+        simulation_result.buy_gas_used = measured.buy_gas_used
+        simulation_result.sell_gas_used = measured.sell_gas_used
+        pair.buy_gas_used = measured.buy_gas_used
+        pair.sell_gas_used = measured.sell_gas_used
+        logging.info(f"INSPECTOR gas of {pair.token} buy {measured.buy_gas_used} sell {measured.sell_gas_used}")
+
+    def run_lane(self, stages, pair, result, block_number, from_block, rejected: threading.Event, expires_at=None) -> bool:
+        for stage in sorted(stages, key=lambda stage: stage.stats.rank()):
+            if rejected.is_set():
+                # another lane already rejected the pair
+                return False
+
+            if expires_at is not None and time.time() > expires_at:
+                # the scheduler gave the task up, its verdict would be stale
+                result.is_abandoned = True
+                rejected.set()
+                return False
+
+            if not stage.run(pair, result, block_number, from_block):
+                rejected.set()
+                return False
+
+        return True
+
     @timer_decorator
-    def inspect_pair(self, pair: Pair, block_number, is_initial=False) -> InspectionResult:
+    def inspect_pair(self, pair: Pair, block_number, is_initial=False, only_lanes=None, prior: InspectionResult=None, expires_at=None) -> InspectionResult:
+        """
+        :param only_lanes: only run the stages of these lanes, None runs all of them.
+        :param prior: result of an earlier speculative inspection, its passed remote stages are not run again.
+        :param expires_at: epoch seconds after which no further stage is started and the result is abandoned.
+        """
         from_block=pair.last_inspected_block+1 if pair.last_inspected_block>0 else block_number
 
         result = InspectionResult(
             pair=pair,
             from_block=from_block,
             to_block=block_number,
+            is_initial=is_initial,
         )
 
-        if pair.reserve_eth>=RESERVE_ETH_MIN_THRESHOLD and pair.reserve_eth<=RESERVE_ETH_MAX_THRESHOLD:
-            result.reserve_inrange=True
+        skipped = []
+        if prior is not None:
+            result.is_malicious = prior.is_malicious
+            result.contract_verified = prior.contract_verified
+            # local stages are cheap and re-run on the actual reserves
+            skipped = [name for name,(_,passed,_) in prior.stage_timings.items() if passed]
+
+        lanes = {}
+        for stage in self.stages:
+            if is_initial and not stage.initial:
+                continue
+            if only_lanes is not None and stage.lane not in only_lanes:
+                continue
+            if stage.name in skipped and stage.lane != STAGE_LANE_LOCAL:
+                continue
+            lanes.setdefault(stage.lane, []).append(stage)
 
-        if is_initial and not result.reserve_inrange:
-            return result        
+        rejected = threading.Event()
 
-        result.is_malicious=self.is_malicious(pair, block_number, is_initial)
-        if result.is_malicious != MaliciousPair.UNMALICIOUS:
+        # local stages are cheap and gate every remote call
+        if not self.run_lane(lanes.pop(STAGE_LANE_LOCAL, []), pair, result, block_number, from_block, rejected, expires_at):
             return result
 
-        # TODO: try to verify multiple times
-        result.contract_verified=self.is_contract_verified(pair)
-        #if not result.contract_verified:
-            #return result
-        
-        if not is_initial:
-            result.is_creator_call_contract=self.is_creator_call_contract(pair,from_block,block_number)
-            if result.is_creator_call_contract>0:                
-                return result
-        
-            result.number_tx_mm=self.number_tx_mm(pair,from_block,block_number)
+        # remote lanes are independent, run them concurrently and stop as soon as one rejects
+        lanes = list(lanes.values())
+        futures = [self.stage_executor.submit(self.run_lane, stages, pair, result, block_number, from_block, rejected, expires_at) for stages in lanes[1:]]
+        passed = self.run_lane(lanes[0], pair, result, block_number, from_block, rejected, expires_at) if len(lanes)>0 else True
+        for future in futures:
+            passed = future.result() and passed
 
-        simulation_result = self.simulator.inspect_pair(pair, SIMULATION_AMOUNT)
-        if simulation_result is not None:
-            if simulation_result.slippage > SLIPPAGE_MIN_THRESHOLD and simulation_result.slippage < SLIPPAGE_MAX_THRESHOLD:
-                result.simulation_result=simulation_result
-            else:
-                logging.warning(f"INSPECTOR simulation result rejected due to abnormal slippage {simulation_result.slippage}")
+        if not passed:
+            # the simulation lane may have completed before another lane rejected the pair
+            result.simulation_result=None
+        elif self.gas_simulator is not None and result.simulation_result is not None:
+            self.measure_gas(pair, result.simulation_result)
 
         return result
-    
-    @timer_decorator
-    def inspect_batch(self, pairs, block_number, is_initial=False):
-        results = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_pair = {executor.submit(self.inspect_pair,pair,block_number,is_initial): pair.address for pair in pairs}
-            for future in concurrent.futures.as_completed(future_to_pair):
-                pair = future_to_pair[future]
-                try:
-                    result = future.result()
-                    logging.warning(f"INSPECTOR inspect pair {pair} {result}")
-                    results.append(result)
-                except Exception as e:
-                    logging.error(f"INSPECTOR inspect pair {pair} error {e}")
-
-        return results
-        
+
 if __name__=="__main__":
     from dotenv import load_dotenv
     load_dotenv()
@@ -274,4 +374,5 @@ if __name__=="__main__":
     #print(f"number mm_tx {inspector.number_tx_mm(pair, 41665828, 41665884)}")
     #print(f"is malicious {inspector.is_malicious(pair, 41665828, is_initial=True)}")
 
-    inspector.inspect_batch([pair], 20669433, is_initial=True)
\ No newline at end of file
+    result = inspector.inspect_pair(pair, 20669433, is_initial=True)
+    logging.info(f"INSPECTOR inspect pair {pair.address} {result}")
\ No newline at end of file
@@ -0,0 +1,267 @@
+import os
+import logging
+import time
+import threading
+
+from web3 import Web3
+
+from pyrevm import EVM, Env, BlockEnv, AccountInfo
+import eth_abi
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers.utils import encode_address, encode_uint, func_selector, calculate_balance_storage_index
+
+PAPER_ETH_BALANCE=10**20 # wei credited to the paper signer, 100 ETH
+
+# balances mapping searched within the first slots of the token, as EthCallSimulator.determine_balance_slot_index
+MAX_BALANCE_SLOT_INDEX=9
+
+# runtime code storing the 2nd calldata word at the slot given by the 1st one, swapped in to write the storage of a token
+STORAGE_WRITER_CODE=bytes.fromhex('60203560003555')
+
+class PaperHolding:
+    def __init__(self, bot, token, amount, amount_in, block_number) -> None:
+        self.bot = bot
+        self.token = token
+        self.amount = amount # token wei committed to the bot, net of transfer taxes
+        self.amount_in = amount_in # wei spent
+        self.block_number = block_number
+        self.balance_slot = None
+        self.value = None # wei the holding sells for at the fork head
+        self.is_stale = False # not carried over to the fork, e.g. reflection tokens, it can't be sold anymore
+
+    def __str__(self) -> str:
+        return f"PaperHolding bot {self.bot} token {self.token} amount {self.amount} amountIn {self.amount_in} block {self.block_number} value {self.value} isStale {self.is_stale}"
+
+class PaperTradingEngine:
+    """
+    Paper trades executed on a persistent local fork: a buy commits the tokens it really gets to the bot, a sell
+    spends them. On every head the fork is moved to the new block and the open holdings are carried over by
+    writing the balance of the bot into the token storage, so that a sell meets the current reserves and the
+    taxes of the token. A holding which can't be carried over is left stale and its sell fails. State fetched
+    by the fork stays cached until the next head.
+    """
+    def __init__(self, http_url, signer) -> None:
+        self.http_url = http_url
+        self.signer = Web3.to_checksum_address(signer)
+
+        # pyrevm isn't thread-safe, paper orders and heads are sent by the executor loop to worker threads with asyncio.to_thread, possibly at once
+        self.lock = threading.Lock()
+
+        self.holdings = {} # (bot, token) -> PaperHolding
+        self.block_number = None
+        self.head = None # (block number, timestamp) not forked yet
+        self.evm = None # forked by the first buy
+
+    def __len__(self) -> int:
+        return len(self.holdings)
+
+    def fork(self, block_number=None, block_timestamp=None) -> EVM:
+        if block_number is None:
+            return EVM(fork_url=self.http_url)
+        return EVM(
+            env=Env(block=BlockEnv(number=block_number, timestamp=block_timestamp)),
+            fork_url=self.http_url,
+            fork_block=hex(block_number),
+        )
+
+    def balance_of(self, evm, token, owner) -> int:
+        result = evm.message_call(
+            caller=self.signer,
+            to=token,
+            calldata=bytes.fromhex(func_selector('balanceOf(address)') + encode_address(owner)),
+        )
+        return eth_abi.decode(['uint256'], result)[0]
+
+    def find_balance_slot(self, evm, token, owner, balance):
+        for idx in range(MAX_BALANCE_SLOT_INDEX):
+            if evm.storage(token, Web3.to_int(calculate_balance_storage_index(owner, idx))) == balance:
+                return idx
+        return None
+
+    def write_storage(self, evm, address, index, value) -> None:
+        info = evm.basic(address)
+        code = evm.get_code(address)
+        evm.insert_account_info(address, AccountInfo(balance=info.balance, nonce=info.nonce, code=STORAGE_WRITER_CODE))
+        try:
+            evm.message_call(
+                caller=self.signer,
+                to=address,
+                calldata=bytes.fromhex(encode_uint(index) + encode_uint(value)),
+            )
+        finally:
+            evm.insert_account_info(address, AccountInfo(balance=info.balance, nonce=info.nonce, code_hash=info.code_hash, code=code))
+
+    def carry_over(self, evm, holding) -> None:
+        if holding.balance_slot is None:
+            holding.balance_slot = self.find_balance_slot(self.evm, holding.token, holding.bot, holding.amount)
+            if holding.balance_slot is None:
+                raise Exception(f"balance slot of {holding.token} not found")
+
+        storage_index = calculate_balance_storage_index(holding.bot, holding.balance_slot)
+        self.write_storage(evm, holding.token, Web3.to_int(storage_index), holding.amount)
+
+        if self.balance_of(evm, holding.token, holding.bot) != holding.amount:
+            raise Exception(f"balance of {holding.bot} in {holding.token} not carried over")
+
+    def quote(self, holding):
+        # sells on a checkpoint reverted right after, the fork keeps the holding and warms the state of the next sell
+        checkpoint = self.evm.snapshot()
+        try:
+            result = self.evm.message_call(
+                caller=self.signer,
+                to=holding.bot,
+                calldata=bytes.fromhex(
+                    func_selector('sell(address,address,uint256)') + encode_address(holding.token) + encode_address(self.signer) + encode_uint(int(time.time()) + 1000)
+                ),
+            )
+            return eth_abi.decode(['uint[]'], result)[0][1]
+        finally:
+            self.evm.revert(checkpoint)
+
+    def on_block(self, block_number, block_timestamp) -> None:
+        with self.lock:
+            if self.block_number is not None and block_number <= self.block_number:
+                return
+
+            holdings = [holding for holding in self.holdings.values() if not holding.is_stale]
+            if len(holdings) == 0:
+                # forked lazily by the next buy
+                self.head = (block_number, block_timestamp)
+                return
+
+            evm = self.fork(block_number, block_timestamp)
+            for holding in holdings:
+                try:
+                    self.carry_over(evm, holding)
+                except Exception as e:
+                    # e.g. reflection tokens, the others move on without it and it isn't tried again
+                    holding.is_stale = True
+                    holding.value = None
+                    logging.warning(f"SIMULATOR paper holding left stale moving to block {block_number}, carry over of {holding} error {e}")
+
+            self.evm = evm
+            self.block_number = block_number
+            self.head = None
+
+            for holding in holdings:
+                if holding.is_stale:
+                    continue
+                try:
+                    holding.value = self.quote(holding)
+                    logging.info(f"SIMULATOR paper {holding} unrealized PnL {Web3.from_wei(holding.value - holding.amount_in, 'ether')}")
+                except Exception as e:
+                    holding.value = None
+                    logging.warning(f"SIMULATOR paper quote of {holding} error {e}")
+
+    def buy(self, token, amount, signer=None, bot=None):
+        """
+        Returns [amount in, tokens committed to the bot] in wei, None if the buy reverted.
+        """
+        with self.lock:
+            try:
+                signer = self.signer if signer is None else Web3.to_checksum_address(signer)
+                bot = Web3.to_checksum_address(bot)
+                token = Web3.to_checksum_address(token)
+                value = Web3.to_wei(amount, 'ether')
+
+                if self.head is not None:
+                    # no holding was carried over since the head, none is left on the old fork
+                    self.evm = self.fork(*self.head)
+                    self.block_number, self.head = self.head[0], None
+                elif self.evm is None:
+                    self.evm = self.fork()
+
+                if self.evm.get_balance(signer) < value + PAPER_ETH_BALANCE:
+                    self.evm.set_balance(signer, value + PAPER_ETH_BALANCE)
+
+                balance_before = self.balance_of(self.evm, token, bot)
+                result = self.evm.message_call(
+                    caller=signer,
+                    to=bot,
+                    value=value,
+                    calldata=bytes.fromhex(
+                        func_selector('buy(address,uint256)') + encode_address(token) + encode_uint(int(time.time()) + 1000)
+                    ),
+                )
+                amounts = eth_abi.decode(['uint[]'], result)[0]
+
+                # the router amounts don't show the transfer taxes, the balance does
+                balance = self.balance_of(self.evm, token, bot)
+                key = (bot.lower(), token.lower())
+                holding = self.holdings.get(key)
+                amount_in = value + (holding.amount_in if holding is not None else 0)
+                self.holdings[key] = PaperHolding(bot, token, balance, amount_in, self.block_number)
+
+                logging.info(f"SIMULATOR paper buy {token} amountIn {amounts[0]} amountOut {amounts[1]} received {balance - balance_before}")
+                return [amounts[0], balance - balance_before]
+            except Exception as e:
+                logging.error(f"SIMULATOR paper buy {token} error {e}")
+
+    def sell(self, token, amount=None, signer=None, bot=None):
+        """
+        Sells the tokens committed to the bot by the paper buys. Returns [tokens sold, amount out] in wei, None
+        if the bot holds none or the sell reverted.
+        """
+        with self.lock:
+            signer = self.signer if signer is None else Web3.to_checksum_address(signer)
+            bot = Web3.to_checksum_address(bot)
+            token = Web3.to_checksum_address(token)
+
+            key = (bot.lower(), token.lower())
+            holding = self.holdings.get(key)
+            if holding is None:
+                logging.error(f"SIMULATOR paper sell {token} error no holding in bot {bot}")
+                return None
+
+            if holding.is_stale:
+                # its balance isn't on the fork, the holding is written off
+                self.holdings.pop(key)
+                logging.error(f"SIMULATOR paper sell {token} error {holding} not carried over to block {self.block_number}")
+                return None
+
+            try:
+                result = self.evm.message_call(
+                    caller=signer,
+                    to=bot,
+                    calldata=bytes.fromhex(
+                        func_selector('sell(address,address,uint256)') + encode_address(token) + encode_address(signer) + encode_uint(int(time.time()) + 1000)
+                    ),
+                )
+                amounts = eth_abi.decode(['uint[]'], result)[0]
+            except Exception as e:
+                # the holding stays, as after a reverted sell on chain
+                logging.error(f"SIMULATOR paper sell {token} error {e}")
+                return None
+
+            self.holdings.pop(key)
+            logging.info(f"SIMULATOR paper sell {token} amountIn {amounts[0]} amountOut {amounts[1]} PnL {Web3.from_wei(amounts[1] - holding.amount_in, 'ether')} held since block {holding.block_number}")
+            return [amounts[0], amounts[1]]
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    w3 = Web3(Web3.HTTPProvider(os.environ.get('HTTPS_URL')))
+    engine = PaperTradingEngine(
+        http_url=os.environ.get('HTTPS_URL'),
+        signer=os.environ.get('MANAGER_ADDRESS'),
+    )
+
+    bot = os.environ.get('INSPECTOR_BOT').split(',')[0]
+    token = '0x22a0005b11e76128239401f237c512962b32a38b'
+
+    block = w3.eth.get_block('latest')
+    engine.on_block(block['number'], block['timestamp'])
+    logging.info(f"Paper buy result {engine.buy(token, 0.001, bot=bot)}")
+
+    # the holding moves to the next heads with the bot balance
+    for _ in range(3):
+        time.sleep(2)
+        block = w3.eth.get_block('latest')
+        engine.on_block(block['number'], block['timestamp'])
+
+    logging.info(f"Paper sell result {engine.sell(token, bot=bot)}")
@@ -35,8 +35,6 @@ class RevmSimulator:
                  ):
         logging.debug(f"start simulation...")
 
-        self.evm = EVM(fork_url=http_url)
-
         self.http_url = http_url
         self.signer = signer
 
@@ -50,18 +48,23 @@ class RevmSimulator:
     @timer_decorator
     def inspect_token_by_swap(self, token, amount) -> None:
         try:
+            # forked at the latest block for every inspection, cold accesses are charged as on chain
+            evm = EVM(fork_url=self.http_url)
+
             # fake balance 
-            logging.debug(f"Balance before {Web3.from_wei(self.evm.get_balance(self.signer), 'ether')}")
-            self.evm.set_balance(self.signer, 1000*10**18)
-            logging.debug(f"Balance after {Web3.from_wei(self.evm.get_balance(self.signer), 'ether')}")
+            logging.debug(f"Balance before {Web3.from_wei(evm.get_balance(self.signer), 'ether')}")
+            evm.set_balance(self.signer, 1000*10**18)
+            logging.debug(f"Balance after {Web3.from_wei(evm.get_balance(self.signer), 'ether')}")
 
             # buy
-            resultBuy = self.buy(token, amount)
-            logging.info(f"SIMULATOR buy result {resultBuy}")
+            resultBuy = self.buy(evm, token, amount)
+            buy_gas_used = self.gas_used(evm)
+            logging.info(f"SIMULATOR buy result {resultBuy} gasUsed {buy_gas_used}")
 
             # sell
-            resultSell = self.sell(token)
-            logging.info(f"SIMULATOR sell result {resultSell}")
+            resultSell = self.sell(evm, token)
+            sell_gas_used = self.gas_used(evm)
+            logging.info(f"SIMULATOR sell result {resultSell} gasUsed {sell_gas_used}")
 
             assert resultSell[0][0] == resultBuy[0][1]
 
@@ -69,13 +72,18 @@ class RevmSimulator:
             slippage = (Decimal(amount) - Decimal(amount_out))/Decimal(amount)*Decimal(10000)
             amount_token = Web3.from_wei(resultBuy[0][1], 'ether')
             
-            return (amount, amount_out, slippage, amount_token)
+            return (amount, amount_out, slippage, amount_token, buy_gas_used, sell_gas_used)
         except Exception as e:
             logging.error(f"SIMULATOR inspect {token} failed with error {e}")
             return None
+
+    def gas_used(self, evm) -> int:
+        # gas spent before the refund of the last call, a gas limit must cover it; EVM.result as of pyrevm 0.3.3 (lib/pyrevm)
+        result = evm.result
+        return result.gas_used + result.gas_refunded
         
-    def buy(self, token, amount):
-        result = self.evm.message_call(
+    def buy(self, evm, token, amount):
+        result = evm.message_call(
             caller=self.signer,
             to=self.bot.address,
             value=Web3.to_wei(amount, 'ether'),
@@ -92,8 +100,8 @@ class RevmSimulator:
 
         return resultBuy
     
-    def sell(self, token):
-        result = self.evm.message_call(
+    def sell(self, evm, token):
+        result = evm.message_call(
             caller=self.signer,
             to=self.bot.address,
             calldata=bytes.fromhex(
@@ -121,6 +129,8 @@ class RevmSimulator:
                 amount_out=result[1],
                 slippage=result[2],
                 amount_token=result[3],
+                buy_gas_used=result[4],
+                sell_gas_used=result[5],
                 )
         
 if __name__ == '__main__':
@@ -1 +1,3 @@
-from library.singleton import Singleton
\ No newline at end of file
+from library.singleton import Singleton
+from library.watchlist import Watchlist
+from library.position_book import PositionBook
\ No newline at end of file
@@ -0,0 +1,152 @@
+import numpy as np
+
+class PositionBook:
+    """
+    Open positions keyed by pair address, backed by dense column arrays so that the exit conditions of
+    every position are evaluated in one vectorized pass. Rows are kept contiguous by moving the last row
+    into the slot of a removed one. A position being sold leaves the rows for the liquidating set until its
+    sell is acknowledged, so it is neither evaluated nor sold twice while the others keep being evaluated.
+    """
+    def __init__(self, capacity=64) -> None:
+        self.positions = {} # address -> Position
+        self.liquidating = {} # address -> (Position, investment) with a sell in-flight
+        self.rows = {} # address -> row index
+        self.addresses = [] # row index -> address
+        self.allocate(capacity)
+
+    def allocate(self, capacity) -> None:
+        size = len(self.addresses)
+
+        def grow(column, fill):
+            resized = np.full(capacity, fill, dtype=np.float64)
+            if column is not None:
+                resized[:size] = column[:size]
+            return resized
+
+        self.amount = grow(getattr(self, 'amount', None), 0)
+        self.investment = grow(getattr(self, 'investment', None), 0)
+        self.start_time = grow(getattr(self, 'start_time', None), 0)
+        # unknown reserves are NaN so that a position without any price update only exits on timeout
+        self.reserve_token = grow(getattr(self, 'reserve_token', None), np.nan)
+        self.reserve_eth = grow(getattr(self, 'reserve_eth', None), np.nan)
+        self.pnl = grow(getattr(self, 'pnl', None), np.nan)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def __contains__(self, address) -> bool:
+        return address in self.rows
+
+    def __iter__(self):
+        return iter([self.positions[address] for address in self.addresses])
+
+    def get(self, address):
+        return self.positions.get(address)
+
+    def add(self, position, investment) -> None:
+        address = position.pair.address
+        if address in self.rows:
+            self.remove(address)
+
+        if len(self.addresses) == len(self.amount):
+            self.allocate(len(self.amount)*2)
+
+        row = len(self.addresses)
+        self.addresses.append(address)
+        self.rows[address] = row
+        self.positions[address] = position
+
+        self.amount[row] = float(position.amount)
+        self.investment[row] = float(investment)
+        self.start_time[row] = position.start_time
+        self.reserve_token[row] = np.nan
+        self.reserve_eth[row] = np.nan
+        self.pnl[row] = np.nan
+        self.update_reserves(position.pair)
+
+    def remove(self, address):
+        row = self.rows.pop(address, None)
+        if row is None:
+            return None
+
+        last = len(self.addresses) - 1
+        if row != last:
+            moved = self.addresses[last]
+            self.addresses[row] = moved
+            self.rows[moved] = row
+            for column in (self.amount, self.investment, self.start_time, self.reserve_token, self.reserve_eth, self.pnl):
+                column[row] = column[last]
+        self.addresses.pop()
+
+        return self.positions.pop(address)
+
+    def begin_liquidation(self, address):
+        # None if the position isn't open, e.g. its sell was already sent
+        row = self.rows.get(address)
+        investment = self.investment[row] if row is not None else 0
+        position = self.remove(address)
+        if position is not None:
+            self.liquidating[address] = (position, investment)
+        return position
+
+    def end_liquidation(self, address):
+        entry = self.liquidating.pop(address, None)
+        return entry[0] if entry is not None else None
+
+    def abort_liquidation(self, address):
+        # the sell never left, the position is evaluated again from its original start time
+        entry = self.liquidating.pop(address, None)
+        if entry is None:
+            return None
+        self.add(*entry)
+        return entry[0]
+
+    def is_liquidating(self, address) -> bool:
+        return address in self.liquidating
+
+    def update_reserves(self, pair) -> bool:
+        row = self.rows.get(pair.address)
+        if row is None or pair.reserve_token == 0 or pair.reserve_eth == 0:
+            return False
+
+        self.reserve_token[row] = float(pair.reserve_token)
+        self.reserve_eth[row] = float(pair.reserve_eth)
+        return True
+
+    def evaluate(self, now, gas_cost, take_profit, stop_loss, hold_max_duration):
+        """
+        Recomputes PnL percentage of every position against the current reserves and returns
+        the list of (position, pnl or None if unpriced, is_timeout) that hit take-profit, stop-loss or timeout.
+        """
+        size = len(self.addresses)
+        if size == 0:
+            return []
+
+        amount = self.amount[:size]
+        investment = self.investment[:size]
+
+        value = amount * self.reserve_eth[:size] / self.reserve_token[:size]
+        pnl = (value - investment - gas_cost) / investment * 100
+        self.pnl[:size] = pnl
+
+        with np.errstate(invalid='ignore'):
+            hit = (pnl > take_profit) | (pnl < stop_loss)
+        timeout = (now - self.start_time[:size]) > hold_max_duration
+
+        return [(self.positions[self.addresses[row]], None if np.isnan(pnl[row]) else float(pnl[row]), not hit[row]) for row in np.flatnonzero(hit | timeout)]
+
+    def evaluate_pair(self, address, gas_cost, take_profit, stop_loss):
+        """
+        Recomputes PnL percentage of a single position, returns it if take-profit or stop-loss is hit, None otherwise.
+        """
+        row = self.rows.get(address)
+        if row is None or np.isnan(self.reserve_token[row]):
+            return None
+
+        value = self.amount[row] * self.reserve_eth[row] / self.reserve_token[row]
+        pnl = (value - self.investment[row] - gas_cost) / self.investment[row] * 100
+        self.pnl[row] = pnl
+
+        if pnl > take_profit or pnl < stop_loss:
+            return float(pnl)
+        return None
@@ -0,0 +1,61 @@
+import heapq
+import itertools
+
+class Watchlist:
+    """
+    Pairs under observation keyed by address, with a min-heap on the next inspection time.
+    Lookup is O(1), extracting due pairs is O(log n) each. Heap entries are invalidated lazily:
+    only the entry carrying the latest sequence number of an address is live.
+    """
+    def __init__(self, capacity) -> None:
+        self.capacity = capacity
+        self.entries = {} # address -> Pair
+        self.schedule = {} # address -> sequence number of the live heap entry
+        self.heap = [] # (due_at, sequence number, address)
+        self.counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, address) -> bool:
+        return address in self.entries
+
+    def is_full(self) -> bool:
+        return len(self.entries) >= self.capacity
+
+    def get(self, address):
+        return self.entries.get(address)
+
+    def add(self, pair, due_at) -> bool:
+        if pair.address not in self.entries and self.is_full():
+            return False
+
+        self.entries[pair.address] = pair
+        self.reschedule(pair.address, due_at)
+        return True
+
+    def reschedule(self, address, due_at) -> None:
+        seq = next(self.counter)
+        self.schedule[address] = seq
+        heapq.heappush(self.heap, (due_at, seq, address))
+
+    def remove(self, address):
+        self.schedule.pop(address, None)
+        return self.entries.pop(address, None)
+
+    def pop_due(self, now):
+        """
+        Returns the pairs whose inspection time elapsed before now. They leave the schedule until
+        reschedule is called with their next inspection time.
+        """
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] < now:
+            _, seq, address = heapq.heappop(self.heap)
+            if self.schedule.get(address) != seq:
+                # stale entry of a rescheduled or removed pair
+                continue
+
+            self.schedule.pop(address)
+            due.append(self.entries[address])
+
+        return due
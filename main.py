@@ -19,22 +19,22 @@ load_dotenv()
 #logging.basicConfig(level=logging.INFO)
 logging.basicConfig(level=int(os.environ.get('LOG_LEVEL')))
 
-from watcher import BlockWatcher
-from inspector import PairInspector
+from watcher import BlockWatcher, MempoolWatcher
+from inspector import PairInspector, InspectionScheduler, InspectorWorkerPool
 from executor import BuySellExecutor
 from reporter import Reporter
-from helpers import load_abi, timer_decorator, calculate_price, calculate_next_block_base_fee, \
-                        constants, get_hour_in_vntz, calculate_expect_pnl, determine_epoch, GasHelper
+from helpers import load_abi, calculate_price, \
+                        constants, get_hour_in_vntz, calculate_expect_pnl, determine_epoch, FeePredictor
 
+from library import Watchlist, PositionBook
 from data import ExecutionOrder, SimulationResult, ExecutionAck, Position, TxStatus, \
                     ReportData, ReportDataType, BlockData, Pair, MaliciousPair, InspectionResult, \
-                    ControlOrder, ControlOrderType
+                    ControlOrder, ControlOrderType, ReserveUpdate, MempoolAlert
 
 # global variables
 glb_fullfilled = 0
-glb_liquidated = False
-glb_watchlist = []
-glb_inventory = []
+glb_watchlist = None
+glb_inventory = PositionBook()
 glb_daily_pnl = (datetime.now(), 0)
 glb_auto_run = True
 glb_lock = threading.Lock()
@@ -57,7 +57,7 @@ RESERVE_ETH_MAX_THRESHOLD=float(os.environ.get('RESERVE_ETH_MAX_THRESHOLD'))
 # watchlist config
 MAX_INSPECT_ATTEMPTS=int(os.environ.get('MAX_INSPECT_ATTEMPTS'))
 INSPECT_INTERVAL_SECONDS=int(os.environ.get('INSPECT_INTERVAL_SECONDS'))
-WATCHLIST_CAPACITY = 100
+WATCHLIST_CAPACITY=int(os.environ.get('WATCHLIST_CAPACITY', '5000'))
 NUMBER_TX_MM_THRESHOLD=int(os.environ.get('NUMBER_TX_MM_THRESHOLD'))
 
 # buy/sell tx config
@@ -70,6 +70,10 @@ MIN_EXPECTED_PNL=float(os.environ.get('MIN_EXPECTED_PNL'))
 RISK_REWARD_RATIO=float(os.environ.get('RISK_REWARD_RATIO'))
 EPOCH_TIME_HOURS=int(os.environ.get('EPOCH_TIME_HOURS'))
 MAX_GAS_PRICE_ALLOWANCE=float(os.environ.get('MAX_GAS_PRICE_ALLOWANCE'))
+FEE_HISTORY_INTERVAL_SECONDS=int(os.environ.get('FEE_HISTORY_INTERVAL_SECONDS', '0'))
+MEMPOOL_WATCHING=int(os.environ.get('MEMPOOL_WATCHING', '0'))
+PRIORITY_SELL_FEE_MULTIPLIER=float(os.environ.get('PRIORITY_SELL_FEE_MULTIPLIER', '1.5'))
+PAIR_INIT_CODE_HASH=os.environ.get('PAIR_INIT_CODE_HASH')
 
 DEADLINE_DELAY_SECONDS = 30
 GAS_LIMIT = 250*10**3
@@ -83,7 +87,7 @@ STOP_LOSS_PERCENTAGE=float(os.environ.get('STOP_LOSS_PERCENTAGE'))
 HOLD_MAX_DURATION_SECONDS=int(os.environ.get('HOLD_MAX_DURATION_SECONDS'))
 HARD_STOP_PNL_THRESHOLD=int(os.environ.get('HARD_STOP_PNL_THRESHOLD'))
 
-async def watching_process(watching_broker, watching_notifier):
+async def watching_process(watching_broker, watching_notifier, sync_broker):
     block_watcher = BlockWatcher(os.environ.get('HTTPS_URL'),
                                 os.environ.get('WSS_URL'), 
                                 watching_broker, 
@@ -92,12 +96,25 @@ async def watching_process(watching_broker, watching_notifier):
                                 FACTORY_ABI,
                                 os.environ.get('WETH_ADDRESS'),
                                 PAIR_ABI,
+                                sync_broker,
                                 )
     await block_watcher.main()
 
-async def strategy(watching_broker, execution_broker, report_broker, watching_notifier,):
+async def mempool_watching_process(mempool_broker, launch_broker):
+    # launches are only pre-detected when the pair init code hash of the factory is configured
+    mempool_watcher = MempoolWatcher(os.environ.get('WSS_URL'),
+                                    os.environ.get('ROUTER_ADDRESS'),
+                                    glb_inventory,
+                                    mempool_broker,
+                                    launch_broker if PAIR_INIT_CODE_HASH else None,
+                                    os.environ.get('FACTORY_ADDRESS'),
+                                    os.environ.get('WETH_ADDRESS'),
+                                    PAIR_INIT_CODE_HASH,
+                                    )
+    await mempool_watcher.main()
+
+async def strategy(watching_broker, execution_broker, report_broker, watching_notifier, inspector_pool, sync_broker, mempool_broker, launch_broker,):
     global glb_fullfilled
-    global glb_liquidated
     global glb_lock
     global glb_inventory
     global glb_watchlist
@@ -105,19 +122,21 @@ async def strategy(watching_broker, execution_broker, report_broker, watching_no
     global glb_auto_run
     global BUY_AMOUNT
 
-    gas_helper = GasHelper(os.environ.get('ETHERSCAN_API_URL'), os.environ.get('BASESCAN_API_KEYS'))
-    #print(f"!!!! GAS_PRICE {gas_helper.get_base_gas_price()}")
+    fee_predictor = FeePredictor(MAX_PRIORITY_FEE_PER_GAS)
+    background_tasks = []
+    if FEE_HISTORY_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(fee_predictor.run(Web3(Web3.HTTPProvider(os.environ.get('HTTPS_URL'))), FEE_HISTORY_INTERVAL_SECONDS)))
 
-    def calculate_pnl_percentage(position, pair):        
-        numerator = Decimal(position.amount)*calculate_price(pair.reserve_token, pair.reserve_eth) - Decimal(BUY_AMOUNT) - Decimal(GAS_COST)
-        denominator = Decimal(BUY_AMOUNT)
-        return (numerator / denominator) * Decimal(100)
-    
-    def send_exec_order(block_data, pair, is_paper=False):
+    async def send_exec_order(block_data, pair, is_paper=False):
         global glb_fullfilled
 
-        gas_price = gas_helper.get_base_gas_price()
-        if gas_price>MAX_GAS_PRICE_ALLOWANCE:
+        if not glb_auto_run:
+            logging.warning(f"MAIN auto-run is disabled, skip buy-order of {pair.address}")
+            return None
+
+        # next block base fee in gwei, predicted locally from the latest head
+        gas_price = fee_predictor.base_fee_gwei()
+        if gas_price is not None and gas_price>MAX_GAS_PRICE_ALLOWANCE:
             logging.error(f"Cancel execution due to Gas price {gas_price} is greater than max allowance {MAX_GAS_PRICE_ALLOWANCE}")
             return None
 
@@ -139,156 +158,298 @@ async def strategy(watching_broker, execution_broker, report_broker, watching_no
         else:
             logging.warning(f"MAIN inventory capacity {INVENTORY_CAPACITY} is full")
 
-    while True:
-        block_data = await watching_broker.coro_get()
-        logging.info(f"MAIN received block {block_data}")
-        
-        # send block report
-        if len(block_data.pairs) > 0:
-            report_broker.put(ReportData(
-                type=ReportDataType.BLOCK,
-                data=block_data,
+    def send_sell_order(position, block_number, block_timestamp, priority_fee=None):
+        # sells of different positions run in parallel, a position is only sold once until its ack
+        with glb_lock:
+            position = glb_inventory.begin_liquidation(position.pair.address)
+        if position is None:
+            return None
+        logging.warning(f"MAIN Liquidate {position}, inventory length {len(glb_inventory)}")
+
+        execution_broker.put(ExecutionOrder(
+                    block_number=block_number,
+                    block_timestamp=block_timestamp,
+                    pair=position.pair,
+                    amount_in=position.amount,
+                    amount_out_min=0,
+                    is_buy=False,
+                    signer=position.signer,
+                    bot=position.bot,
+                    is_paper=position.is_paper,
+                    priority_fee=priority_fee,
+                ))
+
+    def outbid_priority_fee(alert):
+        # tip of the threatening tx, legacy txs pay the gas price above the base fee
+        threat_fee = 0
+        if alert.max_priority_fee_per_gas is not None:
+            threat_fee = alert.max_priority_fee_per_gas
+        elif alert.gas_price is not None and fee_predictor.is_ready():
+            threat_fee = max(alert.gas_price - fee_predictor.next_base_fee, 0)
+
+        return max(int(threat_fee*PRIORITY_SELL_FEE_MULTIPLIER), fee_predictor.max_priority_fee_per_gas()) + 1
+
+    async def handle_mempool_alerts():
+        # a pending rug is answered right away with a sell outbidding its tip
+        while True:
+            alert = await mempool_broker.coro_get()
+            if alert is None or not isinstance(alert, MempoolAlert):
+                continue
+
+            position = glb_inventory.get(alert.pair.address)
+            if position is None:
+                continue
+
+            try:
+                priority_fee = outbid_priority_fee(alert)
+                logging.warning(f"MAIN {position} priority liquidation caused by pending tx {alert.tx_hash} method {alert.method_id} priorityFee {priority_fee}")
+
+                send_sell_order(position,
+                                latest_block.block_number if latest_block is not None else 0,
+                                latest_block.block_timestamp if latest_block is not None else 0,
+                                priority_fee)
+            except Exception as e:
+                logging.error(f"MAIN handle mempool alert {alert.pair.address} error {e}")
+
+    async def handle_pending_launches():
+        # etherscan stages of a pending launch run ahead of its PairCreated log
+        while True:
+            pair = await launch_broker.coro_get()
+            if pair is None or not isinstance(pair, Pair) or latest_block is None:
+                continue
+
+            if RUN_MODE==constants.WATCHING_ONLY_MODE or not glb_auto_run:
+                continue
+
+            try:
+                scheduler.submit_speculative(pair, latest_block.block_number, latest_block.block_timestamp)
+            except Exception as e:
+                logging.error(f"MAIN speculative inspection {pair.address} error {e}")
+
+    async def handle_reserve_updates():
+        # take-profit and stop-loss are checked upon every Sync log of an inventory pair,
+        # timeout is left to the per-block evaluation
+        while True:
+            update = await sync_broker.coro_get()
+            if update is None or not isinstance(update, ReserveUpdate):
+                continue
+
+            if update.pair.address not in glb_inventory:
+                continue
+
+            try:
+                with glb_lock:
+                    glb_inventory.update_reserves(update.pair)
+                    pnl = glb_inventory.evaluate_pair(update.pair.address, GAS_COST, TAKE_PROFIT_PERCENTAGE, STOP_LOSS_PERCENTAGE)
+                if pnl is None:
+                    continue
+
+                position = glb_inventory.get(update.pair.address)
+                position.pnl = Decimal(pnl)
+                logging.warning(f"MAIN {position} take profit or stop loss caused by pnl {position.pnl} upon sync in tx {update.tx_hash}")
+
+                send_sell_order(position, update.block_number, latest_block.block_timestamp if latest_block is not None else 0)
+            except Exception as e:
+                logging.error(f"MAIN handle reserve update {update.pair.address} error {e}")
+
+    def next_inspect_time(pair):
+        return pair.created_at + pair.inspect_attempts*INSPECT_INTERVAL_SECONDS
+
+    async def handle_watchlist_result(block_data, result):
+        pair = glb_watchlist.get(result.pair.address)
+        if pair is None:
+            return
+
+        if result.simulation_result is None:
+            with glb_lock:
+                glb_watchlist.remove(pair.address)
+            logging.warning(f"MAIN remove pair {pair.address} from watchlist due to inspection failed")
+            return
+
+        with glb_lock:
+            pair.inspect_attempts += 1
+            pair.number_tx_mm = result.number_tx_mm
+            pair.contract_verified = result.contract_verified if not pair.contract_verified else pair.contract_verified
+            if result.simulation_result.buy_gas_used is not None:
+                # gas limits are sized from the latest measurement
+                pair.buy_gas_used = result.simulation_result.buy_gas_used
+                pair.sell_gas_used = result.simulation_result.sell_gas_used
+            # TODO: last_inspected_block is not updated and stay as initial value created_block_number
+            # in order to re-verify multiple times to gain reliability
+            #pair.last_inspected_block = block_data.block_number
+
+        logging.warning(f"MAIN update upon inspect attempts {pair}")
+
+        if pair.inspect_attempts >= MAX_INSPECT_ATTEMPTS:
+            with glb_lock:
+                glb_watchlist.remove(pair.address)
+            logging.warning(f"MAIN remove pair {pair.address} from watching list caused by reaching max attempts {MAX_INSPECT_ATTEMPTS}")
+
+            if pair.number_tx_mm >= NUMBER_TX_MM_THRESHOLD and pair.contract_verified:
+                is_paper = True if RUN_MODE==constants.PAPER_TRADE_MODE else False
+                await send_exec_order(block_data,pair,is_paper)
+            else:
+                logging.warning(f"MAIN pair {pair.address} not qualified for execution due to numberTxMM {pair.number_tx_mm} is not sufficient or contract unverified")
+        else:
+            with glb_lock:
+                glb_watchlist.reschedule(pair.address, next_inspect_time(pair))
+
+    async def handle_initial_result(block_data, result):
+        if result.simulation_result is None:
+            return
+
+        if MAX_INSPECT_ATTEMPTS > 1:
+            if glb_watchlist.is_full():
+                logging.warning(f"MAIN watchlist is already full capacity {WATCHLIST_CAPACITY}")
+                return
+
+            with glb_lock:
+                # append to watchlist
+                pair=result.pair
+                pair.inspect_attempts=1
+                pair.last_inspected_block=block_data.block_number
+                pair.contract_verified=result.contract_verified
+                pair.number_tx_mm=result.number_tx_mm
+
+                glb_watchlist.add(pair, next_inspect_time(pair))
+
+            logging.warning(f"MAIN add pair {pair.address} to watchlist length {len(glb_watchlist)}")
+        else:
+            # send order immediately
+            await send_exec_order(block_data, result.pair)
+
+    def handle_abandoned_result(result):
+        # no verdict was reached, a watched pair keeps its attempts and is inspected again at the next block
+        pair = glb_watchlist.get(result.pair.address)
+        if pair is None:
+            logging.warning(f"MAIN drop pair {result.pair.address} with abandoned initial inspection")
+            return
+
+        with glb_lock:
+            glb_watchlist.reschedule(pair.address, next_inspect_time(pair))
+        logging.warning(f"MAIN reschedule pair {pair.address} with abandoned inspection")
+
+    async def handle_inspection_results():
+        # results are applied as soon as they are ready, against the latest block seen
+        while True:
+            result = await scheduler.coro_get()
+            try:
+                if result.is_abandoned:
+                    handle_abandoned_result(result)
+                elif result.is_initial:
+                    await handle_initial_result(latest_block, result)
+                else:
+                    await handle_watchlist_result(latest_block, result)
+            except Exception as e:
+                logging.error(f"MAIN handle inspection result {result.pair.address} error {e}")
+
+    glb_watchlist = Watchlist(WATCHLIST_CAPACITY)
+    scheduler = InspectionScheduler(inspector_pool)
+    background_tasks += [
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(handle_inspection_results()),
+        asyncio.create_task(handle_reserve_updates()),
+        asyncio.create_task(handle_mempool_alerts()),
+        asyncio.create_task(handle_pending_launches()),
+    ]
+    latest_block = None
+
+    try:
+        while True:
+            block_data = await watching_broker.coro_get()
+            latest_block = block_data
+            logging.info(f"MAIN received block {block_data}")
+
+            fee_predictor.update(block_data.block_number, block_data.base_fee, block_data.gas_used, block_data.gas_limit)
+
+            # forward the head to the executor process which keeps its own fee predictor
+            execution_broker.put(BlockData(
+                block_number=block_data.block_number,
+                block_timestamp=block_data.block_timestamp,
+                base_fee=block_data.base_fee,
+                gas_used=block_data.gas_used,
+                gas_limit=block_data.gas_limit,
             ))
+        
+            # send block report
+            if len(block_data.pairs) > 0:
+                report_broker.put(ReportData(
+                    type=ReportDataType.BLOCK,
+                    data=block_data,
+                ))
+
+            # hardstop based on pnl
+            logging.info(f"[{glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}] Realized PnL {round(glb_daily_pnl[1],6)} Epoch {determine_epoch(EPOCH_TIME_HOURS)} Expected PnL {round(calculate_expect_pnl(BUY_AMOUNT, MIN_BUY_AMOUNT, MIN_EXPECTED_PNL, RISK_REWARD_RATIO),6)}")
 
-        # hardstop based on pnl
-        logging.info(f"[{glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}] Realized PnL {round(glb_daily_pnl[1],6)} Epoch {determine_epoch(EPOCH_TIME_HOURS)} Expected PnL {round(calculate_expect_pnl(BUY_AMOUNT, MIN_BUY_AMOUNT, MIN_EXPECTED_PNL, RISK_REWARD_RATIO),6)}")
-
-        if RUN_MODE==constants.WATCHING_ONLY_MODE:
-            logging.info(f"I'm happy watching =))...")
-            continue
-
-        if len(glb_inventory)>0:
-            if not glb_liquidated:
-                for idx,position in enumerate(glb_inventory):
-                    is_liquidated = False
-                    for pair in block_data.inventory:
-                        if position.pair.address == pair.address:
-                            position.pnl = calculate_pnl_percentage(position, pair)
-                            logging.warning(f"MAIN {position} update PnL {position.pnl}")
-                            
-                            if position.pnl > Decimal(TAKE_PROFIT_PERCENTAGE) or position.pnl < Decimal(STOP_LOSS_PERCENTAGE):
-                                logging.warning(f"MAIN {position} take profit or stop loss caused by pnl {position.pnl}")
-                                is_liquidated = True
-                                break
-
-                    if not is_liquidated and block_data.block_timestamp - position.start_time > HOLD_MAX_DURATION_SECONDS:
+            if RUN_MODE==constants.WATCHING_ONLY_MODE:
+                logging.info(f"I'm happy watching =))...")
+                continue
+
+            if len(glb_inventory)>0:
+                # positions with a sell in-flight are out of the book, the others are still evaluated
+                for pair in block_data.inventory:
+                    glb_inventory.update_reserves(pair)
+
+                exits = glb_inventory.evaluate(block_data.block_timestamp, GAS_COST, TAKE_PROFIT_PERCENTAGE, STOP_LOSS_PERCENTAGE, HOLD_MAX_DURATION_SECONDS)
+                for position, pnl, is_timeout in exits:
+                    if pnl is not None:
+                        position.pnl = Decimal(pnl)
+                    if is_timeout:
                         logging.warning(f"MAIN {position} liquidation call caused by timeout {HOLD_MAX_DURATION_SECONDS}")
-                        is_liquidated = True
+                    else:
+                        logging.warning(f"MAIN {position} take profit or stop loss caused by pnl {position.pnl}")
 
-                    if is_liquidated:
-                        with glb_lock:
-                            glb_liquidated = True
-                            glb_inventory.pop(idx)
-                        logging.warning(f"MAIN Remove {position} from inventory at index #{idx}")
-
-                        execution_broker.put(ExecutionOrder(
-                                    block_number=block_data.block_number,
-                                    block_timestamp=block_data.block_timestamp,
-                                    pair=position.pair,
-                                    amount_in=position.amount,
-                                    amount_out_min=0,
-                                    is_buy=False,
-                                    signer=position.signer,
-                                    bot=position.bot,
-                                    is_paper=position.is_paper,
-                                ))
+                    send_sell_order(position, block_data.block_number, block_data.block_timestamp)
         
-        if glb_daily_pnl[1] < HARD_STOP_PNL_THRESHOLD and glb_auto_run:
-            with glb_lock:
-                glb_auto_run = False
-                logging.warning(f"MAIN stop auto run...")
+            if glb_daily_pnl[1] < HARD_STOP_PNL_THRESHOLD and glb_auto_run:
+                with glb_lock:
+                    glb_auto_run = False
+                    logging.warning(f"MAIN stop auto run...")
 
-        if not glb_auto_run:
-            logging.info(f"MAIN auto-run is disabled")
-            continue
+            if not glb_auto_run:
+                logging.info(f"MAIN auto-run is disabled")
+                continue
 
-        if glb_daily_pnl[0].strftime('%Y-%m-%d %H') != datetime.now().strftime('%Y-%m-%d %H'):
-            if get_hour_in_vntz(datetime.now()) % EPOCH_TIME_HOURS == 0:
-                with glb_lock:
-                    glb_daily_pnl = (datetime.now(), 0)
-                    logging.warning(f"MAIN reset epoch pnl at {glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}")
+            if glb_daily_pnl[0].strftime('%Y-%m-%d %H') != datetime.now().strftime('%Y-%m-%d %H'):
+                if get_hour_in_vntz(datetime.now()) % EPOCH_TIME_HOURS == 0:
+                    with glb_lock:
+                        glb_daily_pnl = (datetime.now(), 0)
+                        logging.warning(f"MAIN reset epoch pnl at {glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}")
 
-            if get_hour_in_vntz(datetime.now())==0:
-                with glb_lock:
-                    BUY_AMOUNT=float(os.environ.get('BUY_AMOUNT'))
-                    logging.warning(f"MAIN reset buy-amount to initial value {BUY_AMOUNT} at 0am VNT")
+                if get_hour_in_vntz(datetime.now())==0:
+                    with glb_lock:
+                        BUY_AMOUNT=float(os.environ.get('BUY_AMOUNT'))
+                        logging.warning(f"MAIN reset buy-amount to initial value {BUY_AMOUNT} at 0am VNT")
 
-        if len(glb_watchlist)>0:
-            logging.info(f"MAIN watching list {len(glb_watchlist)}")
+            # inspection is submitted after inventory evaluation and runs in background,
+            # overrun pairs from previous blocks are resubmitted first
+            scheduler.reschedule(block_data.block_number, block_data.block_timestamp)
+            scheduler.log_stage_stats()
 
-            inspection_batch=[]
-            for pair in glb_watchlist:
-                if (block_data.block_timestamp - pair.created_at) > pair.inspect_attempts*INSPECT_INTERVAL_SECONDS:
-                    logging.warning(f"MAIN pair {pair.address} inspect time #{pair.inspect_attempts + 1} elapsed")
-                    inspection_batch.append(pair)
-
-            if len(inspection_batch)>0:
-                results = inspect(inspection_batch, block_data.block_number)
-                logging.debug(f"MAIN watchlist simulation result length {len(results)}")
-
-                for result in results:
-                    if result.simulation_result is not None:
-                        for idx,pair in enumerate(glb_watchlist):
-                            if result.pair.address == pair.address:
-                                with glb_lock:
-                                    pair.inspect_attempts += 1
-                                    pair.number_tx_mm = result.number_tx_mm
-                                    pair.contract_verified = result.contract_verified if not pair.contract_verified else pair.contract_verified
-                                    # TODO: last_inspected_block is not updated and stay as initial value created_block_number
-                                    # in order to re-verify multiple times to gain reliability
-                                    #pair.last_inspected_block = block_data.block_number
-                                    
-                                logging.warning(f"MAIN update upon inspect attempts {pair}")
-
-                            if pair.inspect_attempts >= MAX_INSPECT_ATTEMPTS:
-                                with glb_lock:
-                                    glb_watchlist.pop(idx)
-                                logging.warning(f"MAIN remove pair {pair.address} from watching list at index #{idx} caused by reaching max attempts {MAX_INSPECT_ATTEMPTS}")
-
-                                if pair.number_tx_mm >= NUMBER_TX_MM_THRESHOLD and pair.contract_verified:
-                                    is_paper = True if RUN_MODE==constants.PAPER_TRADE_MODE else False
-                                    send_exec_order(block_data,pair,is_paper)
-                                else:
-                                    logging.warning(f"MAIN pair {pair.address} not qualified for execution due to numberTxMM {pair.number_tx_mm} is not sufficient or contract unverified")
-
-                # remove simulation failed pair
-                failed_pairs = [pair.address for pair in inspection_batch if pair.address not in [result.simulation_result.pair.address for result in results if result.simulation_result is not None]]
-                for idx,pair in enumerate(glb_watchlist):
-                    if pair.address in failed_pairs:
-                        with glb_lock:
-                            glb_watchlist.pop(idx)
-
-                        logging.warning(f"MAIN remove pair {pair.address} from watchlist at index #{idx} due to inspection failed")
-
-        if  len(block_data.pairs)>0:
-            results = inspect(block_data.pairs, block_data.block_number, is_initial=True)
-            logging.debug(f"MAIN inspection results length {len(results)}")
-
-            if len(glb_watchlist)<WATCHLIST_CAPACITY:
-                for result in results:
-                    if result.simulation_result is not None:
-                        if MAX_INSPECT_ATTEMPTS > 1:
-                            with glb_lock:
-                                # append to watchlist
-                                pair=result.pair
-                                pair.inspect_attempts=1
-                                pair.last_inspected_block=block_data.block_number
-                                pair.contract_verified=result.contract_verified
-                                pair.number_tx_mm=result.number_tx_mm
-
-                                glb_watchlist.append(pair)
-
-                            logging.warning(f"MAIN add pair {pair.address} to watchlist length {len(glb_watchlist)}")
-                        else:
-                            # send order immediately
-                            send_exec_order(block_data, result.pair)
-            else:
-                logging.warning(f"MAIN watchlist is already full capacity")
+            if len(glb_watchlist)>0:
+                logging.info(f"MAIN watching list {len(glb_watchlist)}")
 
-@timer_decorator
-def inspect(pairs, block_number, is_initial=False) -> List[InspectionResult]:
+                with glb_lock:
+                    inspection_batch=glb_watchlist.pop_due(block_data.block_timestamp)
+                for pair in inspection_batch:
+                    logging.warning(f"MAIN pair {pair.address} inspect time #{pair.inspect_attempts + 1} elapsed")
 
-    inspector = PairInspector(
+                if len(inspection_batch)>0:
+                    skipped = scheduler.submit(inspection_batch, block_data.block_number, block_data.block_timestamp)
+                    # still in-flight, e.g. carried over, they stay scheduled for the next block
+                    with glb_lock:
+                        for pair in skipped:
+                            glb_watchlist.reschedule(pair.address, next_inspect_time(pair))
+
+            if len(block_data.pairs)>0:
+                scheduler.submit(block_data.pairs, block_data.block_number, block_data.block_timestamp, is_initial=True)
+    finally:
+        # the strategy is cancelled on shutdown, its background tasks go with it
+        for task in background_tasks:
+            task.cancel()
+
+def build_inspector() -> PairInspector:
+    return PairInspector(
         http_url=os.environ.get('HTTPS_URL'),
         api_keys=os.environ.get('BASESCAN_API_KEYS'),
         etherscan_api_url=os.environ.get('ETHERSCAN_API_URL'),
@@ -301,8 +462,6 @@ def inspect(pairs, block_number, is_initial=False) -> List[InspectionResult]:
         bot_abi=BOT_ABI,
     )
 
-    return inspector.inspect_batch(pairs,block_number, is_initial)
-
 def execution_process(execution_broker, report_broker):
     # set process group the same as main process
     os.setpgid(0, os.getppid())
@@ -344,6 +503,9 @@ async def main():
     execution_report = aioprocessing.AioQueue()
     report_broker = aioprocessing.AioQueue()
     control_receiver = aioprocessing.AioQueue()
+    sync_broker = aioprocessing.AioQueue()
+    mempool_broker = aioprocessing.AioQueue()
+    launch_broker = aioprocessing.AioQueue()
 
     # set process group
     os.setpgid(0, 0)
@@ -352,6 +514,10 @@ async def main():
     p2 = Process(target=execution_process, args=(execution_broker,execution_report,))
     p2.start()
 
+    # INSPECTION processes
+    inspector_pool = InspectorWorkerPool(build_inspector)
+    inspector_pool.start()
+
     # REPORTING process
     reporter = Reporter(report_broker, control_receiver)
 
@@ -359,7 +525,6 @@ async def main():
         global glb_inventory
         global glb_lock
         global glb_fullfilled
-        global glb_liquidated
         global glb_daily_pnl
         global BUY_AMOUNT
 
@@ -367,6 +532,16 @@ async def main():
             report = await execution_report.coro_get()
             logging.warning(f"MAIN receive execution report {report}")
 
+            if report is not None and isinstance(report, ExecutionAck) and report.tx_status == TxStatus.REJECTED:
+                # nothing reached the chain, the slot of a buy is freed and a position is sold again later
+                with glb_lock:
+                    if report.is_buy:
+                        glb_fullfilled -= 1
+                    else:
+                        glb_inventory.abort_liquidation(report.pair.address)
+                logging.warning(f"MAIN execution of {report.pair.address} isBuy {report.is_buy} rejected by executor")
+                continue
+
             if report is not None and isinstance(report, ExecutionAck):
                 # send execution report
                 report_broker.put(ReportData(
@@ -379,20 +554,21 @@ async def main():
                 if report.tx_status == TxStatus.SUCCESS:
                     if report.is_buy:
                         with glb_lock:
-                            glb_inventory.append(Position(
+                            glb_inventory.add(Position(
                                 pair=report.pair,
                                 amount=report.amount_out,
                                 buy_price=calculate_price(report.amount_out, report.amount_in),
                                 start_time=int(time()),
                                 signer=report.signer,
                                 bot=report.bot,
+                                amount_in=report.amount_in,
                                 is_paper=report.is_paper,
-                            ))
+                            ), report.amount_in)
                             logging.warning(f"MAIN append {report.pair.address} to inventory length {len(glb_inventory)}")
                     else:
                         with glb_lock:
                             glb_fullfilled -= 1
-                            glb_liquidated = False
+                            glb_inventory.end_liquidation(report.pair.address)
 
                             pnl = (Decimal(report.amount_out)-Decimal(BUY_AMOUNT)-Decimal(GAS_COST))/Decimal(BUY_AMOUNT)*Decimal(100)
                             glb_daily_pnl = (glb_daily_pnl[0], glb_daily_pnl[1] + pnl)
@@ -412,7 +588,7 @@ async def main():
                     else:
                         with glb_lock:
                             glb_fullfilled -= 1
-                            glb_liquidated = False
+                            glb_inventory.end_liquidation(report.pair.address)
 
                             pnl = (-Decimal(BUY_AMOUNT)-Decimal(GAS_COST))/Decimal(BUY_AMOUNT)*Decimal(100)
                             glb_daily_pnl = (glb_daily_pnl[0], glb_daily_pnl[1] + pnl)
@@ -438,7 +614,7 @@ async def main():
         async def handle_pending_positions(positions):
             with glb_lock:
                 for pos in positions: 
-                    glb_inventory.append(pos)
+                    glb_inventory.add(pos, pos.amount_in if pos.amount_in is not None else BUY_AMOUNT)
                     logging.warning(f"MAIN append {pos} to inventory upon bootstrap process")
 
         while True:
@@ -468,12 +644,16 @@ async def main():
     #     )]
     # ))
 
-    await asyncio.gather(watching_process(watching_broker, watching_notifier),
-                        strategy(watching_broker, execution_broker, report_broker, watching_notifier,),
-                        handle_execution_report(),
-                        reporter.run(),
-                        handle_control_order(),
-                        )
+    tasks = [watching_process(watching_broker, watching_notifier, sync_broker),
+            strategy(watching_broker, execution_broker, report_broker, watching_notifier, inspector_pool, sync_broker, mempool_broker, launch_broker,),
+            handle_execution_report(),
+            reporter.run(),
+            handle_control_order(),
+            ]
+    if MEMPOOL_WATCHING:
+        tasks.append(mempool_watching_process(mempool_broker, launch_broker))
+
+    await asyncio.gather(*tasks)
 def signal_handler(signum, frame):
     print("Received termination signal. Shutting down...")
     # Add any cleanup code here
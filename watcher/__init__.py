@@ -1 +1,2 @@
-from watcher.block_watcher import *
\ No newline at end of file
+from watcher.block_watcher import *
+from watcher.mempool_watcher import *
\ No newline at end of file
@@ -17,8 +17,8 @@ import sys # for testing
 sys.path.append('..')
 
 from library import Singleton
-from data import BlockData, Pair, ExecutionAck, FilterLogs, FilterLogsType, ReportData, ReportDataType, TxStatus
-from helpers import async_timer_decorator, load_abi, timer_decorator
+from data import BlockData, Pair, ExecutionAck, FilterLogs, FilterLogsType, ReportData, ReportDataType, TxStatus, ReserveUpdate
+from helpers import async_timer_decorator, load_abi, timer_decorator, constants
 
 ADDRESS_ZERO="0x0000000000000000000000000000000000000000"
 
@@ -26,10 +26,11 @@ glb_lock = threading.Lock()
 glb_middleware_added = False
 
 class BlockWatcher(metaclass=Singleton):
-    def __init__(self, https_url, wss_url, block_broker, report_broker, factory_address, factory_abi, weth_address, pair_abi) -> None:
+    def __init__(self, https_url, wss_url, block_broker, report_broker, factory_address, factory_abi, weth_address, pair_abi, sync_broker=None) -> None:
         self.wss_url = wss_url
         self.block_broker = block_broker
         self.report_broker = report_broker
+        self.sync_broker = sync_broker
 
         self.factory_address = factory_address
         self.factory_abi = factory_abi
@@ -37,6 +38,8 @@ class BlockWatcher(metaclass=Singleton):
         self.pair_abi = pair_abi
 
         self.inventory = []
+        self.inventory_index = {} # lowercase pair address -> Pair of the inventory
+        self.inventory_changed = asyncio.Event()
         self.w3 = Web3(Web3.HTTPProvider(https_url))
         self.factory = self.w3.eth.contract(address=self.factory_address, abi=self.factory_abi)
 
@@ -65,7 +68,8 @@ class BlockWatcher(metaclass=Singleton):
 
                     logging.debug(f"block number {block_number} timestamp {block_timestamp}")
 
-                    pairs = self.filter_log_in_block(block_number, block_timestamp)
+                    # getLogs calls are blocking, keep them off the loop shared with the strategy
+                    pairs = await asyncio.to_thread(self.filter_log_in_block, block_number, block_timestamp)
 
                     logging.debug(f"WATCHER found pairs {pairs}")
 
@@ -83,6 +87,70 @@ class BlockWatcher(metaclass=Singleton):
                 logging.error(f"WATCHER websocket connection closed, reconnect...")
                 continue
 
+    async def subscribe_sync(self, w3Async):
+        # Sync logs of the inventory pairs only, the subscription is renewed whenever the inventory changes
+        subscription_id = None
+        while True:
+            self.inventory_changed.clear()
+            addresses = [Web3.to_checksum_address(address) for address in self.inventory_index.keys()]
+
+            if subscription_id is not None:
+                await w3Async.eth.unsubscribe(subscription_id)
+                subscription_id = None
+            if len(addresses) > 0:
+                subscription_id = await w3Async.eth.subscribe("logs", {"address": addresses, "topics": [constants.SYNC_EVENT_TOPIC]})
+            logging.info(f"WATCHER sync subscribed for {len(addresses)} pairs")
+
+            await self.inventory_changed.wait()
+
+    async def listen_sync(self):
+        """
+        Streams Sync logs and forwards the new reserves of inventory pairs as soon as a log arrives,
+        without waiting for the block to be fully processed.
+        """
+        sync_event = self.w3.eth.contract(abi=self.pair_abi).events.Sync()
+
+        async for w3Async in AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.wss_url)):
+            subscription_task = None
+            try:
+                logging.warning(f"WATCHER sync websocket connected...")
+
+                subscription_task = asyncio.create_task(self.subscribe_sync(w3Async))
+                async for response in w3Async.ws.process_subscriptions():
+                    log = response['result']
+                    if log.get('removed', False):
+                        continue
+
+                    # logs of a subscription being renewed may still name a pair just sold
+                    pair = self.inventory_index.get(log['address'].lower())
+                    if pair is None:
+                        continue
+
+                    try:
+                        event = sync_event.process_log(log)
+                    except Exception as e:
+                        logging.error(f"WATCHER decode sync log {log} error {e}")
+                        continue
+
+                    with glb_lock:
+                        pair.reserve_token = Web3.from_wei(event['args']['reserve0'], 'ether') if pair.token_index==0 else Web3.from_wei(event['args']['reserve1'], 'ether')
+                        pair.reserve_eth = Web3.from_wei(event['args']['reserve1'], 'ether') if pair.token_index==0 else Web3.from_wei(event['args']['reserve0'], 'ether')
+
+                    update = ReserveUpdate(
+                        pair=pair,
+                        block_number=log['blockNumber'],
+                        tx_hash=log['transactionHash'].hex(),
+                    )
+                    logging.info(f"WATCHER {update}")
+                    self.sync_broker.put(update)
+
+            except websockets.ConnectionClosed:
+                logging.error(f"WATCHER sync websocket connection closed, reconnect...")
+                continue
+            finally:
+                if subscription_task is not None:
+                    subscription_task.cancel()
+
     @timer_decorator
     def get_reserves_and_creator(self, pair_address, block_number):
         contract = self.w3.eth.contract(address=pair_address, abi=self.pair_abi)
@@ -224,6 +292,8 @@ class BlockWatcher(metaclass=Singleton):
 
             with glb_lock:
                 self.inventory.append(pair)
+                self.inventory_index[pair.address.lower()] = pair
+            self.inventory_changed.set()
             logging.warning(f"WATCHER add pair {pair.address} to inventory length {len(self.inventory)}")
 
         def remove_pair_from_inventory(pair):
@@ -231,7 +301,10 @@ class BlockWatcher(metaclass=Singleton):
                 if pr.address == pair.address:
                     with glb_lock:
                         self.inventory.pop(idx)
+                        self.inventory_index.pop(pair.address.lower(), None)
                         logging.warning(f"WATCHER remove pair {pair.address} from inventory length {len(self.inventory)}")
+                    self.inventory_changed.set()
+                    break
 
         while True:
             report = await self.report_broker.coro_get()
@@ -240,7 +313,7 @@ class BlockWatcher(metaclass=Singleton):
                 try:
                     logging.warning(f"WATCHER receive report {report}")
                     if report.is_buy and report.tx_status == TxStatus.SUCCESS:
-                        if report.pair.address not in [pair.address for pair in self.inventory]:
+                        if report.pair.address.lower() not in self.inventory_index:
                             add_pair_to_inventory(report.pair)
                     else:
                         remove_pair_from_inventory(report.pair)
@@ -249,10 +322,11 @@ class BlockWatcher(metaclass=Singleton):
 
     
     async def main(self):
-        await asyncio.gather(
-            self.listen_block(),
-            self.listen_report(),
-        )
+        tasks = [self.listen_block(), self.listen_report()]
+        if self.sync_broker is not None:
+            tasks.append(self.listen_sync())
+
+        await asyncio.gather(*tasks)
 
 if __name__ == "__main__":     
     from dotenv import load_dotenv
@@ -266,6 +340,7 @@ if __name__ == "__main__":
 
     block_broker = aioprocessing.AioQueue()
     report_broker = aioprocessing.AioQueue()
+    sync_broker = aioprocessing.AioQueue()
 
     report_broker.put(ExecutionAck(
         lead_block=0,
@@ -321,6 +396,7 @@ if __name__ == "__main__":
                                 factory_abi=FACTORY_ABI,
                                 weth_address=os.environ.get('WETH_ADDRESS'),
                                 pair_abi=PAIR_ABI,
+                                sync_broker=sync_broker,
                                 )
     
     async def run_all():
@@ -332,7 +408,12 @@ if __name__ == "__main__":
                     logging.info(f"pair {block_data.pairs[0]}")
                 #logging.info(f"block inventory {block_data.inventory[0]}")
 
-        await asyncio.gather(block_watcher.main(), receive_block())
+        async def receive_sync():
+            while True:
+                update = await sync_broker.coro_get()
+                logging.info(f"receive {update}")
+
+        await asyncio.gather(block_watcher.main(), receive_block(), receive_sync())
     
     #asyncio.run(block_watcher.main())
     asyncio.run(run_all())
@@ -0,0 +1,210 @@
+import logging
+import asyncio
+import time
+import websockets
+
+from web3 import AsyncWeb3, Web3
+from web3.providers import WebsocketProviderV2
+
+import sys # for testing
+sys.path.append('..')
+
+from library import Singleton
+from data import MempoolAlert, Pair
+from helpers import constants, calculate_pair_address
+
+class MempoolWatcher(metaclass=Singleton):
+    """
+    Watches pending transactions with full tx objects and raises an alert as soon as the creator of an
+    inventory pair moves, or anybody submits a removeLiquidityETH of an inventory token to the router.
+    Optionally forwards the pair of every pending addLiquidityETH, with its address computed offline,
+    so that inspection starts before the PairCreated log.
+    """
+    def __init__(self, wss_url, router_address, inventory, alert_broker, launch_broker=None, factory_address=None, weth_address=None, pair_init_code_hash=None) -> None:
+        self.wss_url = wss_url
+        self.router_address = router_address.lower()
+        self.inventory = inventory # iterable of Position, shared with the strategy
+        self.alert_broker = alert_broker
+
+        self.launch_broker = launch_broker
+        self.factory_address = factory_address
+        self.weth_address = weth_address
+        self.pair_init_code_hash = pair_init_code_hash
+
+    def match_position(self, tx):
+        sender = tx['from'].lower() if tx.get('from') is not None else None
+        receiver = tx['to'].lower() if tx.get('to') is not None else None
+        input = Web3.to_hex(tx['input']) if not isinstance(tx['input'], str) else tx['input']
+
+        # token of removeLiquidityETH(address token,...) is the first argument
+        removed_token = None
+        if receiver == self.router_address and input[:10].lower() == constants.REMOVE_LIQUIDITY_METHOD_ID:
+            removed_token = '0x' + input[34:74].lower()
+
+        for position in self.inventory:
+            if position.pair.creator is not None and position.pair.creator.lower() == sender:
+                return position
+            if removed_token is not None and position.pair.token.lower() == removed_token:
+                return position
+
+        return None
+
+    def decode_launch(self, tx):
+        receiver = tx['to'].lower() if tx.get('to') is not None else None
+        input = Web3.to_hex(tx['input']) if not isinstance(tx['input'], str) else tx['input']
+        if receiver != self.router_address or input[:10].lower() != constants.ADD_LIQUIDITY_METHOD_ID:
+            return None
+
+        # addLiquidityETH(address token, uint amountTokenDesired, uint amountTokenMin, uint amountETHMin, address to, uint deadline)
+        token = Web3.to_checksum_address('0x' + input[34:74])
+        amount_token = int(input[74:138], 16)
+        address = calculate_pair_address(self.factory_address, token, self.weth_address, self.pair_init_code_hash)
+
+        return Pair(
+            token=token,
+            token_index=0 if Web3.to_int(hexstr=token) < Web3.to_int(hexstr=self.weth_address) else 1,
+            address=address,
+            reserve_token=Web3.from_wei(amount_token, 'ether'),
+            reserve_eth=Web3.from_wei(tx.get('value', 0), 'ether'),
+            created_at=int(time.time()),
+            creator=Web3.to_checksum_address(tx['from']),
+        )
+
+    def handle_pending_launch(self, tx):
+        pair = self.decode_launch(tx)
+        if pair is None:
+            return None
+
+        logging.warning(f"WATCHER pending launch of pair {pair.address} token {pair.token} tx {Web3.to_hex(tx['hash'])}")
+        self.launch_broker.put(pair)
+
+        return pair
+
+    def handle_pending_tx(self, tx):
+        # a launch may come from the creator of an inventory pair too, e.g. a serial rugger's next token
+        if self.launch_broker is not None:
+            self.handle_pending_launch(tx)
+
+        position = self.match_position(tx)
+        if position is None:
+            return None
+
+        alert = MempoolAlert(
+            pair=position.pair,
+            tx_hash=Web3.to_hex(tx['hash']),
+            sender=tx['from'],
+            method_id=(Web3.to_hex(tx['input']) if not isinstance(tx['input'], str) else tx['input'])[:10],
+            max_priority_fee_per_gas=tx.get('maxPriorityFeePerGas'),
+            gas_price=tx.get('maxFeePerGas', tx.get('gasPrice')),
+        )
+        logging.warning(f"WATCHER {alert}")
+        self.alert_broker.put(alert)
+
+        return alert
+
+    async def listen_pending_tx(self):
+        async for w3Async in AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.wss_url)):
+            try:
+                logging.warning(f"WATCHER mempool websocket connected...")
+
+                subscription_id = await w3Async.eth.subscribe("newPendingTransactions", True)
+                async for response in w3Async.ws.process_subscriptions():
+                    tx = response['result']
+                    if isinstance(tx, (str, bytes)) or (len(self.inventory) == 0 and self.launch_broker is None):
+                        continue
+
+                    try:
+                        self.handle_pending_tx(tx)
+                    except Exception as e:
+                        logging.error(f"WATCHER pending tx {tx.get('hash')} error {e}")
+
+            except websockets.ConnectionClosed:
+                logging.error(f"WATCHER mempool websocket connection closed, reconnect...")
+                continue
+
+    async def main(self):
+        await self.listen_pending_tx()
+
+if __name__ == "__main__":
+    import json
+    import aioprocessing
+    from data import Position
+
+    logging.basicConfig(level=logging.INFO)
+
+    ROUTER = "0x4752ba5dbc23f44d87826276bf6fd6b1c372ad24"
+    FACTORY = "0x8909Dc15e40173Ff4699343b6eB8132c65e18eC6"
+    WETH = "0x4200000000000000000000000000000000000006"
+    PAIR_INIT_CODE_HASH = "0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f"
+    CREATOR = "0x1111111111111111111111111111111111111111"
+    TOKEN = "0x2E5387d321b358e8161C8F2ec00436006A7D07E2"
+
+    # pending txs replayed by the stand-in node: an unrelated transfer, a launch of the creator, then the rug
+    PENDING_TXS = [
+        {
+            "hash": "0x" + "01"*32,
+            "from": "0x2222222222222222222222222222222222222222",
+            "to": "0x3333333333333333333333333333333333333333",
+            "input": "0x",
+            "maxFeePerGas": hex(2*10**9),
+            "maxPriorityFeePerGas": hex(10**9),
+        },
+        {
+            "hash": "0x" + "03"*32,
+            "from": CREATOR,
+            "to": ROUTER,
+            "value": hex(10**18),
+            "input": constants.ADD_LIQUIDITY_METHOD_ID + ("55"*20).rjust(64, '0') + hex(10**24)[2:].rjust(64, '0') + "0"*64*4,
+            "maxFeePerGas": hex(2*10**9),
+            "maxPriorityFeePerGas": hex(10**9),
+        },
+        {
+            "hash": "0x" + "02"*32,
+            "from": "0x4444444444444444444444444444444444444444",
+            "to": ROUTER,
+            "input": constants.REMOVE_LIQUIDITY_METHOD_ID + TOKEN[2:].lower().rjust(64, '0') + "0"*64*5,
+            "maxFeePerGas": hex(5*10**9),
+            "maxPriorityFeePerGas": hex(3*10**9),
+        },
+    ]
+
+    async def stand_in_node(websocket):
+        # answers eth_subscribe then replays the pending txs as subscription notifications
+        async for message in websocket:
+            request = json.loads(message)
+            await websocket.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": "0xabc"}))
+            if request["method"] == "eth_subscribe":
+                for tx in PENDING_TXS:
+                    await websocket.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": "0xabc", "result": tx}}))
+
+    async def run_all():
+        alert_broker = aioprocessing.AioQueue()
+        launch_broker = aioprocessing.AioQueue()
+        inventory = [Position(
+            pair=Pair(token=TOKEN, token_index=0, address='0x9694DE8E322212ECf96e9276B8ab5c0b2f7a3a24', creator=CREATOR),
+            amount=1,
+            buy_price=0,
+            start_time=0,
+        )]
+        mempool_watcher = MempoolWatcher(
+            wss_url="ws://127.0.0.1:8546",
+            router_address=ROUTER,
+            inventory=inventory,
+            alert_broker=alert_broker,
+            launch_broker=launch_broker,
+            factory_address=FACTORY,
+            weth_address=WETH,
+            pair_init_code_hash=PAIR_INIT_CODE_HASH,
+        )
+
+        async with websockets.serve(stand_in_node, "127.0.0.1", 8546):
+            watcher_task = asyncio.create_task(mempool_watcher.main())
+            launch = await asyncio.wait_for(launch_broker.coro_get(), timeout=10)
+            logging.info(f"receive launch {launch}")
+            # the creator launching another token is alerted as well
+            for _ in range(2):
+                alert = await asyncio.wait_for(alert_broker.coro_get(), timeout=10)
+                logging.info(f"receive {alert}")
+            watcher_task.cancel()
+
+    asyncio.run(run_all())